@@ -0,0 +1,67 @@
+"""
+Comandos de mantenimiento.
+
+Uso:
+    python -m app.cli rebuild-stats                 # todas las encuestas
+    python -m app.cli rebuild-stats --survey-id ID  # una encuesta
+    python -m app.cli reindex-terms [--survey-id ID]
+    python -m app.cli rebuild-survey-heads          # recalcula is_latest de todas las familias
+"""
+import argparse
+import asyncio
+from app.database import connect_to_mongo, close_mongo_connection
+from app.services.survey_stats_store import rebuild_survey_stats, rebuild_all_survey_stats
+from app.services.term_index import reindex_survey_terms, reindex_all_terms
+from app.services.survey_heads import backfill_survey_heads
+
+
+async def rebuild_stats(survey_ids: list[str]):
+    if survey_ids:
+        for survey_id in survey_ids:
+            stats_doc = await rebuild_survey_stats(survey_id)
+            print(f"✅ Estadísticas reconstruidas para {survey_id} ({stats_doc['response_count']} respuestas)")
+    else:
+        rebuilt = await rebuild_all_survey_stats()
+        print(f"✅ Estadísticas reconstruidas para {rebuilt} encuestas")
+
+
+async def reindex_terms(survey_ids: list[str]):
+    if survey_ids:
+        for survey_id in survey_ids:
+            indexed = await reindex_survey_terms(survey_id)
+            print(f"✅ Índice de términos reconstruido para {survey_id} ({indexed} términos)")
+    else:
+        reindexed = await reindex_all_terms()
+        print(f"✅ Índice de términos reconstruido para {reindexed} encuestas")
+
+
+async def run(args: argparse.Namespace):
+    await connect_to_mongo()
+    try:
+        if args.command == "rebuild-stats":
+            await rebuild_stats(args.survey_id)
+        elif args.command == "reindex-terms":
+            await reindex_terms(args.survey_id)
+        elif args.command == "rebuild-survey-heads":
+            await backfill_survey_heads(force=True)
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comandos de mantenimiento de la API de Encuestas")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subparsers.add_parser("rebuild-stats", help="Recalcula las estadísticas materializadas desde survey_responses")
+    rebuild.add_argument("--survey-id", action="append", default=[], help="ID de encuesta (repetible); por defecto todas")
+
+    reindex = subparsers.add_parser("reindex-terms", help="Reconstruye el índice de términos de las preguntas text_input")
+    reindex.add_argument("--survey-id", action="append", default=[], help="ID de encuesta (repetible); por defecto todas")
+
+    subparsers.add_parser("rebuild-survey-heads", help="Recalcula la marca is_latest de la última versión de cada familia")
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,96 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def _histogram_bins(value: str):
+    """Vacío -> ancho fijo de 10; número -> cantidad de intervalos; texto -> estrategia de NumPy."""
+    if not value:
+        return None
+    return int(value) if value.isdigit() else value
+
 class Settings:
     MONGO_DETAILS: str = os.getenv("MONGO_DETAILS", "mongodb://localhost:27017")
     SECRET_KEY: str = os.getenv("SECRET_KEY", "172267a64730654723814623cf89dd310a2c36bbaf1aca860a0242e92883ec43")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+    # Motor de estadísticas filtradas: "python" (pasa a streaming en encuestas grandes),
+    # "streaming" o "aggregation" (MongoDB $facet; sus pruebas de paridad necesitan un MongoDB real)
+    STATS_ENGINE: str = os.getenv("STATS_ENGINE", "python")
+    # Por encima de este número de respuestas el motor "python" pasa a modo streaming
+    STATS_EXACT_MAX_RESPONSES: int = int(os.getenv("STATS_EXACT_MAX_RESPONSES", 1000))
+    STATS_STREAM_BATCH_SIZE: int = int(os.getenv("STATS_STREAM_BATCH_SIZE", 1000))
+    # Tamaño del sketch KLL (error de rango ≈ 1.7 / k)
+    STATS_SKETCH_K: int = int(os.getenv("STATS_SKETCH_K", 200))
+    # Términos distintos que conserva el motor streaming por pregunta de texto (se guardan hasta el doble)
+    STATS_STREAM_TERMS: int = int(os.getenv("STATS_STREAM_TERMS", 1000))
+    # Intervalos del histograma de number_input (vacío, un número o "auto", "fd", ...)
+    # Estrategias admitidas en todos los motores: "sqrt", "sturges", "rice", "scott", "fd" y "auto"
+    STATS_HISTOGRAM_BINS = _histogram_bins(os.getenv("STATS_HISTOGRAM_BINS", ""))
+    # Máximo de intervalos del histograma; por encima, los de ancho fijo pasan a intervalos iguales
+    STATS_HISTOGRAM_MAX_BINS: int = int(os.getenv("STATS_HISTOGRAM_MAX_BINS", 50))
+    # Caché de resultados de estadísticas (entradas máximas y segundos de vida)
+    STATS_CACHE_MAX_ENTRIES: int = int(os.getenv("STATS_CACHE_MAX_ENTRIES", 2048))
+    STATS_CACHE_TTL_SECONDS: float = float(os.getenv("STATS_CACHE_TTL_SECONDS", 300))
+    # Pool de procesos para estadísticas y PDF (0 workers = mismo proceso)
+    COMPUTE_POOL_WORKERS: int = int(os.getenv("COMPUTE_POOL_WORKERS", 2))
+    COMPUTE_POOL_MAX_QUEUE: int = int(os.getenv("COMPUTE_POOL_MAX_QUEUE", 16))
+    COMPUTE_POOL_TIMEOUT_SECONDS: float = float(os.getenv("COMPUTE_POOL_TIMEOUT_SECONDS", 120))
+    # Trabajos de informes en segundo plano
+    REPORTS_DIR: str = os.getenv("REPORTS_DIR", "reports")
+    REPORT_JOB_WORKERS: int = int(os.getenv("REPORT_JOB_WORKERS", 2))
+    REPORT_JOBS_PER_USER: int = int(os.getenv("REPORT_JOBS_PER_USER", 3))
+    # Un trabajo en cola caduca tras este tiempo sin empezar; uno en ejecución, sin latido del worker
+    REPORT_JOB_STALE_SECONDS: int = int(os.getenv("REPORT_JOB_STALE_SECONDS", 900))
+    REPORT_JOB_HEARTBEAT_SECONDS: float = float(os.getenv("REPORT_JOB_HEARTBEAT_SECONDS", 30))
+    REPORT_JOB_TTL_SECONDS: int = int(os.getenv("REPORT_JOB_TTL_SECONDS", 86400))
+    # Tamaño máximo de la caché de PDFs (los informes de encuestas cerradas no cuentan)
+    REPORT_CACHE_MAX_BYTES: int = int(os.getenv("REPORT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    # Máximo de categorías por pregunta en el PDF (el resto se agrupa en "Otros")
+    PDF_MAX_CATEGORIES: int = int(os.getenv("PDF_MAX_CATEGORIES", 15))
+    # Validación de atributos de las gráficas de reportlab (rl_config.shapeChecking).
+    # Afecta a todo el proceso (reportlab la lee al importar `reportlab.graphics`);
+    # desactivada por defecto porque los gráficos del informe usan valores conocidos.
+    PDF_SHAPE_CHECKING: bool = os.getenv("PDF_SHAPE_CHECKING", "0") == "1"
+    # Exportaciones en streaming: respuestas por lote del cursor y tamaño de cada trozo enviado
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+    EXPORT_CHUNK_SIZE: int = int(os.getenv("EXPORT_CHUNK_SIZE", 64 * 1024))
+    # Los XLSX por encima de este tamaño se generan en un archivo temporal en vez de en memoria
+    EXPORT_SPOOL_MAX_BYTES: int = int(os.getenv("EXPORT_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+    # Tamaño máximo (y por defecto) de una página del listado de respuestas
+    RESPONSES_PAGE_MAX_LIMIT: int = int(os.getenv("RESPONSES_PAGE_MAX_LIMIT", 1000))
+    # Escritura de respuestas: "direct" (insert_one por envío) o "batched" (insert_many agrupado)
+    RESPONSE_INGEST_MODE: str = os.getenv("RESPONSE_INGEST_MODE", "direct")
+    RESPONSE_INGEST_BATCH_SIZE: int = int(os.getenv("RESPONSE_INGEST_BATCH_SIZE", 500))
+    RESPONSE_INGEST_MAX_DELAY_MS: float = float(os.getenv("RESPONSE_INGEST_MAX_DELAY_MS", 5))
+    RESPONSE_INGEST_MAX_QUEUE: int = int(os.getenv("RESPONSE_INGEST_MAX_QUEUE", 5000))
+    # Longitud máxima de una respuesta text_input
+    ANSWER_TEXT_MAX_LENGTH: int = int(os.getenv("ANSWER_TEXT_MAX_LENGTH", 5000))
+    # Número máximo de respuestas por envío masivo (arreglo JSON o NDJSON)
+    BULK_RESPONSES_MAX_ITEMS: int = int(os.getenv("BULK_RESPONSES_MAX_ITEMS", 5000))
+    # Claves de idempotencia de los envíos: vida en MongoDB (TTL) y LRU en proceso
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 86400))
+    IDEMPOTENCY_CACHE_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", 10000))
+    IDEMPOTENCY_CACHE_TTL_SECONDS: float = float(os.getenv("IDEMPOTENCY_CACHE_TTL_SECONDS", 300))
+    # Rate limiting de los endpoints públicos: límites "<peticiones>/<segundos>" (vacío = sin límite).
+    # Desactivado por defecto: detrás de un NAT (aula, oficina) todos los encuestados comparten IP,
+    # así que conviene ajustar los límites por IP al activarlo
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+    # "memory" (por proceso) o "sqlite" (archivo compartido por los workers de la máquina)
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_SQLITE_PATH: str = os.getenv("RATE_LIMIT_SQLITE_PATH", "rate_limits.db")
+    RATE_LIMIT_MAX_BUCKETS: int = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100000))
+    # Usar X-Forwarded-For como IP del cliente (solo detrás de un proxy de confianza)
+    RATE_LIMIT_TRUST_FORWARDED: bool = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+    RATE_LIMIT_SUBMIT_PER_SURVEY: str = os.getenv("RATE_LIMIT_SUBMIT_PER_SURVEY", "200/2")
+    RATE_LIMIT_SUBMIT_PER_IP: str = os.getenv("RATE_LIMIT_SUBMIT_PER_IP", "30/60")
+    RATE_LIMIT_PUBLIC_SURVEY_PER_SURVEY: str = os.getenv("RATE_LIMIT_PUBLIC_SURVEY_PER_SURVEY", "500/1")
+    RATE_LIMIT_PUBLIC_SURVEY_PER_IP: str = os.getenv("RATE_LIMIT_PUBLIC_SURVEY_PER_IP", "120/60")
+    RATE_LIMIT_INVITATION_PER_IP: str = os.getenv("RATE_LIMIT_INVITATION_PER_IP", "20/60")
+    # Cada cuántos segundos el planificador de estados corrige desfases y recarga sus transiciones
+    STATUS_SCHEDULER_RESYNC_SECONDS: float = float(os.getenv("STATUS_SCHEDULER_RESYNC_SECONDS", 3600))
+    # Caché en proceso de definiciones de encuestas (envíos y consulta pública)
+    SURVEY_CACHE_MAX_ENTRIES: int = int(os.getenv("SURVEY_CACHE_MAX_ENTRIES", 1024))
+    SURVEY_CACHE_TTL_SECONDS: float = float(os.getenv("SURVEY_CACHE_TTL_SECONDS", 60))
+    # Idioma por defecto de las encuestas (stopwords de la nube de palabras)
+    DEFAULT_LANGUAGE: str = os.getenv("DEFAULT_LANGUAGE", "es")
 
 settings = Settings()
\ No newline at end of file
@@ -1,25 +1,102 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from app.config import settings
 
 client: AsyncIOMotorClient = None
 db = None
+# True si existe el índice único (survey_id, responder_email); si no, los envíos
+# con correo vuelven a comprobar los repetidos antes de insertar
+response_email_index_ready = False
+
+
+async def _create_index(collection: str, keys, **kwargs) -> bool:
+    """Crea un índice; si falla lo informa y sigue con los demás."""
+    try:
+        await db[collection].create_index(keys, **kwargs)
+        return True
+    except DuplicateKeyError as e:
+        print(f"⚠️ Hay valores repetidos en {collection}; no se pudo crear el índice único {keys}: {e}")
+    except Exception as e:
+        print(f"❌ No se pudo crear el índice {keys} de {collection}: {e}")
+    return False
+
+
+async def _drop_index(collection: str, name: str):
+    """Elimina un índice obsoleto si existe."""
+    try:
+        if name in await db[collection].index_information():
+            await db[collection].drop_index(name)
+            print(f"🧹 Índice obsoleto {name} eliminado de {collection}")
+    except Exception as e:
+        print(f"❌ No se pudo eliminar el índice obsoleto {name} de {collection}: {e}")
+
 
 async def connect_to_mongo():
-    global client, db
+    global client, db, response_email_index_ready
     try:
         client = AsyncIOMotorClient(settings.MONGO_DETAILS)
         db = client.get_database("surveys_db")
+        await client.admin.command("ping")
+    except Exception as e:
+        print(f"Error al conectar a MongoDB: {e}")
+        return
 
-        # Índices únicos para usuarios
-        await db["users"].create_index("username", unique=True)
-        await db["users"].create_index("email", unique=True)
+    # Índices únicos para usuarios
+    await _create_index("users", "username", unique=True)
+    await _create_index("users", "email", unique=True)
 
-        # Opcional: índice para tokens si quieres evitar duplicados o acelerar búsquedas
-        await db["survey_access_tokens"].create_index("id", unique=True)
+    # Opcional: índice para tokens si quieres evitar duplicados o acelerar búsquedas
+    await _create_index("survey_access_tokens", "id", unique=True)
 
-        print("✅ Conectado a MongoDB con éxito.")
-    except Exception as e:
-        print(f"Error al conectar a MongoDB: {e}")
+    # Listados de la última versión de cada familia de encuestas (marca is_latest)
+    await _create_index("surveys", [("creator_id", 1), ("is_latest", 1), ("created_at", -1)])
+    await _create_index("surveys", [("is_latest", 1), ("status", 1), ("created_at", -1)])
+    await _create_index("surveys", [("is_template", 1), ("is_latest", 1), ("created_at", -1)])
+    # Versiones de una familia
+    await _create_index("surveys", [("parent_id", 1), ("version", -1)])
+
+    # Respuestas por encuesta en orden de llegada (marca de agua, recorridos por lotes)
+    await _create_index("survey_responses", [("survey_id", 1), ("_id", 1)])
+    # Exportaciones delta por fecha de envío
+    await _create_index("survey_responses", [("survey_id", 1), ("submitted_at", 1)])
+    # Un correo solo puede responder una vez cada encuesta (los envíos anónimos no cuentan)
+    response_email_index_ready = await _create_index(
+        "survey_responses",
+        [("survey_id", 1), ("responder_email", 1)],
+        unique=True,
+        partialFilterExpression={"responder_email": {"$gt": ""}}
+    )
+    if not response_email_index_ready:
+        print("⚠️ Sin índice único de correos: los envíos comprobarán los repetidos antes de insertar")
+
+    # Índice invertido de términos: una entrada por (encuesta, pregunta, generación, término).
+    # Los índices sin generación de versiones anteriores impedirían escribir una generación nueva
+    await _drop_index("survey_terms", "survey_id_1_question_id_1_term_1")
+    await _drop_index("survey_terms", "survey_id_1_question_id_1_count_-1")
+    await _create_index("survey_terms", [("survey_id", 1), ("question_id", 1), ("gen", 1), ("term", 1)], unique=True)
+    await _create_index("survey_terms", [("survey_id", 1), ("question_id", 1), ("gen", 1), ("count", -1)])
+
+    # Trabajos de informes: deduplicación de trabajos activos, límite por usuario y limpieza por TTL
+    await _create_index(
+        "report_jobs",
+        [("survey_id", 1), ("data_version", 1)],
+        unique=True,
+        partialFilterExpression={"active": True}
+    )
+    await _create_index("report_jobs", [("user_id", 1), ("status", 1)])
+    # Cada trabajo activo ocupa uno de los REPORT_JOBS_PER_USER huecos de su usuario
+    await _create_index(
+        "report_jobs",
+        [("user_id", 1), ("slot", 1)],
+        unique=True,
+        partialFilterExpression={"active": True, "slot": {"$exists": True}}
+    )
+    await _create_index("report_jobs", "created_at", expireAfterSeconds=settings.REPORT_JOB_TTL_SECONDS)
+
+    # Claves de idempotencia de los envíos de respuestas, purgadas por TTL
+    await _create_index("idempotency_keys", "created_at", expireAfterSeconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+
+    print("✅ Conectado a MongoDB con éxito.")
 
 async def close_mongo_connection():
     global client
@@ -113,6 +113,7 @@ class SurveyBase(BaseModel):
     primary_color: Optional[str] = Field(None, description="Color primario en formato hexadecimal")
     secondary_color: Optional[str] = Field(None, description="Color secundario en formato hexadecimal")
     font_family: Optional[str] = Field(None, description="Tipografía de la encuesta")
+    language: Optional[str] = Field(None, description="Idioma de la encuesta (ISO 639-1), usado para las stopwords de la nube de palabras")
 
     @model_validator(mode='after')
     def validate_dates(self):
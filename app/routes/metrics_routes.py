@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends
+from app.models.user import User
+from app.auth import get_current_user
+from app.services.stats_cache import stats_cache
+from app.services.compute_pool import compute_pool
+from app.services.report_cache import report_cache
+from app.services.response_ingest import response_ingest
+from app.services.survey_cache import survey_cache
+from app.services.idempotency import idempotency_store
+from app.services.rate_limit import rate_limiter
+from app.services.status_scheduler import status_scheduler
+
+router = APIRouter()
+
+@router.get("/stats-cache", summary="Métricas de la caché de estadísticas")
+async def get_stats_cache_metrics(current_user: User = Depends(get_current_user)):
+    return stats_cache.metrics()
+
+@router.get("/compute-pool", summary="Métricas del pool de cómputo")
+async def get_compute_pool_metrics(current_user: User = Depends(get_current_user)):
+    return compute_pool.metrics()
+
+@router.get("/report-cache", summary="Métricas de la caché de informes PDF")
+async def get_report_cache_metrics(current_user: User = Depends(get_current_user)):
+    return report_cache.metrics()
+
+@router.get("/response-ingest", summary="Métricas de la cola de escritura de respuestas")
+async def get_response_ingest_metrics(current_user: User = Depends(get_current_user)):
+    return response_ingest.metrics()
+
+@router.get("/survey-cache", summary="Métricas de la caché de definiciones de encuestas")
+async def get_survey_cache_metrics(current_user: User = Depends(get_current_user)):
+    return survey_cache.metrics()
+
+@router.get("/idempotency", summary="Métricas de las claves de idempotencia de los envíos")
+async def get_idempotency_metrics(current_user: User = Depends(get_current_user)):
+    return idempotency_store.metrics()
+
+@router.get("/rate-limits", summary="Métricas del rate limiting de los endpoints públicos")
+async def get_rate_limit_metrics(current_user: User = Depends(get_current_user)):
+    return await rate_limiter.metrics()
+
+@router.get("/status-scheduler", summary="Métricas del planificador de estados de encuestas")
+async def get_status_scheduler_metrics(current_user: User = Depends(get_current_user)):
+    return status_scheduler.metrics()
\ No newline at end of file
@@ -1,23 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import FileResponse, StreamingResponse
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Header
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from typing import List, Optional
 from app.models.user import User
 from app.models.survey import SurveyResponse
 from app.database import get_collection
 from app.auth import get_current_user
 from bson import ObjectId
-from app.services.survey_stats import compute_survey_statistics
-from app.services.pdf_report import generate_pdf_report
+from app.services.survey_stats import compute_survey_statistics, get_response_watermark
+from app.services.report_cache import report_cache
+from app.services.survey_stats_store import get_stats_version
+from app.services.response_pages import count_survey_responses, fetch_responses_page
+from app.services.compute_pool import compute_http_errors
+from app.services.survey_export import (
+    ARROW_FORMATS,
+    build_arrow_export,
+    build_since_query,
+    build_xlsx_export,
+    iter_csv_chunks,
+    iter_file_chunks,
+    iter_ndjson_chunks,
+)
 import os
 from datetime import datetime
-import pandas as pd
-from io import BytesIO, StringIO
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.services.utils import (
     convert_objectids_to_str,
     is_temp_id,
-    update_survey_status,
-    validate_conditional_logic,
     get_surveys_collection_dependency,
     get_responses_collection_dependency,
 )
@@ -27,6 +35,10 @@ router = APIRouter()
 @router.get("/{id}/responses", response_model=List[SurveyResponse])
 async def get_survey_responses(
     id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     responses_collection: AsyncIOMotorClient = Depends(get_responses_collection_dependency)
 ):
@@ -37,8 +49,16 @@ async def get_survey_responses(
     if not survey or str(survey["creator_id"]) != str(current_user.id):
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    responses = await responses_collection.find({"survey_id": ObjectId(id)}).to_list(1000)
-    return [SurveyResponse(**convert_objectids_to_str(r)) for r in responses]
+    try:
+        items, next_cursor = await fetch_responses_page(responses_collection, survey, limit, after, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 📑 Paginación por cursor: la siguiente página se pide con ?after=<X-Next-Cursor>
+    response.headers["X-Total-Count"] = str(await count_survey_responses(survey["_id"], responses_collection))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 @router.get("/{id}/stats")
 async def get_survey_stats(
@@ -54,12 +74,6 @@ async def get_survey_stats(
     if not survey or str(survey["creator_id"]) != str(current_user.id):
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    survey["status"] = update_survey_status(survey)
-    await surveys_collection.update_one(
-        {"_id": survey["_id"]},
-        {"$set": {"status": survey["status"]}}
-    )
-
     filters = dict(request.query_params)
     filter_pairs = []
     
@@ -84,12 +98,14 @@ async def get_survey_stats(
         if f["qid"] not in {str(q["_id"]) for q in survey.get("questions", []) if q["type"] == "number_input"}:
             raise HTTPException(status_code=400, detail=f"El filtro para la pregunta {f['qid']} no es de tipo number_input")
 
-    stats = await compute_survey_statistics(id, filter_pairs)
+    with compute_http_errors():
+        stats = await compute_survey_statistics(id, filter_pairs)
     return stats
 
 @router.get("/{id}/final-report", response_class=FileResponse)
 async def get_final_report(
     id: str,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     surveys_collection=Depends(get_surveys_collection_dependency),
     responses_collection=Depends(get_responses_collection_dependency)
@@ -101,64 +117,40 @@ async def get_final_report(
     if not survey or str(survey["creator_id"]) != str(current_user.id):
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    survey["status"] = update_survey_status(survey)
-
-    from app.services.survey_stats import compute_survey_statistics
-    stats = await compute_survey_statistics(id, [])
-
-    # 🔁 Convertir el dict a una lista para el template
-    formatted_stats = []
-    for qid, q in stats.items():
-        question_summary = {
-            "question": q["text"],
-            "type": q["type"],
-            "data": q.get("options", {}),
-            "total": sum(q.get("options", {}).values())
-        }
-
-        if q["type"] == "number_input" and q.get("responses"):
-            question_summary.update({
-                "avg": q.get("avg"),
-                "median": q.get("median"),
-                "min": q.get("min"),
-                "max": q.get("max")
-            })
-        elif q["type"] == "text_input" and "word_cloud" in q:
-            word_data = {w["word"]: w["count"] for w in q["word_cloud"]}
-            question_summary["data"] = word_data
-            question_summary["total"] = sum(word_data.values())
-
-        formatted_stats.append(question_summary)
-
-    # 📝 Generar PDF
-    os.makedirs("reports", exist_ok=True)
-    filename = f"reports/survey_report_{id}.pdf"
-    generate_pdf_report(survey, formatted_stats, filename)
+    # 🔑 La versión de los datos identifica el PDF: si el cliente ya lo tiene, 304
+    stats_version = await get_stats_version(id)
+    etag = f'"{report_cache.cache_key(survey, stats_version)}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Access-Control-Allow-Origin": "*",
+    }
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    # 📝 Generar PDF (o reutilizar el cacheado)
+    with compute_http_errors():
+        filename = await report_cache.get_or_build(survey, stats_version)
 
     # 📄 Devolver archivo PDF
-    response = FileResponse(
+    return FileResponse(
         filename,
         media_type="application/pdf",
-        filename=f"Informe_{survey['title'].replace(' ', '_')}.pdf"
+        filename=f"Informe_{survey['title'].replace(' ', '_')}.pdf",
+        headers=headers
     )
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    return response
 
-def format_date(date_val):
-    try:
-        if isinstance(date_val, datetime):
-            return date_val.strftime("%Y-%m-%d %H:%M")
-        if isinstance(date_val, str):
-            dt = datetime.fromisoformat(date_val.replace("Z", "+00:00"))
-            return dt.strftime("%Y-%m-%d %H:%M")
-    except Exception:
-        return ""
-    return ""
+EXPORT_FILE_TYPES = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
 
 @router.get("/{id}/export", response_class=StreamingResponse)
 async def export_survey_data(
     id: str,
-    format: str = "csv",  # "csv" o "xlsx"
+    format: str = "csv",  # "csv", "xlsx", "parquet", "arrow" o "ndjson"
+    since: Optional[str] = None,  # solo ndjson: id de respuesta o fecha de envío
     current_user: User = Depends(get_current_user),
     surveys_collection=Depends(get_surveys_collection_dependency),
     responses_collection=Depends(get_responses_collection_dependency)
@@ -170,46 +162,49 @@ async def export_survey_data(
     if not survey or str(survey["creator_id"]) != str(current_user.id):
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    responses = await responses_collection.find({"survey_id": ObjectId(id)}).to_list(1000)
-    if not responses:
-        raise HTTPException(status_code=404, detail="No hay respuestas para exportar")
-
-    rows = []
-    for res in responses:
-        row = {
-            "_id": str(res.get("_id", "")),
-            "Email": res.get("responder_email", ""),
-            "Fecha de envío": format_date(res.get("submitted_at"))
+    if format == "ndjson":
+        try:
+            build_since_query(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # 🔖 El final de la exportación se fija ahora: el cliente usa este cursor
+        # como `since` para la siguiente exportación delta
+        until_id = await get_response_watermark(ObjectId(id))
+        headers = {
+            "Content-Disposition": f"attachment; filename=encuesta_{id}.ndjson",
+            "X-Export-Cursor": until_id or since or "",
         }
-        for q in survey.get("questions", []):
-            qid = str(q["_id"])
-            qtext = q["text"]
-            answer = res.get("answers", {}).get(qid, "")
-            if isinstance(answer, list):
-                row[qtext] = ", ".join(map(str, answer))
-            else:
-                row[qtext] = str(answer)
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
-
-    if format == "xlsx":
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Respuestas")
-        output.seek(0)
+        if not until_id:
+            return Response(content="", media_type="application/x-ndjson", headers=headers)
         return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=encuesta_{id}.xlsx"}
+            iter_ndjson_chunks(responses_collection, survey, since, until_id),
+            media_type="application/x-ndjson",
+            headers=headers
         )
 
+    if not await responses_collection.find_one({"survey_id": ObjectId(id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="No hay respuestas para exportar")
+
+    if format == "xlsx":
+        output = await build_xlsx_export(responses_collection, survey)
+    elif format in ARROW_FORMATS:
+        output = await build_arrow_export(responses_collection, survey, format)
     else:
-        output = StringIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
         return StreamingResponse(
-            output,
+            iter_csv_chunks(responses_collection, survey),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename=encuesta_{id}.csv"}
-        )
\ No newline at end of file
+        )
+
+    media_type, extension = EXPORT_FILE_TYPES[format]
+    output.seek(0, os.SEEK_END)
+    size = output.tell()
+    output.seek(0)
+    return StreamingResponse(
+        iter_file_chunks(output),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=encuesta_{id}.{extension}",
+            "Content-Length": str(size),
+        }
+    )
@@ -3,6 +3,7 @@ from app.models.survey import SurveyAccessToken
 from app.database import get_collection
 from app.models.user import User
 from app.auth import get_current_user
+from app.services.rate_limit import rate_limiter
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from datetime import datetime, timedelta
@@ -37,7 +38,8 @@ async def generate_invite(
 
 @router.get(
     "/access/{token_id}",
-    summary="Verificar token de acceso y devolver encuesta"
+    summary="Verificar token de acceso y devolver encuesta",
+    dependencies=[Depends(rate_limiter.dependency("invitation_access"))]
 )
 async def verify_invitation_token(
     token_id: str,
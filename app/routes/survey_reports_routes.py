@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from app.models.user import User
+from app.auth import get_current_user
+from bson import ObjectId
+import os
+from app.services.report_jobs import report_jobs, serialize_job, ReportJobLimitExceeded
+from app.services.utils import get_surveys_collection_dependency
+
+router = APIRouter()
+
+async def get_own_job(job_id: str, current_user: User) -> dict:
+    job = await report_jobs.get_job(job_id)
+    if not job or job["user_id"] != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Trabajo de informe no encontrado")
+    return job
+
+def job_response(job: dict) -> dict:
+    data = serialize_job(job)
+    if job["status"] == "done":
+        data["download_url"] = f"/api/survey_api/surveys/reports/{job['_id']}/download"
+    return data
+
+@router.post("/{id}/reports", status_code=status.HTTP_202_ACCEPTED, summary="Solicitar el informe final en segundo plano")
+async def request_report(
+    id: str,
+    current_user: User = Depends(get_current_user),
+    surveys_collection=Depends(get_surveys_collection_dependency)
+):
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+
+    survey = await surveys_collection.find_one({"_id": ObjectId(id)})
+    if not survey or str(survey["creator_id"]) != str(current_user.id):
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    try:
+        job = await report_jobs.submit(survey, str(current_user.id))
+    except ReportJobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+    return job_response(job)
+
+@router.get("/reports/{job_id}", summary="Estado de un trabajo de informe")
+async def get_report_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await get_own_job(job_id, current_user)
+    return job_response(job)
+
+@router.get("/reports/{job_id}/download", response_class=FileResponse, summary="Descargar el informe generado")
+async def download_report(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await get_own_job(job_id, current_user)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"El informe aún no está listo (estado: {job['status']})")
+    if not os.path.exists(job.get("file_path", "")):
+        raise HTTPException(status_code=410, detail="El archivo del informe ya no está disponible")
+
+    response = FileResponse(
+        job["file_path"],
+        media_type="application/pdf",
+        filename=f"Informe_{job['_id']}.pdf"
+    )
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Response
 from app.database import get_collection
 from app.auth import get_current_user
 from app.models.user import User
 from app.models.survey import SurveyResponse, Survey
+from app.services.survey_stats_store import record_response_stats
+from app.services.response_ingest import ingest_http_errors, response_ingest
+from app.services.survey_cache import survey_cache
+from app.services.rate_limit import rate_limiter
+from app.services.answer_validation import AnswerValidationError
+from app.services.idempotency import idempotency_store, payload_fingerprint, validate_idempotency_key
+from app.services.response_pages import count_survey_responses, fetch_responses_page
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from datetime import datetime
-from typing import List, Dict, Any
+from pymongo.errors import DuplicateKeyError
+from typing import List, Dict, Any, Optional
 
 router = APIRouter()
 
@@ -28,24 +36,42 @@ async def get_response_collection():
 @router.post(
     "/surveys/{survey_id}/responses",
     status_code=status.HTTP_201_CREATED,
-    summary="Enviar respuestas a una encuesta (público)"
+    summary="Enviar respuestas a una encuesta (público)",
+    dependencies=[Depends(rate_limiter.dependency("submit_response", survey_param="survey_id"))]
 )
 async def submit_response(
     survey_id: str,
     response_data: Dict[str, Any],  # Cambiado a response_data para incluir email
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     surveys_collection=Depends(get_survey_collection),
     responses_collection=Depends(get_response_collection)
 ):
     if not ObjectId.is_valid(survey_id):
         raise HTTPException(status_code=400, detail="ID de encuesta inválido")
 
-    survey = await surveys_collection.find_one({"_id": ObjectId(survey_id)})
-    if not survey:
+    # Un reintento con la misma Idempotency-Key devuelve la respuesta original
+    fingerprint = None
+    if idempotency_key is not None:
+        validate_idempotency_key(idempotency_key)
+        fingerprint = payload_fingerprint(response_data)
+        replayed_id = await idempotency_store.lookup(survey_id, idempotency_key, fingerprint)
+        if replayed_id:
+            response.headers["Idempotent-Replayed"] = "true"
+            return {"message": "Respuestas enviadas correctamente", "response_id": replayed_id}
+
+    entry = await survey_cache.get(survey_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
+    survey = entry.doc
 
     # Extraer answers y responder_email del payload
     answers = response_data.get("answers", {})
     responder_email = response_data.get("responder_email", "")
+    try:
+        answers = entry.validator.validate(answers)
+    except AnswerValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     response_doc = {
         "survey_id": ObjectId(survey_id),
@@ -54,10 +80,23 @@ async def submit_response(
         "submitted_at": datetime.utcnow()
     }
 
-    result = await responses_collection.insert_one(response_doc)
+    try:
+        with ingest_http_errors():
+            response_id, replayed = await idempotency_store.run_once(
+                survey_id, idempotency_key, fingerprint, lambda: response_ingest.insert(response_doc)
+            )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Este correo ya ha respondido")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+        return {"message": "Respuestas enviadas correctamente", "response_id": response_id}
+    try:
+        await record_response_stats(survey, answers, response_id)
+    except Exception as e:
+        print(f"⚠️ No se pudieron actualizar las estadísticas de la encuesta {survey_id}: {e}")
     return {
         "message": "Respuestas enviadas correctamente",
-        "response_id": str(result.inserted_id)
+        "response_id": response_id
     }
 
 @router.get(
@@ -67,6 +106,10 @@ async def submit_response(
 )
 async def get_survey_responses(
     survey_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     surveys_collection=Depends(get_survey_collection),
     responses_collection=Depends(get_response_collection)
@@ -81,6 +124,13 @@ async def get_survey_responses(
     if str(survey["creator_id"]) != str(current_user.id):
         raise HTTPException(status_code=403, detail="No tienes permiso para ver estas respuestas")
 
-    responses = await responses_collection.find({"survey_id": ObjectId(survey_id)}).to_list(length=1000)
+    try:
+        items, next_cursor = await fetch_responses_page(responses_collection, survey, limit, after, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return [SurveyResponse(**convert_objectids_to_str(r)) for r in responses]
\ No newline at end of file
+    # 📑 Paginación por cursor: la siguiente página se pide con ?after=<X-Next-Cursor>
+    response.headers["X-Total-Count"] = str(await count_survey_responses(survey["_id"], responses_collection))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
\ No newline at end of file
@@ -1,23 +1,54 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Request, Response
+from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
 from app.models.survey import Survey, SurveyCreate
 from app.models.user import User
+from app import database
 from app.database import get_collection
 from app.auth import get_current_user
+from app.services.survey_stats_store import record_response_stats
+from app.services.response_ingest import ingest_http_errors, response_ingest
+from app.services.rate_limit import rate_limiter
+from app.services.status_scheduler import status_scheduler
+from app.services.survey_heads import refresh_family_head
+from app.services.answer_validation import AnswerValidationError
+from app.services.idempotency import idempotency_store, payload_fingerprint, validate_idempotency_key
+from app.services.bulk_responses import BulkPayloadError, parse_bulk_payload, submit_bulk_responses
+from app.services.survey_cache import survey_cache
+from app.services.conditional_logic import ConditionalLogicError, compile_conditional_logic
 from app.services.utils import (
     convert_objectids_to_str,
     is_temp_id,
     update_survey_status,
-    validate_conditional_logic,
     get_surveys_collection_dependency,
     get_responses_collection_dependency,
 )
 
 router = APIRouter()
 
+def check_conditional_logic(questions: list, stored_questions: list = None):
+    """
+    Rechaza (400) encuestas con condiciones que referencian preguntas inexistentes
+    (o ninguna) o forman ciclos. Al editar, `stored_questions` son las de la versión
+    guardada: los problemas que ya tenía no se rechazan, así las encuestas creadas
+    antes de esta validación se pueden seguir editando.
+    """
+    if stored_questions is None:
+        try:
+            compile_conditional_logic(questions, strict=True)
+        except ConditionalLogicError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return
+
+    problems = compile_conditional_logic(questions).problems
+    stored_problems = compile_conditional_logic(stored_questions).problems
+    new_errors = [message for qid, message in problems.items() if qid not in stored_problems]
+    if new_errors:
+        raise HTTPException(status_code=400, detail="; ".join(dict.fromkeys(new_errors)))
+
 @router.post("/", response_model=Survey, status_code=status.HTTP_201_CREATED)
 async def create_survey(
     survey: SurveyCreate,
@@ -29,12 +60,26 @@ async def create_survey(
     survey_data["created_at"] = datetime.utcnow()
     survey_data["updated_at"] = datetime.utcnow()
     survey_data["status"] = update_survey_status(survey_data)
+    survey_data["is_latest"] = True
 
+    temp_id_map = {}
     for q in survey_data["questions"]:
         if not q.get("_id") or is_temp_id(q.get("_id", "")):
-            q["_id"] = ObjectId()
+            new_id = ObjectId()
+            if q.get("_id"):
+                temp_id_map[q["_id"]] = str(new_id)
+            q["_id"] = new_id
+
+    for q in survey_data["questions"]:
+        if q.get("visible_if"):
+            ref_id = q["visible_if"].get("question_id")
+            if ref_id in temp_id_map:
+                q["visible_if"]["question_id"] = temp_id_map[ref_id]
+
+    check_conditional_logic(survey_data["questions"])
 
     result = await surveys_collection.insert_one(survey_data)
+    status_scheduler.schedule(survey_data)
     new_survey = await surveys_collection.find_one({"_id": result.inserted_id})
     return Survey(**convert_objectids_to_str(new_survey))
 
@@ -63,9 +108,10 @@ async def update_survey(
     update_data["version"] = latest_version + 1
     update_data["parent_id"] = str(parent_id)
     update_data["title"] = f"{survey.title} v{update_data['version']}"
-    update_data["status"] = "created"
     update_data["start_date"] = survey.start_date
     update_data["end_date"] = survey.end_date
+    update_data["status"] = update_survey_status(update_data)
+    update_data["is_latest"] = True
     update_data["created_at"] = datetime.utcnow()
     update_data["updated_at"] = datetime.utcnow()
     update_data["creator_id"] = current_user.id
@@ -88,7 +134,12 @@ async def update_survey(
             if ref_id in temp_id_map:
                 q["visible_if"]["question_id"] = temp_id_map[ref_id]
 
+    check_conditional_logic(update_data["questions"], existing.get("questions", []))
+
     result = await surveys_collection.insert_one(update_data)
+    await refresh_family_head(parent_id)
+    survey_cache.invalidate(id, parent_id)
+    status_scheduler.schedule(update_data)
     new_survey = await surveys_collection.find_one({"_id": result.inserted_id})
     return Survey(**convert_objectids_to_str(new_survey))
 
@@ -97,44 +148,13 @@ async def get_surveys(
     current_user: User = Depends(get_current_user),
     surveys_collection: AsyncIOMotorClient = Depends(get_surveys_collection_dependency)
 ):
-    pipeline = [
-        {"$match": {"creator_id": current_user.id}},
-        {
-            "$addFields": {
-                "normalized_parent_id": {
-                    "$cond": [
-                        {
-                            "$and": [
-                                {"$ne": ["$parent_id", None]},
-                                {"$ne": [{"$type": "$parent_id"}, "objectId"]}
-                            ]
-                        },
-                        {"$toObjectId": "$parent_id"},
-                        "$parent_id"
-                    ]
-                }
-            }
-        },
-        {"$sort": {"version": -1}},
-        {
-            "$group": {
-                "_id": {"$ifNull": ["$normalized_parent_id", "$_id"]},
-                "latest_survey": {"$first": "$$ROOT"}
-            }
-        },
-        {"$replaceRoot": {"newRoot": "$latest_survey"}},
-        {"$unset": "normalized_parent_id"},
-        {"$sort": {"created_at": -1}}
-    ]
-
-    surveys = await surveys_collection.aggregate(pipeline).to_list(1000)
+    # Última versión de cada familia: rango sobre el índice (creator_id, is_latest, created_at)
+    surveys = await surveys_collection.find(
+        {"creator_id": current_user.id, "is_latest": True}
+    ).sort("created_at", -1).to_list(1000)
     latest_surveys = []
     for survey in surveys:
         survey["status"] = update_survey_status(survey)
-        await surveys_collection.update_one(
-            {"_id": survey["_id"]},
-            {"$set": {"status": survey["status"]}}
-        )
         latest_surveys.append(Survey(**convert_objectids_to_str(survey)))
     print("Encuestas filtradas:", surveys)
     return latest_surveys
@@ -143,48 +163,21 @@ async def get_surveys(
 async def get_public_surveys(
     surveys_collection: AsyncIOMotorClient = Depends(get_surveys_collection_dependency)
 ):
-    pipeline = [
-        {
-            "$addFields": {
-                "normalized_parent_id": {
-                    "$cond": [
-                        {
-                            "$and": [
-                                {"$ne": ["$parent_id", None]},
-                                {"$ne": [{"$type": "$parent_id"}, "objectId"]}
-                            ]
-                        },
-                        {"$toObjectId": "$parent_id"},
-                        "$parent_id"
-                    ]
-                }
-            }
-        },
-        {"$sort": {"version": -1}},
-        {
-            "$group": {
-                "_id": {"$ifNull": ["$normalized_parent_id", "$_id"]},
-                "latest_survey": {"$first": "$$ROOT"}
-            }
-        },
-        {"$replaceRoot": {"newRoot": "$latest_survey"}},
-        {"$unset": "normalized_parent_id"},
-        {"$match": {"status": "published"}},
-        {"$sort": {"created_at": -1}}
-    ]
-
-    surveys = await surveys_collection.aggregate(pipeline).to_list(1000)
+    # Última versión de cada familia: rango sobre el índice (is_latest, status, created_at)
+    surveys = await surveys_collection.find(
+        {"is_latest": True, "status": "published"}
+    ).sort("created_at", -1).to_list(1000)
     latest_surveys = []
     for survey in surveys:
         survey["status"] = update_survey_status(survey)
-        await surveys_collection.update_one(
-            {"_id": survey["_id"]},
-            {"$set": {"status": survey["status"]}}
-        )
         latest_surveys.append(Survey(**convert_objectids_to_str(survey)))
     return latest_surveys
 
-@router.get("/public/{id}", response_model=Survey)
+@router.get(
+    "/public/{id}",
+    response_model=Survey,
+    dependencies=[Depends(rate_limiter.dependency("public_survey", survey_param="id"))]
+)
 async def get_public_survey_by_id(
     id: str,
     surveys_collection: AsyncIOMotorClient = Depends(get_surveys_collection_dependency)
@@ -192,54 +185,12 @@ async def get_public_survey_by_id(
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    pipeline = [
-        {
-            "$match": {
-                "$or": [
-                    {"_id": ObjectId(id)},
-                    {"parent_id": id}
-                ],
-                "is_public": True
-            }
-        },
-        {
-            "$addFields": {
-                "normalized_parent_id": {
-                    "$cond": [
-                        {
-                            "$and": [
-                                {"$ne": ["$parent_id", None]},
-                                {"$ne": [{"$type": "$parent_id"}, "objectId"]}
-                            ]
-                        },
-                        {"$toObjectId": "$parent_id"},
-                        "$parent_id"
-                    ]
-                }
-            }
-        },
-        {"$sort": {"version": -1}},
-        {
-            "$group": {
-                "_id": {"$ifNull": ["$normalized_parent_id", "$_id"]},
-                "latest_survey": {"$first": "$$ROOT"}
-            }
-        },
-        {"$replaceRoot": {"newRoot": "$latest_survey"}},
-        {"$unset": "normalized_parent_id"}
-    ]
-
-    surveys = await surveys_collection.aggregate(pipeline).to_list(1)
-    if not surveys:
+    entry = await survey_cache.get_public(id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada o no es pública")
 
-    survey = surveys[0]
-    print("Survey before serialization:", survey)
+    survey = dict(entry.doc)
     survey["status"] = update_survey_status(survey)
-    await surveys_collection.update_one(
-        {"_id": survey["_id"]},
-        {"$set": {"status": survey["status"]}}
-    )
 
     if survey["status"] == "created" and survey.get("start_date"):
         raise HTTPException(
@@ -252,9 +203,7 @@ async def get_public_survey_by_id(
             detail=f"Esta encuesta ha finalizado. Cerró el {datetime.fromisoformat(survey['end_date'].replace('Z', '+00:00')).strftime('%d de %B de %Y, %H:%M')}."
         )
 
-    serialized_survey = Survey(**convert_objectids_to_str(survey))
-    print("Survey after serialization:", serialized_survey.model_dump())
-    return serialized_survey
+    return entry.model.model_copy(update={"status": survey["status"]})
 
 @router.get("/{id}", response_model=Survey)
 async def get_survey_by_id(
@@ -270,10 +219,6 @@ async def get_survey_by_id(
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
 
     survey["status"] = update_survey_status(survey)
-    await surveys_collection.update_one(
-        {"_id": survey["_id"]},
-        {"$set": {"status": survey["status"]}}
-    )
     return Survey(**convert_objectids_to_str(survey))
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -285,26 +230,45 @@ async def delete_survey(
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    result = await surveys_collection.delete_one({"_id": ObjectId(id), "creator_id": current_user.id})
-    if result.deleted_count == 0:
+    deleted = await surveys_collection.find_one_and_delete({"_id": ObjectId(id), "creator_id": current_user.id})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
-
-@router.post("/{id}/responses", status_code=status.HTTP_201_CREATED)
+    # Si era la última versión, la anterior pasa a ser la cabeza de la familia
+    if deleted.get("is_latest", True):
+        await refresh_family_head(deleted.get("parent_id") or deleted["_id"])
+    survey_cache.invalidate(id)
+
+@router.post(
+    "/{id}/responses",
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limiter.dependency("submit_response", survey_param="id"))]
+)
 async def submit_survey_response(
     id: str,
     response_data: dict,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     surveys_collection: AsyncIOMotorClient = Depends(get_surveys_collection_dependency),
     responses_collection: AsyncIOMotorClient = Depends(get_responses_collection_dependency)
 ):
-    print("Datos recibidos:", response_data)
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    doc = await surveys_collection.find_one({"_id": ObjectId(id)})
-    if not doc:
+    # Un reintento con la misma Idempotency-Key devuelve la respuesta original
+    fingerprint = None
+    if idempotency_key is not None:
+        validate_idempotency_key(idempotency_key)
+        fingerprint = payload_fingerprint(response_data)
+        replayed_id = await idempotency_store.lookup(id, idempotency_key, fingerprint)
+        if replayed_id:
+            response.headers["Idempotent-Replayed"] = "true"
+            return {"message": "Respuesta registrada", "response_id": replayed_id}
+
+    entry = await survey_cache.get(id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
 
-    survey = Survey(**convert_objectids_to_str(doc))
+    doc, survey = entry.doc, entry.model
     now = datetime.utcnow()
     if survey.start_date and now < survey.start_date:
         raise HTTPException(
@@ -324,14 +288,19 @@ async def submit_survey_response(
         if not isinstance(responder_email, str) or "@" not in responder_email:
             raise HTTPException(status_code=400, detail="Correo inválido")
 
-        existing = await responses_collection.find_one({
-            "survey_id": ObjectId(id),
-            "responder_email": responder_email
-        })
-        if existing:
-            raise HTTPException(status_code=400, detail="Este correo ya ha respondido")
+        # Sin el índice único (falló al crearse) se comprueba el correo antes de insertar
+        if not database.response_email_index_ready:
+            existing = await responses_collection.find_one({
+                "survey_id": ObjectId(id),
+                "responder_email": responder_email
+            })
+            if existing:
+                raise HTTPException(status_code=400, detail="Este correo ya ha respondido")
 
-    validate_conditional_logic(survey, answers)
+    try:
+        answers = entry.validator.validate(answers)
+    except AnswerValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     submission = {
         "survey_id": ObjectId(id),
@@ -340,8 +309,61 @@ async def submit_survey_response(
         "submitted_at": datetime.utcnow()
     }
 
-    result = await responses_collection.insert_one(submission)
-    return {"message": "Respuesta registrada", "response_id": str(result.inserted_id)}
+    # El índice único (survey_id, responder_email) rechaza los correos repetidos
+    try:
+        with ingest_http_errors():
+            response_id, replayed = await idempotency_store.run_once(
+                id, idempotency_key, fingerprint, lambda: response_ingest.insert(submission)
+            )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Este correo ya ha respondido")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+        return {"message": "Respuesta registrada", "response_id": response_id}
+    try:
+        await record_response_stats(doc, answers, response_id)
+    except Exception as e:
+        print(f"⚠️ No se pudieron actualizar las estadísticas de la encuesta {id}: {e}")
+    return {"message": "Respuesta registrada", "response_id": response_id}
+
+@router.post("/{id}/responses/bulk")
+async def submit_bulk_survey_responses(
+    id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    responses_collection: AsyncIOMotorClient = Depends(get_responses_collection_dependency)
+):
+    """
+    Registra un lote de respuestas (arreglo JSON o NDJSON con Content-Type
+    application/x-ndjson). Solo el creador de la encuesta puede importar.
+    """
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+
+    entry = await survey_cache.get(id)
+    if not entry or str(entry.doc.get("creator_id")) != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Encuesta no encontrada")
+
+    survey = entry.model
+    now = datetime.utcnow()
+    if survey.start_date and now < survey.start_date:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Esta encuesta no está disponible aún. Abre el {survey.start_date.strftime('%d de %B de %Y, %H:%M')}."
+        )
+    if survey.end_date and now > survey.end_date:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Esta encuesta ha finalizado. Cerró el {survey.end_date.strftime('%d de %B de %Y, %H:%M')}."
+        )
+
+    try:
+        items = parse_bulk_payload(await request.body(), request.headers.get("content-type"))
+    except BulkPayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await submit_bulk_responses(responses_collection, entry, items)
+    return result
 
 @router.post("/{id}/clone", response_model=Survey)
 async def clone_survey_version(
@@ -368,9 +390,10 @@ async def clone_survey_version(
     new_survey["version"] = latest_version + 1
     new_survey["parent_id"] = str(parent_id)
     new_survey["title"] = f"{original['title']} v{new_survey['version']}"
-    new_survey["status"] = "created"
     new_survey["start_date"] = original.get("start_date")
     new_survey["end_date"] = original.get("end_date")
+    new_survey["status"] = update_survey_status(new_survey)
+    new_survey["is_latest"] = True
     new_survey["created_at"] = datetime.utcnow()
     new_survey["updated_at"] = datetime.utcnow()
 
@@ -382,6 +405,9 @@ async def clone_survey_version(
 
     result = await surveys_collection.insert_one(new_survey)
     new_survey["_id"] = result.inserted_id
+    await refresh_family_head(parent_id)
+    status_scheduler.schedule(new_survey)
+    survey_cache.invalidate(survey_id, parent_id)
 
     print(Survey(**convert_objectids_to_str(new_survey)))
     return Survey(**convert_objectids_to_str(new_survey))
@@ -3,7 +3,9 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime
 from typing import Union, Dict, Any
-from app.services.utils import get_surveys_collection_dependency, convert_objectids_to_str
+from app.services.utils import get_surveys_collection_dependency, convert_objectids_to_str, update_survey_status
+from app.services.status_scheduler import status_scheduler
+from app.services.survey_heads import refresh_family_head
 from app.auth import get_current_user
 from app.models.survey import SurveyTemplate
 from pydantic import ValidationError
@@ -61,38 +63,8 @@ async def get_templates(db: AsyncIOMotorDatabase = Depends(get_surveys_collectio
     """
     print("Received request for /api/survey_api/templates")
     try:
-        # Pipeline de agregación para manejar parent_id y obtener plantillas
-        pipeline = [
-            {"$match": {"is_template": True}},
-            {
-                "$addFields": {
-                    "normalized_parent_id": {
-                        "$cond": [
-                            {
-                                "$and": [
-                                    {"$ne": ["$parent_id", None]},
-                                    {"$ne": [{"$type": "$parent_id"}, "objectId"]}
-                                ]
-                            },
-                            {"$toObjectId": "$parent_id"},
-                            "$parent_id"
-                        ]
-                    }
-                }
-            },
-            {"$sort": {"version": -1}},  # Obtener la versión más reciente
-            {
-                "$group": {
-                    "_id": {"$ifNull": ["$normalized_parent_id", "$_id"]},
-                    "latest_template": {"$first": "$$ROOT"}
-                }
-            },
-            {"$replaceRoot": {"newRoot": "$latest_template"}},
-            {"$unset": "normalized_parent_id"},
-            {"$sort": {"created_at": -1}}  # Ordenar por fecha de creación
-        ]
-
-        templates = await db.aggregate(pipeline).to_list(1000)
+        # Última versión de cada plantilla: rango sobre el índice (is_template, is_latest, created_at)
+        templates = await db.find({"is_template": True, "is_latest": True}).sort("created_at", -1).to_list(1000)
         print(f"Found {len(templates)} templates in database: {[str(t['_id']) for t in templates]}")
         if not templates:
             print("Returning empty list as no templates found")
@@ -139,6 +111,7 @@ async def create_template(
         template_data["updated_at"] = datetime.utcnow() if not template_data.get("updated_at") else template_data["updated_at"]
         template_data["status"] = template_data.get("status", "published")
         template_data["parent_id"] = ObjectId(template_data["parent_id"]) if template_data.get("parent_id") and ObjectId.is_valid(template_data["parent_id"]) else None
+        template_data["is_latest"] = True
 
         # Mapear IDs de preguntas para asegurar que sean ObjectId válidos
         temp_id_map = {}
@@ -166,6 +139,8 @@ async def create_template(
         # Insertar la plantilla en la base de datos
         result = await db.insert_one(template_data)
         print(f"Template created with ID: {result.inserted_id}")
+        if template_data["parent_id"]:
+            await refresh_family_head(template_data["parent_id"])
 
         # Verificar que el documento se insertó
         inserted_doc = await db.find_one({"_id": result.inserted_id})
@@ -264,7 +239,8 @@ async def create_survey_from_template(
             "_id": ObjectId(),
             "creator_id": ObjectId(user_id),
             "is_template": False,
-            "status": "created",
+            "is_latest": True,
+            "status": update_survey_status(template),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
             "version": 1,
@@ -295,6 +271,7 @@ async def create_survey_from_template(
         print(f"Inserting new survey with ID: {new_survey['_id']}")
         result = await db.insert_one(new_survey)
         print(f"Survey created from template with ID: {result.inserted_id}")
+        status_scheduler.schedule(new_survey)
 
         # Fetch the created survey to return full data
         created_survey = await db.find_one({"_id": result.inserted_id})
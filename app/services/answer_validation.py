@@ -0,0 +1,214 @@
+"""
+Validación compilada de las respuestas de una encuesta.
+
+`compile_answer_validator` prepara, una vez por definición de encuesta
+(se guarda en la caché de `survey_cache`), un normalizador por pregunta:
+
+- multiple_choice: texto que debe ser una de las `options`.
+- checkbox_group: lista (o un único texto) de `options`, sin repetidos.
+- number_input: número finito; los textos numéricos se convierten a int/float.
+- satisfaction_scale: entero (se aceptan "4" y 4.0).
+- text_input: texto de hasta `ANSWER_TEXT_MAX_LENGTH` caracteres.
+
+Las respuestas vacías ("", None, []) cuentan como no respondidas y se descartan.
+Se rechazan las claves que no son preguntas de la encuesta y las preguntas
+`is_required` visibles sin responder. Las respuestas se guardan ya
+normalizadas, así que las estadísticas y exportaciones reciben tipos
+consistentes en los envíos nuevos.
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.conditional_logic import CompiledConditionalLogic
+
+Normalizer = Callable[[Any], Any]
+
+# Errores que se listan como máximo en el detalle del 400
+MAX_REPORTED_ERRORS = 10
+
+
+class AnswerValidationError(ValueError):
+    """Las respuestas no cumplen el esquema de la encuesta."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors[:MAX_REPORTED_ERRORS]))
+
+
+class InvalidAnswer(ValueError):
+    pass
+
+
+def _short(text: str) -> str:
+    return text[:50] + "..." if len(text) > 50 else text
+
+
+def _to_number(answer: Any) -> Any:
+    answer_type = type(answer)
+    if answer_type is int:
+        return answer
+    if answer_type is float:
+        value = answer
+    elif answer_type is str:
+        text = answer.strip()
+        try:
+            value = int(text)
+        except ValueError:
+            try:
+                value = float(text)
+            except ValueError:
+                raise InvalidAnswer("debe ser un número")
+    else:
+        raise InvalidAnswer("debe ser un número")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise InvalidAnswer("debe ser un número finito")
+    return value
+
+
+def _number_input() -> Normalizer:
+    return _to_number
+
+
+def _satisfaction_scale() -> Normalizer:
+    def normalize(answer: Any) -> int:
+        value = _to_number(answer)
+        if isinstance(value, float):
+            if not value.is_integer():
+                raise InvalidAnswer("debe ser un valor entero de la escala")
+            value = int(value)
+        return value
+    return normalize
+
+
+def _multiple_choice(options: List[str]) -> Normalizer:
+    allowed = frozenset(options)
+
+    def normalize(answer: Any) -> str:
+        if type(answer) is str:
+            value = answer
+        elif isinstance(answer, (list, dict, bool)):
+            raise InvalidAnswer("debe ser una de las opciones")
+        else:
+            value = str(answer)
+        if value not in allowed:
+            raise InvalidAnswer(f"'{_short(value)}' no es una opción válida")
+        return value
+    return normalize
+
+
+def _checkbox_group(options: List[str]) -> Normalizer:
+    allowed = frozenset(options)
+
+    def normalize(answer: Any) -> List[str]:
+        items = answer if type(answer) is list else [answer]
+        values = []
+        for item in items:
+            if type(item) is str:
+                value = item
+            elif isinstance(item, (list, dict, bool)) or item is None:
+                raise InvalidAnswer("debe ser una lista de opciones")
+            else:
+                value = str(item)
+            if value not in allowed:
+                raise InvalidAnswer(f"'{_short(value)}' no es una opción válida")
+            if value not in values:
+                values.append(value)
+        return values
+    return normalize
+
+
+def _text_input(max_length: int) -> Normalizer:
+    def normalize(answer: Any) -> str:
+        if type(answer) is str:
+            value = answer
+        elif isinstance(answer, (list, dict)):
+            raise InvalidAnswer("debe ser un texto")
+        else:
+            value = str(answer)
+        if len(value) > max_length:
+            raise InvalidAnswer(f"supera los {max_length} caracteres")
+        return value
+    return normalize
+
+
+class CompiledAnswerValidator:
+    def __init__(
+        self,
+        normalizers: Dict[str, Tuple[str, Normalizer]],
+        required: List[Tuple[str, str]],
+        logic: Optional[CompiledConditionalLogic] = None,
+    ):
+        # id de pregunta -> (texto, normalizador)
+        self.normalizers = normalizers
+        self.required = required
+        self.logic = logic
+        self._visibility = {rule.question_id: (rule.depends_on, rule.predicate) for rule in logic.rules} if logic else {}
+
+    def _is_visible(self, question_id: str, answers: Dict[str, Any]) -> bool:
+        seen = set()
+        while question_id in self._visibility and question_id not in seen:
+            seen.add(question_id)
+            depends_on, predicate = self._visibility[question_id]
+            if not predicate(answers.get(depends_on)):
+                return False
+            question_id = depends_on
+        return True
+
+    def validate(self, answers: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Devuelve las respuestas normalizadas (un dict nuevo). Lanza
+        `AnswerValidationError` si no cumplen el esquema y el 400 de la lógica
+        condicional si responden preguntas que no deberían estar visibles.
+        """
+        if not isinstance(answers, dict):
+            raise AnswerValidationError(["Las respuestas deben ser un objeto"])
+        normalized, errors = {}, []
+        normalizers = self.normalizers
+        for question_id, answer in answers.items():
+            spec = normalizers.get(question_id)
+            if spec is None:
+                errors.append(f"Pregunta desconocida: {question_id}")
+                continue
+            if answer is None or answer == "" or answer == []:
+                continue
+            try:
+                normalized[question_id] = spec[1](answer)
+            except InvalidAnswer as e:
+                errors.append(f"La respuesta a '{_short(spec[0])}' {e}")
+        if errors:
+            raise AnswerValidationError(errors)
+
+        if self.logic is not None:
+            self.logic.validate(normalized)
+
+        missing = [
+            f"La pregunta '{_short(text)}' es obligatoria"
+            for question_id, text in self.required
+            if question_id not in normalized and self._is_visible(question_id, normalized)
+        ]
+        if missing:
+            raise AnswerValidationError(missing)
+        return normalized
+
+
+def compile_answer_validator(questions: List[dict], logic: Optional[CompiledConditionalLogic] = None) -> CompiledAnswerValidator:
+    """Compila el validador de una lista de preguntas (documentos de MongoDB)."""
+    normalizers, required = {}, []
+    for q in questions:
+        qid = str(q.get("_id"))
+        q_type = q.get("type")
+        text = q.get("text", "")
+        if q_type == "multiple_choice":
+            normalizer = _multiple_choice(q.get("options") or [])
+        elif q_type == "checkbox_group":
+            normalizer = _checkbox_group(q.get("options") or [])
+        elif q_type == "number_input":
+            normalizer = _number_input()
+        elif q_type == "satisfaction_scale":
+            normalizer = _satisfaction_scale()
+        else:
+            normalizer = _text_input(settings.ANSWER_TEXT_MAX_LENGTH)
+        normalizers[qid] = (text, normalizer)
+        if q.get("is_required"):
+            required.append((qid, text))
+    return CompiledAnswerValidator(normalizers, required, logic)
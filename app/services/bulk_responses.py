@@ -0,0 +1,158 @@
+"""
+Envío masivo de respuestas (tabletas sin conexión e importaciones).
+
+El cuerpo es un arreglo JSON o un flujo NDJSON (una respuesta por línea). Cada
+elemento tiene la forma `{"answers": {...}, "responder_email": "..."}`.
+
+Todo el lote se valida en una pasada con la definición cacheada de la encuesta
+y su validador de respuestas (esquema y lógica condicional) ya compilado. Los correos repetidos se detectan dentro
+del lote y con una sola consulta `$in` contra los ya guardados. Los válidos se
+insertan con un único `insert_many(ordered=False)`, y las estadísticas se
+actualizan con una escritura por colección. Cada elemento recibe su propio
+resultado, así un fallo no aborta el resto.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.services.survey_cache import CachedSurvey
+from app.services.survey_stats_store import record_batch_stats
+
+DUPLICATE_EMAIL_ERROR = "Este correo ya ha respondido"
+
+
+class BulkPayloadError(ValueError):
+    """El cuerpo del envío masivo no se puede interpretar."""
+
+
+def parse_bulk_payload(body: bytes, content_type: Optional[str]) -> List[Any]:
+    """Devuelve los elementos de un cuerpo JSON (arreglo) o NDJSON."""
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise BulkPayloadError("El cuerpo debe estar codificado en UTF-8")
+
+    if content_type and "ndjson" in content_type:
+        items = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise BulkPayloadError(f"Línea {number} no es un JSON válido")
+    else:
+        try:
+            items = json.loads(text)
+        except ValueError:
+            raise BulkPayloadError("El cuerpo no es un JSON válido")
+        if not isinstance(items, list):
+            raise BulkPayloadError("El cuerpo debe ser un arreglo de respuestas")
+
+    if not items:
+        raise BulkPayloadError("No se recibieron respuestas")
+    if len(items) > settings.BULK_RESPONSES_MAX_ITEMS:
+        raise BulkPayloadError(f"Se admiten como máximo {settings.BULK_RESPONSES_MAX_ITEMS} respuestas por envío")
+    return items
+
+
+def _validate_item(entry: CachedSurvey, item: Any) -> Dict[str, Any]:
+    """Valida un elemento y devuelve sus answers y responder_email; lanza ValueError con el motivo."""
+    if not isinstance(item, dict):
+        raise ValueError("Formato de respuesta inválido")
+    answers = item.get("answers", {})
+    if not isinstance(answers, dict):
+        raise ValueError("El campo answers debe ser un objeto")
+    responder_email = item.get("responder_email") or None
+    if responder_email is not None and (not isinstance(responder_email, str) or "@" not in responder_email):
+        raise ValueError("Correo inválido")
+    try:
+        answers = entry.validator.validate(answers)
+    except HTTPException as e:
+        raise ValueError(e.detail)
+    return {"answers": answers, "responder_email": responder_email}
+
+
+async def submit_bulk_responses(responses_collection, entry: CachedSurvey, items: List[Any]) -> Dict[str, Any]:
+    """
+    Valida e inserta un lote de respuestas de la encuesta `entry`.
+    Devuelve los totales y un resultado por elemento, en el orden recibido.
+    """
+    survey_oid = entry.doc["_id"]
+    results: List[Dict[str, Any]] = [None] * len(items)
+    valid: Dict[int, Dict[str, Any]] = {}
+    seen_emails = set()
+
+    for index, item in enumerate(items):
+        try:
+            data = _validate_item(entry, item)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "detail": str(e)}
+            continue
+        email = data["responder_email"]
+        if email is not None:
+            if email in seen_emails:
+                results[index] = {"index": index, "status": "error", "detail": DUPLICATE_EMAIL_ERROR}
+                continue
+            seen_emails.add(email)
+        valid[index] = data
+
+    # Una sola consulta para los correos que ya respondieron
+    if seen_emails:
+        cursor = responses_collection.find(
+            {"survey_id": survey_oid, "responder_email": {"$in": list(seen_emails)}},
+            {"responder_email": 1, "_id": 0}
+        )
+        answered = {doc["responder_email"] async for doc in cursor}
+        for index in [i for i, data in valid.items() if data["responder_email"] in answered]:
+            del valid[index]
+            results[index] = {"index": index, "status": "error", "detail": DUPLICATE_EMAIL_ERROR}
+
+    indexes = list(valid)
+    submitted_at = datetime.utcnow()
+    documents = [
+        {
+            "_id": ObjectId(),
+            "survey_id": survey_oid,
+            "responder_email": valid[index]["responder_email"],
+            "answers": valid[index]["answers"],
+            "submitted_at": submitted_at,
+        }
+        for index in indexes
+    ]
+
+    # El índice único sigue siendo la garantía ante envíos concurrentes
+    write_errors = {}
+    if documents:
+        try:
+            await responses_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            if not write_errors:
+                raise
+
+    inserted_answers, inserted_ids = [], []
+    for position, index in enumerate(indexes):
+        error = write_errors.get(position)
+        if error is None:
+            results[index] = {"index": index, "status": "created", "response_id": str(documents[position]["_id"])}
+            inserted_answers.append(documents[position]["answers"])
+            inserted_ids.append(documents[position]["_id"])
+        elif error.get("code") == 11000:
+            results[index] = {"index": index, "status": "error", "detail": DUPLICATE_EMAIL_ERROR}
+        else:
+            results[index] = {"index": index, "status": "error", "detail": error.get("errmsg", "Error de escritura")}
+
+    try:
+        await record_batch_stats(entry.doc, inserted_answers, inserted_ids)
+    except Exception as e:
+        print(f"⚠️ No se pudieron actualizar las estadísticas de la encuesta {survey_oid}: {e}")
+
+    return {
+        "inserted": len(inserted_answers),
+        "failed": len(items) - len(inserted_answers),
+        "results": results,
+    }
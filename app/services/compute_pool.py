@@ -0,0 +1,131 @@
+"""
+Servicio de cómputo en un pool de procesos.
+
+El trabajo pesado de CPU (estadísticas en Python, nubes de palabras y la
+generación del PDF con reportlab) se ejecuta en un `ProcessPoolExecutor` para no
+bloquear el event loop. El pool limita cuántas tareas pueden estar pendientes a
+la vez (`COMPUTE_POOL_MAX_QUEUE`) y cuánto se espera cada resultado
+(`COMPUTE_POOL_TIMEOUT_SECONDS`).
+
+Con `COMPUTE_POOL_WORKERS=0` las funciones se ejecutan en el mismo proceso.
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from app.config import settings
+
+
+class ComputePoolBusy(Exception):
+    """El pool ya tiene el máximo de tareas pendientes."""
+
+
+class ComputeTimeout(Exception):
+    """La tarea no terminó dentro del tiempo límite."""
+
+
+@contextmanager
+def compute_http_errors():
+    """Traduce la saturación o el timeout del pool a respuestas HTTP 503 / 504."""
+    try:
+        yield
+    except ComputePoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servidor está ocupado procesando otros informes. Inténtalo de nuevo en unos segundos.",
+            headers={"Retry-After": "5"}
+        )
+    except ComputeTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="El cálculo tardó demasiado. Inténtalo de nuevo más tarde."
+        )
+
+
+class ComputePool:
+    def __init__(self, workers: int, max_queue: int, timeout_seconds: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def run(self, fn: Callable, *args, timeout: float = None) -> Any:
+        """
+        Ejecuta `fn(*args)` en el pool y espera el resultado.
+        `fn` y sus argumentos deben poder serializarse con pickle.
+        """
+        if self.in_flight >= self.max_queue:
+            self.rejected += 1
+            raise ComputePoolBusy("Demasiadas tareas de cómputo pendientes")
+
+        self.in_flight += 1
+        self.submitted += 1
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                result = fn(*args)
+            else:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self._get_executor(), fn, *args)
+                # La tarea sigue en el worker aunque venza el plazo; solo se deja de esperar
+                result = await asyncio.wait_for(future, timeout or self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ComputeTimeout("La tarea de cómputo superó el tiempo límite")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self._total_seconds += elapsed
+        self._max_seconds = max(self._max_seconds, elapsed)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout_seconds,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_seconds": round(self._total_seconds / self.completed, 4) if self.completed else 0.0,
+            "max_seconds": round(self._max_seconds, 4),
+        }
+
+
+compute_pool = ComputePool(
+    workers=settings.COMPUTE_POOL_WORKERS,
+    max_queue=settings.COMPUTE_POOL_MAX_QUEUE,
+    timeout_seconds=settings.COMPUTE_POOL_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,134 @@
+"""
+Evaluación compilada de la lógica condicional (`visible_if`) de una encuesta.
+
+`compile_conditional_logic` recorre las preguntas una sola vez y prepara, para
+cada pregunta condicional, un predicado con el valor esperado ya convertido a
+texto (y, para `in`/`not_in` sobre respuestas de texto, las formas ",valor" /
+"valor," que evitan partir la respuesta en cada envío). También arma el grafo de
+dependencias y detecta referencias a preguntas inexistentes y ciclos.
+
+La semántica es la de la validación original: una pregunta respondida cuya
+condición no se cumple hace que el envío se rechace con 400.
+"""
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import HTTPException, status
+
+Predicate = Callable[[Any], bool]
+
+
+class ConditionalLogicError(ValueError):
+    """La lógica condicional de la encuesta es inválida (ciclos o referencias rotas)."""
+
+
+def _contains_item(expected: str) -> Predicate:
+    """`expected` está entre los elementos de la respuesta (lista o texto separado por comas)."""
+    if "," in expected:
+        # Ningún trozo de un texto partido por comas puede contener una coma
+        in_text = lambda text: False
+    else:
+        prefix, suffix, middle = expected + ",", "," + expected, "," + expected + ","
+        in_text = lambda text: (
+            text == expected or text.startswith(prefix) or text.endswith(suffix) or middle in text
+        )
+
+    def contains(answer: Any) -> bool:
+        if isinstance(answer, list):
+            return any((item if isinstance(item, str) else str(item)) == expected for item in answer)
+        return in_text(answer if isinstance(answer, str) else str(answer))
+    return contains
+
+
+def build_predicate(operator: str, value: Any) -> Predicate:
+    """Predicado sobre la respuesta de la pregunta referenciada."""
+    expected = str(value)
+    if operator == "equals":
+        return lambda answer: (answer if isinstance(answer, str) else str(answer)) == expected
+    if operator == "not_equals":
+        return lambda answer: (answer if isinstance(answer, str) else str(answer)) != expected
+    if operator == "in":
+        return _contains_item(expected)
+    if operator == "not_in":
+        contains = _contains_item(expected)
+        return lambda answer: not contains(answer)
+    return lambda answer: False
+
+
+class VisibilityRule:
+    __slots__ = ("question_id", "question_text", "depends_on", "predicate")
+
+    def __init__(self, question_id: str, question_text: str, depends_on: str, predicate: Predicate):
+        self.question_id = question_id
+        self.question_text = question_text
+        self.depends_on = depends_on
+        self.predicate = predicate
+
+
+class CompiledConditionalLogic:
+    def __init__(self, rules: List[VisibilityRule], dependencies: Dict[str, str], problems: Dict[str, str]):
+        self.rules = rules
+        # Pregunta condicional -> pregunta de la que depende
+        self.dependencies = dependencies
+        # Pregunta con una referencia rota o dentro de un ciclo -> mensaje de error
+        self.problems = problems
+        self.errors = list(dict.fromkeys(problems.values()))
+        self._checks = [(rule.question_id, rule.depends_on, rule.predicate, rule) for rule in rules]
+
+    def validate(self, answers: Dict[str, Any]):
+        """Rechaza (400) respuestas a preguntas que no deberían estar visibles."""
+        get = answers.get
+        for question_id, depends_on, predicate, rule in self._checks:
+            if question_id in answers and not predicate(get(depends_on)):
+                question_text = rule.question_text[:50] + "..." if len(rule.question_text) > 50 else rule.question_text
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"La pregunta '{question_text}' no debería ser visible según las respuestas proporcionadas"
+                )
+
+
+def _find_cycle(dependencies: Dict[str, str]) -> Optional[List[str]]:
+    """Devuelve un ciclo del grafo de dependencias (cada nodo tiene a lo sumo una salida)."""
+    finished = set()
+    for start in dependencies:
+        path, position = [], {}
+        node = start
+        while node in dependencies and node not in finished:
+            if node in position:
+                return path[position[node]:] + [node]
+            position[node] = len(path)
+            path.append(node)
+            node = dependencies[node]
+        finished.update(path)
+    return None
+
+
+def compile_conditional_logic(questions: List[dict], strict: bool = False) -> CompiledConditionalLogic:
+    """
+    Compila las condiciones `visible_if` de una lista de preguntas (documentos o
+    diccionarios con `_id`). Con `strict=True` las referencias rotas y los ciclos
+    lanzan `ConditionalLogicError`; si no, quedan en `errors`.
+    """
+    question_ids = {str(q.get("_id")) for q in questions}
+    texts = {str(q.get("_id")): q.get("text", "") for q in questions}
+    rules, dependencies, problems = [], {}, {}
+
+    for q in questions:
+        cond = q.get("visible_if")
+        if not cond:
+            continue
+        qid = str(q.get("_id"))
+        depends_on = str(cond.get("question_id") or "")
+        if depends_on not in question_ids:
+            problems[qid] = f"La pregunta '{q.get('text', qid)}' depende de una pregunta que no existe"
+        dependencies[qid] = depends_on
+        rules.append(VisibilityRule(qid, q.get("text", ""), depends_on, build_predicate(cond.get("operator", "equals"), cond.get("value"))))
+
+    cycle = _find_cycle(dependencies)
+    if cycle:
+        names = " -> ".join(f"'{texts.get(qid, qid)}'" for qid in cycle)
+        for qid in cycle:
+            problems.setdefault(qid, f"La lógica condicional tiene un ciclo: {names}")
+
+    logic = CompiledConditionalLogic(rules, dependencies, problems)
+    if strict and logic.errors:
+        raise ConditionalLogicError("; ".join(logic.errors))
+    return logic
@@ -0,0 +1,171 @@
+"""
+Claves de idempotencia para el envío de respuestas (cabecera `Idempotency-Key`).
+
+Un cliente que reintenta un envío con la misma clave recibe el `response_id`
+original sin volver a escribir en `survey_responses` ni en las estadísticas.
+
+Las claves viven en la colección `idempotency_keys`, con `_id` "<encuesta>:<clave>",
+y un índice TTL sobre `created_at` las purga. Delante hay una LRU en proceso de
+vida corta con las claves ya completadas, de modo que una tormenta de
+reintentos se resuelve sin ir a MongoDB.
+
+Cada clave guarda una huella (sha256) del cuerpo enviado. Reutilizar una clave
+con otro cuerpo se rechaza con 422. Un reintento que llega mientras el envío
+original sigue en curso recibe 409 con `Retry-After`; si el envío original
+falla, la reserva se libera para que el cliente pueda reintentar.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.database import get_collection
+from app.services.ttl_cache import TTLCache
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+MAX_KEY_LENGTH = 255
+# Segundos tras los que una reserva sin response_id se considera abandonada
+PENDING_TIMEOUT_SECONDS = 60
+
+
+def payload_fingerprint(payload: Any) -> str:
+    """Huella estable del cuerpo de un envío (independiente del orden de las claves)."""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def validate_idempotency_key(key: str):
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La cabecera Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres"
+        )
+
+
+class IdempotencyStore:
+    def __init__(self, max_entries: int, cache_ttl_seconds: float):
+        # Claves completadas: "<encuesta>:<clave>" -> (huella, response_id)
+        self._cache = TTLCache(max_entries, cache_ttl_seconds)
+        self.replays = 0
+        self.conflicts = 0
+
+    def _replay(self, fingerprint: str, stored_fingerprint: str, response_id: Optional[str]) -> str:
+        if stored_fingerprint != fingerprint:
+            self.conflicts += 1
+            raise HTTPException(
+                status_code=422,
+                detail="La clave de idempotencia ya se usó con otro envío"
+            )
+        if response_id is None:
+            self.conflicts += 1
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Hay un envío con esta clave de idempotencia en curso",
+                headers={"Retry-After": "1"}
+            )
+        self.replays += 1
+        return response_id
+
+    async def lookup(self, scope: str, key: str, fingerprint: str) -> Optional[str]:
+        """
+        `response_id` del envío original si la clave ya se completó, o None si
+        es nueva. Lanza 422 si la clave se usó con otro cuerpo y 409 si sigue en curso.
+        """
+        store_key = f"{scope}:{key}"
+        cached = self._cache.get(store_key)
+        if cached is not None:
+            return self._replay(fingerprint, *cached)
+
+        doc = await get_collection(IDEMPOTENCY_COLLECTION).find_one({"_id": store_key})
+        if doc is None:
+            return None
+        if doc.get("response_id") is None and doc["created_at"] < datetime.utcnow() - timedelta(seconds=PENDING_TIMEOUT_SECONDS):
+            # Reserva de un envío que nunca terminó (p. ej. el proceso se cayó): se descarta
+            await get_collection(IDEMPOTENCY_COLLECTION).delete_one(
+                {"_id": store_key, "response_id": None, "created_at": doc["created_at"]}
+            )
+            return None
+        if doc.get("response_id") is not None:
+            self._cache.set(store_key, (doc["fingerprint"], doc["response_id"]))
+        return self._replay(fingerprint, doc["fingerprint"], doc.get("response_id"))
+
+    async def reserve(self, scope: str, key: str, fingerprint: str) -> Optional[str]:
+        """
+        Reserva la clave antes de insertar. Si otra petición la reservó entre
+        `lookup` y este punto, devuelve su `response_id` (o lanza 409/422).
+        """
+        store_key = f"{scope}:{key}"
+        for _ in range(2):
+            try:
+                await get_collection(IDEMPOTENCY_COLLECTION).insert_one({
+                    "_id": store_key,
+                    "fingerprint": fingerprint,
+                    "response_id": None,
+                    "created_at": datetime.utcnow(),
+                })
+                return None
+            except DuplicateKeyError:
+                replayed = await self.lookup(scope, key, fingerprint)
+                if replayed is not None:
+                    return replayed
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hay un envío con esta clave de idempotencia en curso",
+            headers={"Retry-After": "1"}
+        )
+
+    async def complete(self, scope: str, key: str, fingerprint: str, response_id: str):
+        store_key = f"{scope}:{key}"
+        await get_collection(IDEMPOTENCY_COLLECTION).update_one(
+            {"_id": store_key}, {"$set": {"response_id": response_id}}
+        )
+        self._cache.set(store_key, (fingerprint, response_id))
+
+    async def release(self, scope: str, key: str):
+        """Libera una clave reservada cuyo envío falló, para que el cliente pueda reintentar."""
+        await get_collection(IDEMPOTENCY_COLLECTION).delete_one({"_id": f"{scope}:{key}", "response_id": None})
+
+    async def run_once(
+        self,
+        scope: str,
+        key: Optional[str],
+        fingerprint: Optional[str],
+        insert: Callable[[], Awaitable[Any]],
+    ) -> Tuple[str, bool]:
+        """
+        Ejecuta `insert` una sola vez por clave. Devuelve (response_id, reintento);
+        sin clave equivale a llamar a `insert`.
+        """
+        if not key:
+            return str(await insert()), False
+        replayed = await self.reserve(scope, key, fingerprint)
+        if replayed is not None:
+            return replayed, True
+        try:
+            response_id = str(await insert())
+        except BaseException:
+            await self.release(scope, key)
+            raise
+        await self.complete(scope, key, fingerprint, response_id)
+        return response_id, False
+
+    def metrics(self) -> Dict[str, Any]:
+        cache = self._cache.metrics()
+        return {
+            "entries": cache["entries"],
+            "max_entries": cache["max_entries"],
+            "cache_ttl_seconds": cache["ttl_seconds"],
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "hit_ratio": cache["hit_ratio"],
+            "replays": self.replays,
+            "conflicts": self.conflicts,
+        }
+
+
+idempotency_store = IdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_CACHE_MAX_ENTRIES,
+    cache_ttl_seconds=settings.IDEMPOTENCY_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,282 @@
+"""
+Estadísticas vectorizadas con NumPy para number_input y satisfaction_scale.
+
+Las respuestas de cada pregunta numérica se reúnen en un arreglo contiguo de
+float64 y todas las métricas (media, mediana, percentiles, desviación estándar,
+histograma y distribución de la escala) se calculan en bloque.
+
+Todos los motores de estadísticas devuelven para number_input el resumen que
+arma `numeric_summary`, y calculan los límites del histograma con
+`histogram_edges` a partir de conteo, extremos, rango intercuartílico y
+desviación. Así los intervalos son los mismos aunque el motor no tenga todos
+los valores en memoria, y su número queda acotado por
+`STATS_HISTOGRAM_MAX_BINS`.
+
+El motor materializado no guarda cada valor: los cuenta por `value_bucket`
+(el valor redondeado a `BUCKET_DIGITS` cifras significativas), lo que acota el
+número de claves por pregunta a unas 38 000 sin importar cuántos valores
+distintos lleguen. `summarize_numeric_buckets` calcula el resumen a partir de
+esos conteos y de la suma, la suma de cuadrados y los extremos exactos:
+conteo, media, desviación y extremos son exactos; percentiles e histograma
+también lo son si los valores tienen a lo sumo `BUCKET_DIGITS` cifras
+significativas (edades, puntuaciones, precios), y si no tienen un error
+relativo de a lo sumo 0,5 %.
+"""
+import math
+from typing import Dict, Any, Iterable, Mapping, Optional, Tuple, Union
+import numpy as np
+from app.config import settings
+
+PERCENTILES = (25, 75, 90, 99)
+# Percentiles que calcula cada motor (la mediana es el 50)
+SUMMARY_PERCENTILES = (25, 50, 75, 90, 99)
+
+# None: intervalos de ancho fijo `bin_size` (mismas etiquetas que compute_histogram)
+# int: número de intervalos iguales entre min y max
+# str: estrategia de ancho ("sqrt", "sturges", "rice", "scott", "fd" o "auto"),
+#      con las mismas fórmulas que np.histogram_bin_edges
+HistogramBins = Optional[Union[int, str]]
+
+HISTOGRAM_BIN_SIZE = 10
+
+# Conteos acotados de number_input (ver `value_bucket`)
+BUCKET_DIGITS = 3
+# Magnitudes fuera de este rango se cuentan en el extremo (por debajo, como cero)
+BUCKET_MIN_MAGNITUDE = 1e-6
+BUCKET_MAX_MAGNITUDE = 1e15
+
+
+def to_array(values: Iterable[Any]) -> np.ndarray:
+    """Convierte las respuestas a un arreglo float64, descartando las no numéricas o no finitas."""
+    if isinstance(values, np.ndarray):
+        arr = values.astype(np.float64, copy=False)
+    else:
+        arr = np.fromiter(_as_floats(values), dtype=np.float64)
+    return arr[np.isfinite(arr)]
+
+
+def _as_floats(values: Iterable[Any]):
+    for v in values:
+        try:
+            yield float(v)
+        except (ValueError, TypeError):
+            continue
+
+
+def _strategy_width(strategy: str, count: int, value_range: float, iqr: Optional[float], std: Optional[float]) -> float:
+    """Ancho de intervalo de cada estrategia, como en np.histogram_bin_edges."""
+    sturges = value_range / (math.log2(count) + 1.0)
+    if strategy == "sqrt":
+        return value_range / math.sqrt(count)
+    if strategy == "sturges":
+        return sturges
+    if strategy == "rice":
+        return value_range / (2.0 * count ** (1.0 / 3))
+    if strategy == "scott":
+        # NumPy usa la desviación poblacional
+        population_std = (std or 0.0) * math.sqrt((count - 1) / count) if count > 1 else 0.0
+        return (24.0 * math.pi ** 0.5 / count) ** (1.0 / 3.0) * population_std
+    if strategy in ("fd", "auto"):
+        fd = 2.0 * (iqr or 0.0) * count ** (-1.0 / 3.0)
+        if strategy == "fd":
+            return fd
+        # "auto" limita el número de intervalos con la mitad del ancho de "sqrt"
+        return min(max(fd, value_range / math.sqrt(count) / 2), sturges)
+    raise ValueError(f"Estrategia de histograma no soportada: {strategy}")
+
+
+def histogram_edges(
+    count: int,
+    minimum: float,
+    maximum: float,
+    bins: HistogramBins = None,
+    iqr: Optional[float] = None,
+    std: Optional[float] = None,
+    bin_size: int = HISTOGRAM_BIN_SIZE,
+    max_bins: Optional[int] = None,
+) -> Tuple[np.ndarray, bool]:
+    """
+    Límites del histograma a partir de un resumen de los valores.
+    Devuelve (límites, ancho_fijo); `iqr` solo lo usan "fd"/"auto" y `std` (muestral) "scott".
+    """
+    max_bins = max_bins or settings.STATS_HISTOGRAM_MAX_BINS
+    if bins is None:
+        first, last = math.floor(minimum / bin_size), math.floor(maximum / bin_size)
+        if last - first + 1 <= max_bins:
+            return np.arange(first, last + 2, dtype=np.float64) * bin_size, True
+        bins = max_bins
+
+    first_edge, last_edge = float(minimum), float(maximum)
+    if first_edge == last_edge:
+        first_edge, last_edge = first_edge - 0.5, last_edge + 0.5
+    if isinstance(bins, str):
+        width = _strategy_width(bins, count, float(maximum) - float(minimum), iqr, std)
+        n_bins = int(math.ceil((last_edge - first_edge) / width)) if width else 1
+    else:
+        n_bins = int(bins)
+    n_bins = max(1, min(n_bins, max_bins))
+    return np.linspace(first_edge, last_edge, n_bins + 1), False
+
+
+def format_histogram(edges: np.ndarray, counts: Iterable[int], fixed_width: bool) -> Dict[str, int]:
+    """Etiquetas del histograma; solo incluye los intervalos con valores."""
+    histogram = {}
+    for i, count in enumerate(counts):
+        if not count:
+            continue
+        if fixed_width:
+            label = f"{int(edges[i])}-{int(edges[i + 1]) - 1}"
+        else:
+            label = f"{edges[i]:g}-{edges[i + 1]:g}"
+        histogram[label] = int(count)
+    return histogram
+
+
+def numeric_summary(
+    count: int,
+    mean: float,
+    std: Optional[float],
+    minimum: float,
+    maximum: float,
+    percentiles: Mapping[int, float],
+    histogram: Dict[str, int],
+) -> Dict[str, Any]:
+    """Resumen de number_input con la forma común a todos los motores."""
+    summary = {
+        "count": int(count),
+        "avg": round(float(mean), 2),
+        "median": round(float(percentiles[50]), 2),
+        "min": float(minimum),
+        "max": float(maximum),
+        "std": round(float(std), 2) if std and count > 1 else 0.0,
+        "histogram": histogram,
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(float(percentiles[p]), 2)
+    return summary
+
+
+def summarize_numeric(values: Iterable[Any], bins: HistogramBins = None) -> Dict[str, Any]:
+    """Resumen de una pregunta number_input: media, mediana, extremos, percentiles e histograma."""
+    arr = to_array(values)
+    if arr.size == 0:
+        return {}
+    percentiles = dict(zip(SUMMARY_PERCENTILES, np.percentile(arr, SUMMARY_PERCENTILES)))
+    std = float(arr.std(ddof=1)) if arr.size > 1 else 0.0
+    minimum, maximum = float(arr.min()), float(arr.max())
+    edges, fixed_width = histogram_edges(arr.size, minimum, maximum, bins, percentiles[75] - percentiles[25], std)
+    counts, _ = np.histogram(arr, bins=edges)
+    return numeric_summary(
+        arr.size, arr.mean(), std, minimum, maximum, percentiles,
+        format_histogram(edges, counts, fixed_width)
+    )
+
+
+def percentile_positions(count: int, ps: Iterable[int] = SUMMARY_PERCENTILES) -> Dict[int, Tuple[int, float]]:
+    """Índice (0-based) del valor inferior y fracción de cada percentil entre `count` valores ordenados."""
+    positions = {}
+    for p in ps:
+        position = p / 100 * (count - 1)
+        lower = math.floor(position)
+        positions[p] = (lower, position - lower)
+    return positions
+
+
+def interpolate(below, above, fraction):
+    """Interpolación lineal con la misma fórmula que np.percentile (admite arreglos)."""
+    diff = above - below
+    return np.where(fraction >= 0.5, above - diff * (1 - fraction), below + diff * fraction)
+
+
+def _percentiles_from_counts(values: np.ndarray, counts: np.ndarray, ps: Iterable[int]) -> np.ndarray:
+    """Percentiles con interpolación lineal (igual que np.percentile) a partir de conteos por valor ordenado."""
+    cumulative = np.cumsum(counts)
+    total = int(cumulative[-1])
+    positions = np.asarray(ps, dtype=np.float64) / 100 * (total - 1)
+    lower = np.floor(positions)
+    upper = np.minimum(lower + 1, total - 1)
+    below = values[np.searchsorted(cumulative, lower, side="right")]
+    above = values[np.searchsorted(cumulative, upper, side="right")]
+    return interpolate(below, above, positions - lower)
+
+
+def value_bucket(value: float) -> str:
+    """Clave del conteo de un valor: el valor redondeado a `BUCKET_DIGITS` cifras significativas."""
+    magnitude = abs(value)
+    if magnitude < BUCKET_MIN_MAGNITUDE:
+        return "0"
+    return format(math.copysign(min(magnitude, BUCKET_MAX_MAGNITUDE), value), f".{BUCKET_DIGITS}g")
+
+
+def summarize_numeric_buckets(
+    bucket_counts: Mapping[Any, int],
+    count: int,
+    total: float,
+    total_squares: float,
+    minimum: float,
+    maximum: float,
+    bins: HistogramBins = None,
+) -> Dict[str, Any]:
+    """Igual que `summarize_numeric`, a partir de conteos por `value_bucket` y de los momentos exactos."""
+    weighted = {}
+    for key, n in bucket_counts.items():
+        try:
+            value = float(key)
+        except (ValueError, TypeError):
+            continue
+        if math.isfinite(value) and n:
+            weighted[value] = weighted.get(value, 0) + n
+    if not weighted or not count:
+        return {}
+    # El redondeo puede dejar el valor de un extremo fuera de [mínimo, máximo]
+    values = np.clip(np.fromiter(sorted(weighted), dtype=np.float64), minimum, maximum)
+    counts = np.fromiter((weighted[v] for v in sorted(weighted)), dtype=np.int64)
+    mean = total / count
+    std = math.sqrt(max(0.0, (total_squares - total * mean) / (count - 1))) if count > 1 else 0.0
+    percentiles = dict(zip(SUMMARY_PERCENTILES, _percentiles_from_counts(values, counts, SUMMARY_PERCENTILES)))
+    edges, fixed_width = histogram_edges(count, minimum, maximum, bins, percentiles[75] - percentiles[25], std)
+    hist_counts, _ = np.histogram(values, bins=edges, weights=counts)
+    return numeric_summary(
+        count, mean, std, minimum, maximum, percentiles,
+        format_histogram(edges, hist_counts.astype(np.int64), fixed_width)
+    )
+
+
+def summarize_scale(values: Iterable[Any]) -> Dict[str, Any]:
+    """Distribución de una escala de satisfacción: porcentaje por nivel, media y desviación."""
+    arr = to_array(values)
+    if arr.size == 0:
+        return {}
+    levels, counts = np.unique(arr, return_counts=True)
+    return _scale_summary(levels, counts)
+
+
+def summarize_scale_counts(option_counts: Dict[str, int]) -> Dict[str, Any]:
+    """Igual que `summarize_scale`, a partir de los conteos por opción ya agregados."""
+    weighted = {}
+    for key, count in option_counts.items():
+        try:
+            level = float(key)
+        except (ValueError, TypeError):
+            continue
+        if np.isfinite(level):
+            weighted[level] = weighted.get(level, 0) + count
+    if not weighted:
+        return {}
+    levels = np.fromiter(sorted(weighted), dtype=np.float64)
+    counts = np.fromiter((weighted[level] for level in levels), dtype=np.int64)
+    return _scale_summary(levels, counts)
+
+
+def _scale_summary(levels: np.ndarray, counts: np.ndarray) -> Dict[str, Any]:
+    total = counts.sum()
+    avg = float(np.dot(levels, counts) / total)
+    variance = float(np.dot(counts, (levels - avg) ** 2) / (total - 1)) if total > 1 else 0.0
+    percentages = counts * (100.0 / total)
+    return {
+        "avg": round(avg, 2),
+        "std": round(variance ** 0.5, 2),
+        "distribution": {
+            f"{level:g}": round(float(pct), 1) for level, pct in zip(levels, percentages)
+        },
+    }
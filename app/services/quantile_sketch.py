@@ -0,0 +1,147 @@
+"""
+Sketch de cuantiles KLL (Karnin, Lang, Liberty, 2016).
+
+Resume un flujo de números en memoria acotada (O(k) elementos, sin importar
+cuántos valores se inserten) y responde cuantiles aproximados. Dos sketches se
+pueden combinar con `merge`, lo que permite procesar lotes por separado.
+
+Garantía: con `k` elementos por nivel el error de rango normalizado es
+aproximadamente 1.7 / k con alta probabilidad (≈ 0.85% con k=200). Es decir, el
+valor devuelto para el cuantil q tiene un rango real dentro de q ± 1.7 / k.
+`min`, `max`, `count` y `sum` se mantienen exactos.
+"""
+import math
+import random
+from typing import Optional
+
+DEFAULT_K = 200
+
+
+class _Compactor(list):
+    """Nivel del sketch: cuando se llena, conserva la mitad de sus elementos."""
+
+    def compact(self, rnd: random.Random) -> list:
+        self.sort()
+        last_item = self.pop() if len(self) % 2 == 1 else None
+        offset = rnd.randint(0, 1)
+        survivors = self[offset::2]
+        self.clear()
+        if last_item is not None:
+            self.append(last_item)
+        return survivors
+
+
+class KLLSketch:
+    def __init__(self, k: int = DEFAULT_K, c: float = 2.0 / 3.0, seed: Optional[int] = None):
+        if k < 8:
+            raise ValueError("k debe ser al menos 8")
+        self.k = k
+        self.c = c
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._rnd = random.Random(seed)
+        self._compactors: list[_Compactor] = []
+        self._size = 0
+        self._max_size = 0
+        self._grow()
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self._compactors) - height - 1
+        return int(math.ceil(self.c ** depth * self.k)) + 1
+
+    def _grow(self):
+        self._compactors.append(_Compactor())
+        self._max_size = sum(self._capacity(h) for h in range(len(self._compactors)))
+
+    def _compress(self):
+        for height, compactor in enumerate(self._compactors):
+            if len(compactor) >= self._capacity(height):
+                if height + 1 >= len(self._compactors):
+                    self._grow()
+                self._compactors[height + 1].extend(compactor.compact(self._rnd))
+                self._size = sum(len(c) for c in self._compactors)
+                break
+
+    def update(self, value: float):
+        """Inserta un valor en el sketch."""
+        self._compactors[0].append(value)
+        self._size += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        """Combina otro sketch en este (el resultado resume ambos flujos)."""
+        while len(self._compactors) < len(other._compactors):
+            self._grow()
+        for height, compactor in enumerate(other._compactors):
+            self._compactors[height].extend(compactor)
+        self._size = sum(len(c) for c in self._compactors)
+        while self._size >= self._max_size:
+            self._compress()
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def _weighted_items(self) -> list[tuple[float, int]]:
+        items = [(item, 2 ** height) for height, c in enumerate(self._compactors) for item in c]
+        items.sort(key=lambda pair: pair[0])
+        return items
+
+    def rank(self, value: float, inclusive: bool = True) -> int:
+        """Número aproximado de valores insertados menores o iguales (o solo menores) a `value`."""
+        if inclusive:
+            return sum(
+                (2 ** height) * sum(1 for item in c if item <= value)
+                for height, c in enumerate(self._compactors)
+            )
+        return sum(
+            (2 ** height) * sum(1 for item in c if item < value)
+            for height, c in enumerate(self._compactors)
+        )
+
+    def quantiles(self, qs: list[float]) -> list[Optional[float]]:
+        """Devuelve los cuantiles aproximados para cada q en [0, 1]."""
+        if self.count == 0:
+            return [None for _ in qs]
+        items = self._weighted_items()
+        total = sum(weight for _, weight in items)
+        results = []
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError("El cuantil debe estar entre 0 y 1")
+            if q == 0:
+                results.append(self.min)
+                continue
+            if q == 1:
+                results.append(self.max)
+                continue
+            target = q * total
+            cumulative = 0
+            value = items[-1][0]
+            for item, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    value = item
+                    break
+            results.append(value)
+        return results
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def retained(self) -> int:
+        """Elementos almacenados actualmente (memoria usada por el sketch)."""
+        return self._size
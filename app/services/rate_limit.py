@@ -0,0 +1,264 @@
+"""
+Control de admisión con token buckets para los endpoints públicos.
+
+Cada ruta protegida tiene un límite por encuesta y otro por IP de cliente, con
+el formato "<peticiones>/<segundos>" (p. ej. "60/60": ráfagas de hasta 60
+peticiones que se recargan a razón de una por segundo). Un límite vacío
+desactiva ese bucket. Los buckets de una petición se comprueban juntos y solo
+se consume un token de cada uno si todos lo tienen: una petición rechazada por
+el límite de la encuesta no gasta el de la IP, ni al revés. Una petición
+rechazada recibe 429 con `Retry-After`. El limitador está desactivado por
+defecto (`RATE_LIMIT_ENABLED`).
+
+Los contadores viven en un backend intercambiable:
+
+- `memory`: dict en proceso (LRU acotada); cada worker tiene sus propios buckets.
+- `sqlite`: archivo SQLite local que comparten todos los workers de la máquina,
+  a modo de sustituto de un almacén compartido tipo Redis.
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from app.config import settings
+
+# Cada cuántas escrituras se purgan del archivo SQLite los buckets ya llenos
+PRUNE_EVERY = 1000
+
+# (clave, capacidad, recarga por segundo)
+Bucket = Tuple[str, float, float]
+
+
+def parse_limit(value: str) -> Optional[Tuple[float, float]]:
+    """"N/S" -> (capacidad, recarga por segundo); vacío -> None (sin límite)."""
+    if not value:
+        return None
+    try:
+        requests, seconds = value.split("/")
+        capacity, period = float(requests), float(seconds)
+    except ValueError:
+        raise ValueError(f"Límite inválido: {value!r} (se espera '<peticiones>/<segundos>')")
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f"Límite inválido: {value!r}")
+    return capacity, capacity / period
+
+
+def _refill(tokens: float, updated: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryRateLimitBackend:
+    """Buckets en un dict del proceso, con las claves menos usadas descartadas al llenarse."""
+
+    name = "memory"
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, tuple[float, float, float, float]]" = OrderedDict()
+
+    async def acquire(self, buckets: List[Bucket]) -> Tuple[Optional[int], float]:
+        """
+        Consume un token de cada bucket si todos tienen uno. Devuelve (None, 0)
+        si se admite, o (índice del primer bucket vacío, segundos hasta su próximo token).
+        """
+        now = time.monotonic()
+        levels = []
+        for index, (key, capacity, rate) in enumerate(buckets):
+            tokens, updated = self._buckets.get(key, (capacity, now))[:2]
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            if tokens < 1:
+                return index, (1 - tokens) / rate
+            levels.append(tokens)
+        for (key, capacity, rate), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens - 1, now, capacity, rate)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return None, 0.0
+
+    async def fill_levels(self) -> List[Tuple[str, float]]:
+        """(clave, fracción de tokens disponibles ahora) de cada bucket."""
+        now = time.monotonic()
+        return [
+            (key, _refill(tokens, updated, now, capacity, rate) / capacity)
+            for key, (tokens, updated, capacity, rate) in self._buckets.items()
+        ]
+
+
+class SQLiteRateLimitBackend:
+    """Buckets en un archivo SQLite compartido entre procesos de la misma máquina."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, "
+                "capacity REAL NOT NULL, rate REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _acquire(self, buckets: List[Bucket]) -> Tuple[Optional[int], float]:
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = []
+                for index, (key, capacity, rate) in enumerate(buckets):
+                    row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                    tokens = _refill(row[0], row[1], now, capacity, rate) if row else capacity
+                    if tokens < 1:
+                        conn.execute("ROLLBACK")
+                        return index, (1 - tokens) / rate
+                    levels.append(tokens)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated, capacity, rate) VALUES (?, ?, ?, ?, ?)",
+                    [(key, tokens - 1, now, capacity, rate) for (key, capacity, rate), tokens in zip(buckets, levels)]
+                )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    # Un bucket que ya se recargó del todo equivale a uno inexistente
+                    conn.execute("DELETE FROM buckets WHERE updated + capacity / rate < ?", (now,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return None, 0.0
+
+    async def acquire(self, buckets: List[Bucket]) -> Tuple[Optional[int], float]:
+        return await asyncio.to_thread(self._acquire, buckets)
+
+    def _fill_levels(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            rows = self._connection().execute("SELECT key, tokens, updated, capacity, rate FROM buckets").fetchall()
+        now = time.time()
+        return [
+            (key, _refill(tokens, updated, now, capacity, rate) / capacity)
+            for key, tokens, updated, capacity, rate in rows
+        ]
+
+    async def fill_levels(self) -> List[Tuple[str, float]]:
+        return await asyncio.to_thread(self._fill_levels)
+
+
+def build_backend(name: str):
+    if name == "sqlite":
+        return SQLiteRateLimitBackend(settings.RATE_LIMIT_SQLITE_PATH)
+    if name == "memory":
+        return MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_BUCKETS)
+    raise ValueError(f"Backend de rate limiting desconocido: {name}")
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[str, Dict[str, str]], enabled: bool = True, trust_forwarded: bool = False):
+        self.backend = backend
+        self.enabled = enabled
+        self.trust_forwarded = trust_forwarded
+        # ruta -> {"survey": (capacidad, recarga), "ip": (capacidad, recarga)}
+        self.limits = {
+            route: {scope: parse_limit(value) for scope, value in scopes.items()}
+            for route, scopes in limits.items()
+        }
+        self.allowed: Dict[str, int] = {route: 0 for route in self.limits}
+        self.rejected: Dict[str, Dict[str, int]] = {route: {"survey": 0, "ip": 0} for route in self.limits}
+
+    def client_ip(self, request: Request) -> str:
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "desconocida"
+
+    async def check(self, route: str, request: Request, survey_id: Optional[str] = None):
+        """Consume un token de cada bucket de la ruta si todos lo tienen; si no, lanza 429 con Retry-After."""
+        if not self.enabled:
+            return
+        limits = self.limits[route]
+        candidates = [("ip", f"{route}:ip:{self.client_ip(request)}")]
+        if survey_id is not None:
+            candidates.append(("survey", f"{route}:survey:{survey_id}"))
+        scopes, buckets = [], []
+        for scope, key in candidates:
+            limit = limits.get(scope)
+            if limit is not None:
+                scopes.append(scope)
+                buckets.append((key, *limit))
+
+        rejected, retry_after = await self.backend.acquire(buckets) if buckets else (None, 0.0)
+        if rejected is not None:
+            self.rejected[route][scopes[rejected]] += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Demasiadas solicitudes. Inténtalo de nuevo en unos segundos.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+        self.allowed[route] += 1
+
+    def dependency(self, route: str, survey_param: Optional[str] = None):
+        """Dependencia de FastAPI que aplica los límites de `route` (y de la encuesta en `survey_param`)."""
+        if route not in self.limits:
+            raise ValueError(f"Ruta sin límites configurados: {route}")
+
+        async def enforce(request: Request):
+            survey_id = request.path_params.get(survey_param) if survey_param else None
+            await self.check(route, request, survey_id)
+        return enforce
+
+    async def metrics(self) -> Dict[str, Any]:
+        levels = await self.backend.fill_levels()
+        fills = [fill for _, fill in levels]
+        lowest = sorted(levels, key=lambda item: item[1])[:10]
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "limits": {
+                route: {
+                    scope: {"capacity": limit[0], "refill_per_second": round(limit[1], 4)} if limit else None
+                    for scope, limit in scopes.items()
+                }
+                for route, scopes in self.limits.items()
+            },
+            "allowed": dict(self.allowed),
+            "rejected": {route: dict(scopes) for route, scopes in self.rejected.items()},
+            "buckets": {
+                "count": len(levels),
+                "avg_fill": round(sum(fills) / len(fills), 4) if fills else None,
+                "empty": sum(1 for fill in fills if fill < 1e-9),
+                "lowest": [{"key": key, "fill": round(fill, 4)} for key, fill in lowest],
+            },
+        }
+
+
+rate_limiter = RateLimiter(
+    backend=build_backend(settings.RATE_LIMIT_BACKEND),
+    limits={
+        "submit_response": {
+            "survey": settings.RATE_LIMIT_SUBMIT_PER_SURVEY,
+            "ip": settings.RATE_LIMIT_SUBMIT_PER_IP,
+        },
+        "public_survey": {
+            "survey": settings.RATE_LIMIT_PUBLIC_SURVEY_PER_SURVEY,
+            "ip": settings.RATE_LIMIT_PUBLIC_SURVEY_PER_IP,
+        },
+        "invitation_access": {
+            "ip": settings.RATE_LIMIT_INVITATION_PER_IP,
+        },
+    },
+    enabled=settings.RATE_LIMIT_ENABLED,
+    trust_forwarded=settings.RATE_LIMIT_TRUST_FORWARDED,
+)
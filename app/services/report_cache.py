@@ -0,0 +1,169 @@
+"""
+Caché en disco de informes PDF direccionada por contenido.
+
+La clave es un hash de (id de encuesta, `updated_at`, versión de las
+estadísticas materializadas): mientras no se registren respuestas nuevas ni
+cambie la encuesta, el mismo PDF se sirve sin regenerarse y la clave sirve como
+ETag fuerte. La versión (`rev` del documento de `survey_stats`) solo cambia
+cuando las estadísticas ya incluyen el envío, así que un informe generado
+entre la inserción de una respuesta y su registro no queda cacheado con la
+clave nueva.
+
+- Los informes se guardan en `REPORTS_DIR/cache/` y se expulsan por LRU cuando
+  el total supera `REPORT_CACHE_MAX_BYTES` (la fecha de acceso se guarda como
+  mtime del archivo, así el orden sobrevive a reinicios).
+- Los informes de encuestas cerradas ya no cambian: se guardan en
+  `REPORTS_DIR/cache/pinned/` y nunca se expulsan.
+"""
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+from app.config import settings
+from app.services.survey_report import build_survey_report
+from app.services.survey_stats_store import get_stats_version
+from app.services.utils import update_survey_status
+
+
+def get_data_version(survey: dict, stats_version: str) -> str:
+    """Versión de los datos del informe: cambia con la encuesta o con respuestas registradas."""
+    updated_at = survey.get("updated_at")
+    updated = updated_at.isoformat() if isinstance(updated_at, datetime) else str(updated_at)
+    return f"{updated}:{stats_version}"
+
+
+class _KeyLock:
+    """Lock de una clave y cuántas peticiones lo usan (se descarta cuando nadie lo espera)."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ReportCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.pinned_directory = os.path.join(directory, "pinned")
+        self.tmp_directory = os.path.join(directory, "tmp")
+        self.max_bytes = max_bytes
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._locks: Dict[str, _KeyLock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cache_key(self, survey: dict, stats_version: str) -> str:
+        version = f"{survey['_id']}:{get_data_version(survey, stats_version)}"
+        return hashlib.sha256(version.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, pinned: bool) -> str:
+        return os.path.join(self.pinned_directory if pinned else self.directory, f"{key}.pdf")
+
+    def _load_index(self):
+        """Reconstruye el índice LRU a partir de los archivos existentes."""
+        for path in (self.directory, self.pinned_directory, self.tmp_directory):
+            os.makedirs(path, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._total_bytes = sum(self._index.values())
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Ruta del informe cacheado, o None si no existe."""
+        if self._index is None:
+            self._load_index()
+        pinned_path = self._path(key, pinned=True)
+        if os.path.exists(pinned_path):
+            return pinned_path
+        if key in self._index:
+            path = self._path(key, pinned=False)
+            if os.path.exists(path):
+                self._index.move_to_end(key)
+                now = time.time()
+                os.utime(path, (now, now))
+                return path
+            self._total_bytes -= self._index.pop(key)
+        return None
+
+    def _store(self, tmp_path: str, key: str, pinned: bool) -> str:
+        path = self._path(key, pinned)
+        os.replace(tmp_path, path)
+        if not pinned:
+            self._index[key] = os.path.getsize(path)
+            self._total_bytes += self._index[key]
+            self._evict(keep=key)
+        return path
+
+    def _evict(self, keep: str):
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = next(iter(self._index.items()))
+            if key == keep:
+                break
+            del self._index[key]
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key, pinned=False))
+            except FileNotFoundError:
+                pass
+
+    async def get_or_build(self, survey: dict, stats_version: str = None) -> str:
+        """Devuelve la ruta del informe de la encuesta, generándolo si no está cacheado."""
+        if stats_version is None:
+            stats_version = await get_stats_version(str(survey["_id"]))
+        key = self.cache_key(survey, stats_version)
+
+        path = self.lookup(key)
+        if path:
+            self.hits += 1
+            return path
+
+        # Una sola generación por clave aunque lleguen varias peticiones a la vez
+        key_lock = self._locks.setdefault(key, _KeyLock())
+        key_lock.users += 1
+        try:
+            async with key_lock.lock:
+                path = self.lookup(key)
+                if path:
+                    self.hits += 1
+                    return path
+                self.misses += 1
+                tmp_path = os.path.join(self.tmp_directory, f"{key}.{uuid.uuid4().hex}.pdf")
+                try:
+                    await build_survey_report(survey, tmp_path)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                pinned = update_survey_status(survey) == "closed"
+                return self._store(tmp_path, key, pinned)
+        finally:
+            key_lock.users -= 1
+            if key_lock.users == 0:
+                self._locks.pop(key, None)
+
+    def metrics(self) -> dict:
+        if self._index is None:
+            self._load_index()
+        return {
+            "entries": len(self._index),
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+report_cache = ReportCache(
+    directory=os.path.join(settings.REPORTS_DIR, "cache"),
+    max_bytes=settings.REPORT_CACHE_MAX_BYTES,
+)
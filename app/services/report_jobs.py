@@ -0,0 +1,205 @@
+"""
+Trabajos de informes PDF en segundo plano (colección `report_jobs`).
+
+`POST /{id}/reports` encola un trabajo y responde de inmediato con su id; un
+grupo de workers asyncio lo ejecuta (el PDF se genera en el pool de cómputo) y
+lo deja en la caché de informes (`app.services.report_cache`), que escribe
+cada versión en su propio archivo.
+
+- Deduplicación: si ya existe un trabajo activo o terminado para la misma
+  encuesta y versión de datos (`updated_at` + versión de las estadísticas), se
+  devuelve ese trabajo. Un índice único parcial sobre los trabajos activos
+  evita duplicados aun con peticiones simultáneas.
+- Límite por usuario: como máximo `REPORT_JOBS_PER_USER` trabajos en cola o en
+  ejecución por usuario. Cada trabajo activo ocupa un hueco (`slot`) y un índice
+  único parcial sobre (usuario, hueco) impide que dos peticiones simultáneas
+  ocupen el mismo.
+- El informe se genera con las estadísticas vigentes al ejecutarse el trabajo;
+  al terminar, `data_version` pasa a ser la versión que realmente se generó.
+
+Los trabajos que estaban en cola en un proceso que se reinicia no se reanudan:
+pasados `REPORT_JOB_STALE_SECONDS` sin empezar se marcan como fallidos y se
+pueden volver a pedir. Un trabajo en ejecución renueva `heartbeat_at` cada
+`REPORT_JOB_HEARTBEAT_SECONDS`; solo caduca si deja de hacerlo ese mismo tiempo,
+y un worker cuyo trabajo ya caducó descarta su resultado.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.database import get_collection
+from app.services.report_cache import get_data_version, report_cache
+from app.services.survey_stats_store import get_stats_version
+
+JOBS_COLLECTION = "report_jobs"
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+
+class ReportJobLimitExceeded(Exception):
+    """El usuario ya tiene el máximo de trabajos activos."""
+
+
+def serialize_job(job: dict) -> dict:
+    return {
+        "job_id": job["_id"],
+        "survey_id": str(job["survey_id"]),
+        "status": job["status"],
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "error": job.get("error"),
+    }
+
+
+class ReportJobManager:
+    def __init__(self, workers: int, per_user_limit: int):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, survey: dict, user_id: str) -> dict:
+        """Encola un informe de la encuesta o devuelve el trabajo equivalente existente."""
+        jobs_collection = get_collection(JOBS_COLLECTION)
+        await self._expire_stale_jobs()
+        data_version = get_data_version(survey, await get_stats_version(str(survey["_id"])))
+
+        existing = await self._find_reusable(survey["_id"], data_version)
+        if existing:
+            return existing
+
+        taken = {
+            job.get("slot")
+            async for job in jobs_collection.find({"user_id": user_id, "active": True}, {"slot": 1})
+        }
+        job_id = str(uuid.uuid4())
+        for slot in range(self.per_user_limit):
+            if slot in taken:
+                continue
+            job = {
+                "_id": job_id,
+                "survey_id": survey["_id"],
+                "user_id": user_id,
+                "data_version": data_version,
+                "status": "queued",
+                "active": True,
+                "slot": slot,
+                "created_at": datetime.utcnow(),
+            }
+            try:
+                await jobs_collection.insert_one(job)
+                break
+            except DuplicateKeyError:
+                # Otra petición creó el mismo trabajo u ocupó el hueco en paralelo
+                existing = await self._find_reusable(survey["_id"], data_version)
+                if existing:
+                    return existing
+        else:
+            raise ReportJobLimitExceeded(f"Ya tienes {self.per_user_limit} informes en proceso")
+
+        await self._queue.put(job_id)
+        return job
+
+    async def _expire_stale_jobs(self):
+        """Marca como fallidos los trabajos abandonados: en cola sin empezar o en ejecución sin latido."""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.REPORT_JOB_STALE_SECONDS)
+        await get_collection(JOBS_COLLECTION).update_many(
+            {"active": True, "$or": [
+                {"status": "queued", "created_at": {"$lt": cutoff}},
+                {"status": "running", "heartbeat_at": {"$lt": cutoff}},
+            ]},
+            {"$set": {"status": "failed", "error": "Trabajo interrumpido", "finished_at": datetime.utcnow()},
+             "$unset": {"active": ""}}
+        )
+
+    async def _find_reusable(self, survey_id, data_version: str) -> Optional[dict]:
+        jobs_collection = get_collection(JOBS_COLLECTION)
+        job = await jobs_collection.find_one(
+            {"survey_id": survey_id, "data_version": data_version, "status": {"$in": ACTIVE_STATUSES + ["done"]}},
+            sort=[("created_at", -1)]
+        )
+        if job and job["status"] == "done" and not os.path.exists(job.get("file_path", "")):
+            return None
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        return await get_collection(JOBS_COLLECTION).find_one({"_id": job_id})
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error inesperado en el trabajo de informe {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(settings.REPORT_JOB_HEARTBEAT_SECONDS)
+            await get_collection(JOBS_COLLECTION).update_one(
+                {"_id": job_id, "status": "running"}, {"$set": {"heartbeat_at": datetime.utcnow()}}
+            )
+
+    async def _finish(self, job_id: str, fields: dict):
+        """Cierra el trabajo, salvo que ya haya caducado mientras se ejecutaba."""
+        result = await get_collection(JOBS_COLLECTION).update_one(
+            {"_id": job_id, "status": "running"},
+            {"$set": {**fields, "finished_at": datetime.utcnow()}, "$unset": {"active": ""}}
+        )
+        if not result.modified_count:
+            print(f"⚠️ El trabajo de informe {job_id} caducó antes de terminar; se descarta su resultado")
+
+    async def _run_job(self, job_id: str):
+        jobs_collection = get_collection(JOBS_COLLECTION)
+        now = datetime.utcnow()
+        job = await jobs_collection.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}}
+        )
+        if not job:
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            survey = await get_collection("surveys").find_one({"_id": job["survey_id"]})
+            if not survey:
+                raise ValueError("Encuesta no encontrada")
+            # Se genera con la versión vigente, que puede ser más nueva que la de la petición
+            stats_version = await get_stats_version(str(survey["_id"]))
+            file_path = await report_cache.get_or_build(survey, stats_version)
+        except Exception as e:
+            print(f"❌ Falló el trabajo de informe {job_id}: {e}")
+            await self._finish(job_id, {"status": "failed", "error": str(e) or e.__class__.__name__})
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self._finish(job_id, {
+            "status": "done",
+            "file_path": file_path,
+            "data_version": get_data_version(survey, stats_version),
+        })
+
+
+report_jobs = ReportJobManager(
+    workers=settings.REPORT_JOB_WORKERS,
+    per_user_limit=settings.REPORT_JOBS_PER_USER,
+)
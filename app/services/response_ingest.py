@@ -0,0 +1,173 @@
+"""
+Escritura de respuestas con agrupación de inserciones (group commit).
+
+Con `RESPONSE_INGEST_MODE=batched` los envíos se encolan en una cola acotada y
+un único flusher los inserta con `insert_many(ordered=False)` cuando se juntan
+`RESPONSE_INGEST_BATCH_SIZE` documentos o pasan `RESPONSE_INGEST_MAX_DELAY_MS`
+milisegundos desde el primero. Cada llamada recibe su propio id insertado o su
+propio error (p. ej. `DuplicateKeyError`). Si la cola está llena se rechaza el
+envío (`ResponseIngestBusy`, 429) en vez de acumular memoria.
+
+Con el modo por defecto (`direct`) cada envío hace su propio `insert_one`.
+Al apagar la aplicación la cola deja de aceptar envíos y se vacía antes de cerrar.
+"""
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from app.config import settings
+from app.database import get_collection
+
+RESPONSES_COLLECTION = "survey_responses"
+
+
+class ResponseIngestBusy(Exception):
+    """La cola de envíos está llena."""
+
+
+@contextmanager
+def ingest_http_errors():
+    """Traduce la saturación de la cola de envíos a una respuesta HTTP 429."""
+    try:
+        yield
+    except ResponseIngestBusy:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Estamos recibiendo muchas respuestas en este momento. Inténtalo de nuevo en unos segundos.",
+            headers={"Retry-After": "1"}
+        )
+
+
+def _write_error(error: Dict[str, Any]) -> WriteError:
+    """Excepción equivalente a la que habría lanzado `insert_one` para este documento."""
+    if error.get("code") == 11000:
+        return DuplicateKeyError(error.get("errmsg", "Clave duplicada"), error.get("code"), error)
+    return WriteError(error.get("errmsg", "Error de escritura"), error.get("code"), error)
+
+
+class ResponseIngestQueue:
+    def __init__(self, mode: str, batch_size: int, max_delay_ms: float, max_queue: int):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._accepting = False
+        self.batches = 0
+        self.inserted = 0
+        self.failed = 0
+        self.rejected = 0
+        self._max_batch = 0
+
+    @property
+    def batched(self) -> bool:
+        return self.mode == "batched"
+
+    async def start(self):
+        if not self.batched:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._flusher = asyncio.create_task(self._flush_loop())
+        self._accepting = True
+
+    async def stop(self):
+        """Deja de aceptar envíos y espera a que se inserten los pendientes."""
+        if self._flusher is None:
+            return
+        self._accepting = False
+        await self._queue.join()
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        print("✅ Cola de respuestas vaciada")
+
+    async def insert(self, document: dict) -> ObjectId:
+        """Inserta una respuesta y devuelve su `_id` (agrupada con otras si el modo es batched)."""
+        if not self._accepting:
+            result = await get_collection(RESPONSES_COLLECTION).insert_one(document)
+            return result.inserted_id
+
+        document.setdefault("_id", ObjectId())
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((document, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ResponseIngestBusy("Cola de respuestas llena")
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[dict, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush_loop(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                print(f"❌ Error inesperado al insertar un lote de respuestas: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        documents = [document for document, _ in batch]
+        errors: Dict[int, Exception] = {}
+        try:
+            await get_collection(RESPONSES_COLLECTION).insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            errors = {error["index"]: _write_error(error) for error in e.details.get("writeErrors", [])}
+            if not errors:
+                raise
+
+        self.batches += 1
+        self.inserted += len(batch) - len(errors)
+        self.failed += len(errors)
+        self._max_batch = max(self._max_batch, len(batch))
+        for index, (document, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(document["_id"])
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "batch_size": self.batch_size,
+            "max_delay_ms": self.max_delay * 1000,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_batch_size": round((self.inserted + self.failed) / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self._max_batch,
+        }
+
+
+response_ingest = ResponseIngestQueue(
+    mode=settings.RESPONSE_INGEST_MODE,
+    batch_size=settings.RESPONSE_INGEST_BATCH_SIZE,
+    max_delay_ms=settings.RESPONSE_INGEST_MAX_DELAY_MS,
+    max_queue=settings.RESPONSE_INGEST_MAX_QUEUE,
+)
@@ -0,0 +1,89 @@
+"""
+Paginación por cursor (keyset) de las respuestas de una encuesta.
+
+Cada página se pide con `limit` y `after` (el cursor devuelto por la página
+anterior) y se resuelve con `_id > último _id` sobre el índice
+`(survey_id, _id)`, así cuesta lo mismo en la primera página que en la última.
+El cursor es opaco para el cliente: codifica el último `_id` entregado.
+
+El total sale del contador del documento materializado (`survey_stats`); solo
+si no existe o aún no se reconstruyó desde las respuestas se cuentan las respuestas.
+"""
+import base64
+import json
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from app.config import settings
+from app.database import get_collection
+from app.services.survey_stats_store import STATS_COLLECTION
+
+RESPONSE_BASE_FIELDS = {"survey_id": 1, "responder_email": 1, "submitted_at": 1}
+
+
+def encode_cursor(last_id: ObjectId) -> str:
+    payload = json.dumps({"after": str(last_id)}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> ObjectId:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return ObjectId(payload["after"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise ValueError("Cursor de paginación inválido")
+
+
+def build_projection(survey: dict, fields: Optional[str]) -> Optional[dict]:
+    """
+    Proyección de las respuestas a partir de una lista de ids de pregunta separada
+    por comas; sin `fields` se devuelven todas las respuestas.
+    """
+    if not fields:
+        return None
+    question_ids = {str(q["_id"]) for q in survey.get("questions", [])}
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [qid for qid in requested if qid not in question_ids]
+    if unknown:
+        raise ValueError(f"Preguntas desconocidas en fields: {', '.join(unknown)}")
+    projection = dict(RESPONSE_BASE_FIELDS)
+    projection.update({f"answers.{qid}": 1 for qid in requested})
+    return projection
+
+
+async def count_survey_responses(survey_oid: ObjectId, responses_collection) -> int:
+    stats_doc = await get_collection(STATS_COLLECTION).find_one({"_id": survey_oid}, {"response_count": 1, "backfilled": 1})
+    if stats_doc and stats_doc.get("backfilled") and "response_count" in stats_doc:
+        return stats_doc["response_count"]
+    return await responses_collection.count_documents({"survey_id": survey_oid})
+
+
+async def fetch_responses_page(
+    responses_collection,
+    survey: dict,
+    limit: int = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Devuelve una página de respuestas (con ids como texto) y el cursor de la
+    siguiente, o None si es la última. Lanza ValueError con parámetros inválidos.
+    """
+    limit = min(max(limit or settings.RESPONSES_PAGE_MAX_LIMIT, 1), settings.RESPONSES_PAGE_MAX_LIMIT)
+    query = {"survey_id": survey["_id"]}
+    if after:
+        query["_id"] = {"$gt": decode_cursor(after)}
+    projection = build_projection(survey, fields)
+
+    # Se pide un documento de más para saber si hay otra página sin contar
+    docs = await responses_collection.find(query, projection).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]["_id"]) if len(docs) > limit else None
+
+    items = []
+    for doc in docs[:limit]:
+        doc["_id"] = str(doc["_id"])
+        doc["survey_id"] = str(doc["survey_id"])
+        doc.setdefault("answers", {})
+        items.append(doc)
+    return items, next_cursor
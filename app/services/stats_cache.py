@@ -0,0 +1,30 @@
+"""
+Caché en proceso (LRU + TTL) de resultados de `compute_survey_statistics`.
+
+La clave combina el id de la encuesta, los filtros normalizados, el motor y una
+marca de agua de respuestas (el `_id` de la última respuesta). Un envío nuevo
+cambia la marca de agua, por lo que las entradas anteriores dejan de usarse
+incluso si el envío llegó por otro worker; en este proceso además se invalidan
+al momento con `stats_cache.invalidate(survey_id)`.
+
+Los resultados cacheados se comparten entre llamadas: tratarlos como solo lectura.
+"""
+import json
+from app.config import settings
+from app.services.ttl_cache import TTLCache
+
+
+def normalize_filters(filter_pairs: list[dict] = None) -> str:
+    """Representación canónica de los filtros (independiente del orden)."""
+    if not filter_pairs:
+        return ""
+    normalized = sorted(json.dumps(f, sort_keys=True, default=str) for f in filter_pairs)
+    return "|".join(normalized)
+
+
+# La clave es una tupla cuyo primer elemento es el id de la encuesta
+stats_cache = TTLCache(
+    max_entries=settings.STATS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.STATS_CACHE_TTL_SECONDS,
+    tags=lambda key, _value: (key[0],),
+)
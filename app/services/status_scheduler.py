@@ -0,0 +1,185 @@
+"""
+Planificador de los cambios de estado de las encuestas por fecha.
+
+El estado (`created` -> `published` -> `closed`) depende solo de `start_date` y
+`end_date`. En vez de recalcularlo y escribirlo en cada lectura, este servicio
+mantiene un min-heap con las próximas transiciones y, cuando vencen, las aplica
+todas con un único `bulk_write`. Las rutas de lectura calculan el estado en
+memoria con `update_survey_status` y no escriben.
+
+Al arrancar, y después cada `STATUS_SCHEDULER_RESYNC_SECONDS`, corrige con un
+`bulk_write` las encuestas cuyo estado guardado no coincide con sus fechas.
+Después recarga desde MongoDB las transiciones futuras. Eso recupera el estado
+tras un reinicio y recoge las encuestas creadas por otros workers. Las
+escrituras son idempotentes, así que varios workers pueden aplicar la misma
+transición sin problema.
+"""
+import asyncio
+import heapq
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+from app.config import settings
+from app.database import get_collection
+from app.services.survey_cache import survey_cache
+
+SURVEYS_COLLECTION = "surveys"
+
+
+def as_stored_datetime(value: Optional[datetime]) -> Optional[datetime]:
+    """La fecha tal como la devuelve MongoDB: UTC sin zona horaria y con precisión de milisegundos."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def reconcile_operations(now: datetime) -> List[UpdateMany]:
+    """Operaciones que alinean el estado guardado con las fechas (misma regla que `update_survey_status`)."""
+    no_end_or_open = {"$or": [{"end_date": None}, {"end_date": {"$gte": now}}]}
+    return [
+        UpdateMany(
+            {"end_date": {"$ne": None, "$lt": now}, "status": {"$ne": "closed"}},
+            {"$set": {"status": "closed"}}
+        ),
+        UpdateMany(
+            {"$and": [{"start_date": {"$ne": None, "$lte": now}}, no_end_or_open], "status": {"$ne": "published"}},
+            {"$set": {"status": "published"}}
+        ),
+        UpdateMany(
+            {"$and": [{"$or": [{"start_date": None}, {"start_date": {"$gt": now}}]}, no_end_or_open], "status": {"$ne": "created"}},
+            {"$set": {"status": "created"}}
+        ),
+    ]
+
+
+class SurveyStatusScheduler:
+    def __init__(self, resync_seconds: float):
+        self.resync_seconds = resync_seconds
+        # (vence, secuencia, _id, start_date, end_date, estado destino)
+        self._heap: List[Tuple[datetime, int, ObjectId, Optional[datetime], Optional[datetime], str]] = []
+        self._scheduled = set()
+        self._sequence = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.transitions = 0
+        self.reconciled = 0
+        self.last_resync: Optional[datetime] = None
+
+    def _push(self, due: datetime, survey_id: ObjectId, start_date, end_date, target: str):
+        key = (survey_id, due, target)
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, survey_id, start_date, end_date, target))
+
+    def schedule(self, survey: dict):
+        """Programa las transiciones futuras de una encuesta recién creada o versionada."""
+        now = datetime.utcnow()
+        start_date = as_stored_datetime(survey.get("start_date"))
+        end_date = as_stored_datetime(survey.get("end_date"))
+        head = self._heap[0][0] if self._heap else None
+        if start_date and start_date > now:
+            self._push(start_date, survey["_id"], start_date, end_date, "published")
+        if end_date and end_date >= now:
+            self._push(end_date, survey["_id"], start_date, end_date, "closed")
+        if self._wakeup is not None and self._heap and (head is None or self._heap[0][0] < head):
+            self._wakeup.set()
+
+    async def resync(self):
+        """Corrige los estados desalineados y recarga las transiciones futuras desde MongoDB."""
+        surveys_collection = get_collection(SURVEYS_COLLECTION)
+        now = datetime.utcnow()
+        result = await surveys_collection.bulk_write(reconcile_operations(now), ordered=True)
+        if result.modified_count:
+            self.reconciled += result.modified_count
+            survey_cache.clear()
+            print(f"🕒 Estados de encuestas corregidos: {result.modified_count}")
+
+        self._heap, self._scheduled = [], set()
+        cursor = surveys_collection.find(
+            {"$or": [{"start_date": {"$gt": now}}, {"end_date": {"$gte": now}}]},
+            {"start_date": 1, "end_date": 1}
+        )
+        async for survey in cursor:
+            self.schedule(survey)
+        self.last_resync = now
+
+    async def flush_due(self) -> int:
+        """Aplica con un único `bulk_write` las transiciones vencidas; devuelve cuántas había."""
+        now = datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            self._scheduled.discard((entry[2], entry[0], entry[5]))
+            due.append(entry)
+        if not due:
+            return 0
+
+        # Se filtra por las fechas programadas: si cambiaron, la operación no toca nada
+        operations = [
+            UpdateOne(
+                {"_id": survey_id, "start_date": start_date, "end_date": end_date},
+                {"$set": {"status": target}}
+            )
+            for _, _, survey_id, start_date, end_date, target in due
+        ]
+        await get_collection(SURVEYS_COLLECTION).bulk_write(operations, ordered=True)
+        survey_cache.invalidate(*{str(entry[2]) for entry in due})
+        self.flushes += 1
+        self.transitions += len(due)
+        return len(due)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_resync = loop.time() + self.resync_seconds
+        while True:
+            try:
+                await self.flush_due()
+                if loop.time() >= next_resync:
+                    await self.resync()
+                    next_resync = loop.time() + self.resync_seconds
+            except Exception as e:
+                print(f"❌ Error al actualizar el estado de las encuestas: {e}")
+
+            timeout = next_resync - loop.time()
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        try:
+            await self.resync()
+        except Exception as e:
+            print(f"❌ No se pudo sincronizar el estado de las encuestas: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._heap),
+            "next_due": self._heap[0][0].isoformat() if self._heap else None,
+            "flushes": self.flushes,
+            "transitions": self.transitions,
+            "reconciled": self.reconciled,
+            "last_resync": self.last_resync.isoformat() if self.last_resync else None,
+            "resync_seconds": self.resync_seconds,
+        }
+
+
+status_scheduler = SurveyStatusScheduler(resync_seconds=settings.STATUS_SCHEDULER_RESYNC_SECONDS)
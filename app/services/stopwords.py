@@ -0,0 +1,34 @@
+"""
+Listas de stopwords por idioma para las nubes de palabras.
+
+Cada lista se puede reemplazar con la variable de entorno `STOPWORDS_<IDIOMA>`
+(palabras separadas por comas), por ejemplo `STOPWORDS_EN="the,and,for"`.
+"""
+import os
+from app.config import settings
+
+STOPWORDS = {
+    "es": {
+        'el', 'la', 'los', 'las', 'de', 'y', 'en', 'que', 'por', 'para', 'con',
+        'un', 'una', 'es', 'no', 'sí', 'al', 'lo', 'como', 'más', 'pero', 'sus'
+    },
+    "en": {
+        'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'any', 'can',
+        'was', 'our', 'out', 'has', 'his', 'her', 'its', 'with', 'this', 'that',
+        'from', 'they', 'have', 'were', 'very', 'what', 'when', 'your'
+    },
+}
+
+_cache: dict[str, set[str]] = {}
+
+
+def get_stopwords(language: str = None) -> set[str]:
+    """Devuelve las stopwords del idioma indicado (o del idioma por defecto)."""
+    language = (language or settings.DEFAULT_LANGUAGE).lower()
+    if language not in _cache:
+        override = os.getenv(f"STOPWORDS_{language.upper()}")
+        if override is not None:
+            _cache[language] = {w.strip().lower() for w in override.split(",") if w.strip()}
+        else:
+            _cache[language] = STOPWORDS.get(language, STOPWORDS[settings.DEFAULT_LANGUAGE])
+    return _cache[language]
@@ -0,0 +1,102 @@
+"""
+Caché en proceso (LRU + TTL) de definiciones de encuestas.
+
+Guarda, por id de encuesta, el documento de MongoDB junto con su modelo
+`Survey` ya validado, para que el envío de respuestas y la consulta pública no
+repitan `find_one` + `Survey(**convert_objectids_to_str(doc))` en cada petición.
+Cada entrada recuerda su `updated_at`/`version`.
+
+Las encuestas no se modifican en su sitio: editar o clonar crea una versión
+nueva de la familia (`parent_id`). Por eso se invalida por familia al editar y
+clonar, y por id al borrar; el TTL acota lo que puede tardar otro worker en ver
+el cambio.
+
+Las entradas se comparten entre peticiones: tratarlas como solo lectura.
+"""
+from typing import Any, Dict, Hashable, Optional
+from bson import ObjectId
+from app.config import settings
+from app.database import get_collection
+from app.models.survey import Survey
+from app.services.answer_validation import compile_answer_validator
+from app.services.conditional_logic import compile_conditional_logic
+from app.services.ttl_cache import TTLCache
+from app.services.utils import convert_objectids_to_str
+
+
+class CachedSurvey:
+    """Definición de una encuesta: documento de MongoDB, modelo validado, lógica condicional y validador de respuestas compilados."""
+
+    def __init__(self, doc: dict):
+        self.doc = doc
+        self.model = Survey(**convert_objectids_to_str(doc))
+        self.logic = compile_conditional_logic(doc.get("questions", []))
+        self.validator = compile_answer_validator(doc.get("questions", []), self.logic)
+        self.version_tag = (str(doc.get("updated_at")), doc.get("version", 1))
+
+    @property
+    def family_id(self) -> str:
+        return str(self.doc.get("parent_id") or self.doc["_id"])
+
+
+def latest_public_version_query(survey_id: str) -> dict:
+    """Versiones públicas de la familia de la encuesta (la última es la de mayor `version`)."""
+    return {
+        "$or": [
+            {"_id": ObjectId(survey_id)},
+            {"parent_id": survey_id}
+        ],
+        "is_public": True
+    }
+
+
+def _entry_tags(key: Hashable, entry: CachedSurvey) -> set:
+    # Una entrada se invalida por el id pedido, el de la encuesta resuelta o el de su familia
+    return {key[1], str(entry.doc["_id"]), entry.family_id}
+
+
+class SurveyDefinitionCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._cache = TTLCache(max_entries, ttl_seconds, tags=_entry_tags)
+
+    async def get(self, survey_id: str) -> Optional[CachedSurvey]:
+        """Encuesta por id, o None si no existe."""
+        key = ("id", survey_id)
+        entry = self._cache.get(key)
+        if entry is None:
+            doc = await get_collection("surveys").find_one({"_id": ObjectId(survey_id)})
+            if not doc:
+                return None
+            entry = CachedSurvey(doc)
+            self._cache.set(key, entry)
+        return entry
+
+    async def get_public(self, survey_id: str) -> Optional[CachedSurvey]:
+        """Última versión pública de la familia de `survey_id`, o None si no hay."""
+        key = ("public", survey_id)
+        entry = self._cache.get(key)
+        if entry is None:
+            doc = await get_collection("surveys").find_one(
+                latest_public_version_query(survey_id), sort=[("version", -1), ("_id", -1)]
+            )
+            if not doc:
+                return None
+            entry = CachedSurvey(doc)
+            self._cache.set(key, entry)
+        return entry
+
+    def invalidate(self, *survey_ids: Any):
+        """Descarta las entradas de las encuestas o familias indicadas."""
+        self._cache.invalidate(*(str(survey_id) for survey_id in survey_ids))
+
+    def clear(self):
+        self._cache.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return self._cache.metrics()
+
+
+survey_cache = SurveyDefinitionCache(
+    max_entries=settings.SURVEY_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SURVEY_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,343 @@
+"""
+Exportación de respuestas de una encuesta en streaming.
+
+Las respuestas se leen del cursor por lotes (ordenadas por `_id`, que usa el
+índice `(survey_id, _id)`) y se escriben en trozos pequeños, así la memoria no
+depende del número de respuestas y el primer byte sale de inmediato.
+
+El XLSX no puede enviarse antes de cerrar el libro: se escribe con openpyxl en
+modo write-only (las filas van a disco, no se guardan en memoria) a un archivo
+temporal que luego se envía por trozos. Lo mismo con Parquet y Arrow IPC, que
+se escriben por lotes (record batches) con columnas tipadas según la pregunta.
+
+NDJSON admite exportaciones delta y reanudables: `since` acepta el `_id` de una
+respuesta (se exporta lo posterior, en orden de `_id`) o una fecha de envío.
+"""
+import asyncio
+import csv
+import json
+from datetime import datetime, timezone
+from io import StringIO
+from tempfile import SpooledTemporaryFile
+from typing import Any, AsyncIterator, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.config import settings
+
+EXPORT_PROJECTION = {"responder_email": 1, "submitted_at": 1, "answers": 1}
+
+
+def format_date(date_val):
+    try:
+        if isinstance(date_val, datetime):
+            return date_val.strftime("%Y-%m-%d %H:%M")
+        if isinstance(date_val, str):
+            dt = datetime.fromisoformat(date_val.replace("Z", "+00:00"))
+            return dt.strftime("%Y-%m-%d %H:%M")
+    except Exception:
+        return ""
+    return ""
+
+
+def format_answer(answer: Any) -> str:
+    if isinstance(answer, list):
+        return ", ".join(map(str, answer))
+    return str(answer)
+
+
+def export_questions(survey: dict) -> List[dict]:
+    """Preguntas exportadas, en el orden de las columnas."""
+    return survey.get("questions", [])
+
+
+def export_headers(survey: dict) -> List[str]:
+    return ["_id", "Email", "Fecha de envío"] + [q["text"] for q in export_questions(survey)]
+
+
+async def iter_export_responses(
+    responses_collection, survey: dict, batch_size: int = None, extra_query: dict = None
+) -> AsyncIterator[dict]:
+    """Recorre las respuestas de la encuesta por lotes, en orden de `_id`."""
+    query = {"survey_id": ObjectId(survey["_id"]), **(extra_query or {})}
+    cursor = responses_collection.find(
+        query, EXPORT_PROJECTION
+    ).sort("_id", 1).batch_size(batch_size or settings.EXPORT_BATCH_SIZE)
+    async for res in cursor:
+        yield res
+
+
+async def iter_csv_chunks(responses_collection, survey: dict, chunk_size: int = None) -> AsyncIterator[str]:
+    """Genera el CSV de las respuestas en trozos de unos `chunk_size` caracteres."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    # El id de cada columna se calcula una sola vez por exportación
+    question_ids = [str(q["_id"]) for q in export_questions(survey)]
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    writer.writerow(export_headers(survey))
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    async for res in iter_export_responses(responses_collection, survey):
+        answers = res.get("answers", {})
+        writer.writerow(
+            [str(res.get("_id", "")), res.get("responder_email", ""), format_date(res.get("submitted_at"))]
+            + [format_answer(answers.get(qid, "")) for qid in question_ids]
+        )
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def to_excel_number(answer: Any):
+    """Valor numérico para una celda de number_input; si no es un número se deja como texto."""
+    if isinstance(answer, bool):
+        return str(answer)
+    if isinstance(answer, (int, float)):
+        return answer
+    try:
+        value = float(answer)
+    except (TypeError, ValueError):
+        return format_answer(answer)
+    return int(value) if value.is_integer() else value
+
+
+def to_excel_datetime(date_val: Any):
+    if isinstance(date_val, str):
+        try:
+            date_val = datetime.fromisoformat(date_val.replace("Z", "+00:00"))
+        except ValueError:
+            return ""
+    if isinstance(date_val, datetime):
+        # openpyxl no admite fechas con zona horaria
+        return date_val.replace(tzinfo=None)
+    return ""
+
+
+async def build_xlsx_export(responses_collection, survey: dict) -> SpooledTemporaryFile:
+    """
+    Escribe las respuestas en un libro openpyxl en modo write-only y devuelve el
+    archivo (en memoria hasta `EXPORT_SPOOL_MAX_BYTES`, luego en disco) listo para leer.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Respuestas")
+
+    header_font = Font(bold=True)
+    header = []
+    for title in export_headers(survey):
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = header_font
+        header.append(cell)
+    sheet.append(header)
+
+    # Conversión por columna según el tipo de pregunta, calculada una sola vez
+    columns = [
+        (str(q["_id"]), to_excel_number if q.get("type") == "number_input" else format_answer)
+        for q in export_questions(survey)
+    ]
+    date_cell = WriteOnlyCell(sheet)
+    date_cell.number_format = "yyyy-mm-dd hh:mm"
+
+    async for res in iter_export_responses(responses_collection, survey):
+        answers = res.get("answers", {})
+        date_cell.value = to_excel_datetime(res.get("submitted_at"))
+        sheet.append(
+            [str(res.get("_id", "")), res.get("responder_email", ""), date_cell]
+            + [convert(answers.get(qid, "")) for qid, convert in columns]
+        )
+
+    spool = SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_BYTES)
+    try:
+        # Comprimir el libro es trabajo bloqueante: se hace fuera del event loop
+        await asyncio.get_running_loop().run_in_executor(None, workbook.save, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def iter_file_chunks(file, chunk_size: int = None) -> AsyncIterator[bytes]:
+    """Envía un archivo abierto en trozos y lo cierra al terminar."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+ARROW_FORMATS = {"parquet", "arrow"}
+
+
+def _arrow_number(answer: Any) -> Optional[float]:
+    if isinstance(answer, bool) or answer in ("", None):
+        return None
+    try:
+        return float(answer)
+    except (TypeError, ValueError):
+        return None
+
+
+def _arrow_integer(answer: Any) -> Optional[int]:
+    value = _arrow_number(answer)
+    return int(value) if value is not None and value.is_integer() else None
+
+
+def _arrow_string_list(answer: Any) -> Optional[List[str]]:
+    if answer in ("", None):
+        return None
+    if isinstance(answer, list):
+        return [str(a) for a in answer]
+    return [str(answer)]
+
+
+def _arrow_string(answer: Any) -> Optional[str]:
+    return None if answer in ("", None) else str(answer)
+
+
+# Tipo Arrow y conversión de la respuesta para cada tipo de pregunta
+ARROW_COLUMN_TYPES = {
+    "number_input": (pa.float64(), _arrow_number),
+    "satisfaction_scale": (pa.int64(), _arrow_integer),
+    "checkbox_group": (pa.list_(pa.string()), _arrow_string_list),
+    "multiple_choice": (pa.dictionary(pa.int32(), pa.string()), _arrow_string),
+    "text_input": (pa.string(), _arrow_string),
+}
+
+
+def arrow_schema(survey: dict) -> pa.Schema:
+    """Esquema de la exportación; el id de cada pregunta va en los metadatos de su columna."""
+    fields = [
+        pa.field("_id", pa.string()),
+        pa.field("Email", pa.string()),
+        pa.field("Fecha de envío", pa.timestamp("ms")),
+    ]
+    names = {field.name for field in fields}
+    for q in export_questions(survey):
+        arrow_type, _ = ARROW_COLUMN_TYPES.get(q.get("type"), ARROW_COLUMN_TYPES["text_input"])
+        # Los nombres de columna deben ser únicos en Parquet
+        name, suffix = q["text"], 2
+        while name in names:
+            name, suffix = f"{q['text']} ({suffix})", suffix + 1
+        names.add(name)
+        fields.append(pa.field(name, arrow_type, metadata={"question_id": str(q["_id"])}))
+    return pa.schema(fields, metadata={"survey_id": str(survey["_id"])})
+
+
+def _record_batch(schema: pa.Schema, columns: List[list]) -> pa.RecordBatch:
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+async def build_arrow_export(responses_collection, survey: dict, format: str = "parquet") -> SpooledTemporaryFile:
+    """
+    Escribe las respuestas en Parquet (o Arrow IPC stream con `format="arrow"`),
+    comprimido con zstd, por lotes de `EXPORT_BATCH_SIZE` respuestas.
+    """
+    schema = arrow_schema(survey)
+    converters = [
+        (str(q["_id"]), ARROW_COLUMN_TYPES.get(q.get("type"), ARROW_COLUMN_TYPES["text_input"])[1])
+        for q in export_questions(survey)
+    ]
+    batch_size = settings.EXPORT_BATCH_SIZE
+
+    spool = SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_BYTES)
+    if format == "arrow":
+        # Formato stream: cada lote puede traer su propio diccionario de opciones
+        writer = pa.ipc.new_stream(spool, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    else:
+        writer = pq.ParquetWriter(spool, schema, compression="zstd")
+
+    try:
+        columns = [[] for _ in schema]
+        async for res in iter_export_responses(responses_collection, survey, batch_size):
+            answers = res.get("answers", {})
+            submitted_at = to_excel_datetime(res.get("submitted_at"))
+            columns[0].append(str(res.get("_id", "")))
+            columns[1].append(res.get("responder_email"))
+            columns[2].append(submitted_at or None)
+            for column, (qid, convert) in zip(columns[3:], converters):
+                column.append(convert(answers.get(qid)))
+            if len(columns[0]) >= batch_size:
+                writer.write_batch(_record_batch(schema, columns))
+                columns = [[] for _ in schema]
+        if columns[0]:
+            writer.write_batch(_record_batch(schema, columns))
+        writer.close()
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def build_since_query(since: Optional[str]) -> dict:
+    """
+    Filtro de una exportación delta: respuestas con `_id` posterior a `since` si
+    es un id de respuesta, o enviadas después de `since` si es una fecha ISO 8601.
+    """
+    if not since:
+        return {}
+    try:
+        return {"_id": {"$gt": ObjectId(since)}}
+    except (InvalidId, TypeError):
+        pass
+    try:
+        since_date = datetime.fromisoformat(since.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError("since debe ser un id de respuesta o una fecha ISO 8601")
+    if since_date.tzinfo is not None:
+        # Las fechas se guardan en UTC sin zona horaria
+        since_date = since_date.astimezone(timezone.utc).replace(tzinfo=None)
+    return {"submitted_at": {"$gt": since_date}}
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def iter_ndjson_chunks(
+    responses_collection, survey: dict, since: Optional[str] = None, until_id: Optional[str] = None, chunk_size: int = None
+) -> AsyncIterator[str]:
+    """
+    Genera una respuesta por línea (JSON) con las posteriores a `since` y hasta
+    `until_id` inclusive, que fija el final de la exportación al empezar.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    query = build_since_query(since)
+    if until_id:
+        query.setdefault("_id", {})["$lte"] = ObjectId(until_id)
+
+    buffer = StringIO()
+    async for res in iter_export_responses(responses_collection, survey, extra_query=query):
+        res["_id"] = str(res["_id"])
+        buffer.write(json.dumps(res, ensure_ascii=False, default=_json_default))
+        buffer.write("\n")
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
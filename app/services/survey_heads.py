@@ -0,0 +1,111 @@
+"""
+Marca `is_latest` de la última versión de cada familia de encuestas.
+
+Una familia es la encuesta original más las versiones que la referencian en
+`parent_id`, que puede estar guardado como texto o como ObjectId. Cada
+inserción o borrado de una versión recalcula la cabeza de su familia (la de
+mayor `version`). Así los listados filtran por `is_latest` con los índices
+compuestos y no necesitan agrupar todo el historial de versiones.
+
+`backfill_survey_heads` marca las encuestas guardadas antes de que existiera
+el campo; se ejecuta al arrancar si falta en algún documento.
+"""
+import uuid
+from typing import Any, Optional
+from bson import ObjectId
+from app.database import get_collection
+
+SURVEYS_COLLECTION = "surveys"
+# Cabezas que se marcan por cada update_many del backfill
+HEADS_BATCH_SIZE = 1000
+
+
+def family_query(family_id: Any) -> dict:
+    """Documentos de la familia cuya encuesta original es `family_id`."""
+    family_str = str(family_id)
+    if not ObjectId.is_valid(family_str):
+        return {"parent_id": family_str}
+    family_oid = ObjectId(family_str)
+    return {"$or": [{"_id": family_oid}, {"parent_id": {"$in": [family_str, family_oid]}}]}
+
+
+async def refresh_family_head(family_id: Any) -> Optional[ObjectId]:
+    """Marca como `is_latest` la versión más alta de la familia y desmarca el resto."""
+    surveys_collection = get_collection(SURVEYS_COLLECTION)
+    query = family_query(family_id)
+    heads = await surveys_collection.find(query, {"_id": 1}).sort([("version", -1), ("_id", -1)]).to_list(1)
+    if not heads:
+        return None
+    head_id = heads[0]["_id"]
+    await surveys_collection.update_many(
+        {"$and": [query, {"_id": {"$ne": head_id}, "is_latest": {"$ne": False}}]},
+        {"$set": {"is_latest": False}}
+    )
+    await surveys_collection.update_one({"_id": head_id}, {"$set": {"is_latest": True}})
+    return head_id
+
+
+def latest_versions_pipeline() -> list:
+    """`_id` de la última versión de cada familia (solo para el backfill)."""
+    return [
+        {
+            "$addFields": {
+                "family_id": {
+                    "$cond": [
+                        {
+                            "$and": [
+                                {"$ne": ["$parent_id", None]},
+                                {"$ne": [{"$type": "$parent_id"}, "objectId"]}
+                            ]
+                        },
+                        {"$toObjectId": "$parent_id"},
+                        {"$ifNull": ["$parent_id", "$_id"]}
+                    ]
+                }
+            }
+        },
+        {"$sort": {"version": -1, "_id": -1}},
+        {"$group": {"_id": "$family_id", "head_id": {"$first": "$_id"}}},
+    ]
+
+
+async def backfill_survey_heads(force: bool = False) -> int:
+    """
+    Calcula `is_latest` para toda la colección; sin `force` solo si falta en algún documento.
+
+    Las cabezas se marcan por lotes de `HEADS_BATCH_SIZE` junto con un
+    identificador de la ejecución, y después se desmarcan los documentos sin
+    ese identificador; así ningún filtro lleva la lista completa de cabezas.
+    Las encuestas creadas mientras tanto (`_id` posterior al inicio) no se tocan.
+    """
+    surveys_collection = get_collection(SURVEYS_COLLECTION)
+    if not force and not await surveys_collection.find_one({"is_latest": {"$exists": False}}, {"_id": 1}):
+        return 0
+
+    run_id = uuid.uuid4().hex
+    started = ObjectId()
+    marked, batch = 0, []
+    async for doc in surveys_collection.aggregate(latest_versions_pipeline(), allowDiskUse=True):
+        batch.append(doc["head_id"])
+        if len(batch) >= HEADS_BATCH_SIZE:
+            await _mark_heads(surveys_collection, batch, run_id)
+            marked += len(batch)
+            batch = []
+    if batch:
+        await _mark_heads(surveys_collection, batch, run_id)
+        marked += len(batch)
+
+    await surveys_collection.update_many(
+        {"_id": {"$lt": started}, "heads_run": {"$ne": run_id}, "is_latest": {"$ne": False}},
+        {"$set": {"is_latest": False}}
+    )
+    await surveys_collection.update_many({"heads_run": run_id}, {"$unset": {"heads_run": ""}})
+    print(f"✅ Marca is_latest calculada para {marked} familias de encuestas")
+    return marked
+
+
+async def _mark_heads(surveys_collection, head_ids: list, run_id: str):
+    await surveys_collection.update_many(
+        {"_id": {"$in": head_ids}},
+        {"$set": {"is_latest": True, "heads_run": run_id}}
+    )
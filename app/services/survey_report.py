@@ -0,0 +1,51 @@
+"""
+Construcción del informe final en PDF de una encuesta.
+
+Lo usan tanto `GET /{id}/final-report` como los trabajos de informes en segundo plano.
+"""
+import os
+from typing import Any, Dict, List
+from app.services.compute_pool import compute_pool
+from app.services.pdf_report import render_pdf_report
+from app.services.survey_stats import compute_survey_statistics
+
+
+def format_report_stats(stats: Dict[str, Any]) -> List[dict]:
+    """Convierte las estadísticas por pregunta en la lista que consume `render_pdf_report`."""
+    formatted_stats = []
+    for qid, q in stats.items():
+        question_summary = {
+            "question": q["text"],
+            "type": q["type"],
+            "data": q.get("options", {}),
+            "total": sum(q.get("options", {}).values())
+        }
+
+        if q["type"] == "number_input" and q.get("count"):
+            question_summary.update({
+                "total": q["count"],
+                "avg": q.get("avg"),
+                "median": q.get("median"),
+                "min": q.get("min"),
+                "max": q.get("max"),
+                "histogram": q.get("histogram", {})
+            })
+        elif q["type"] == "text_input" and "word_cloud" in q:
+            word_data = {w["word"]: w["count"] for w in q["word_cloud"]}
+            question_summary["data"] = word_data
+            question_summary["total"] = sum(word_data.values())
+
+        formatted_stats.append(question_summary)
+    return formatted_stats
+
+
+async def build_survey_report(survey: dict, output_path: str) -> str:
+    """Calcula las estadísticas de la encuesta y genera el PDF en `output_path`."""
+    stats = await compute_survey_statistics(str(survey["_id"]), [])
+    formatted_stats = format_report_stats(stats)
+    # El PDF se genera en memoria en el pool y aquí solo se escribe a disco
+    content = await compute_pool.run(render_pdf_report, survey, formatted_stats)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(content)
+    return output_path
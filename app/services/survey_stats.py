@@ -1,50 +1,63 @@
 from typing import Dict, Any
 from bson import ObjectId
 from collections import Counter
-from statistics import mean, median
+import heapq
 from app.database import get_collection
+from app.config import settings
+from app.services.stopwords import get_stopwords
+from app.services.stats_cache import normalize_filters, stats_cache
+from app.services.compute_pool import compute_pool
+from app.services.numeric_stats import HistogramBins, summarize_numeric, summarize_scale
 import re
 
 
+def histogram_bin_label(v: float, bin_size: int = 10) -> str:
+    """Etiqueta del intervalo del histograma al que pertenece un valor."""
+    return f"{int(v // bin_size) * bin_size}-{(int(v // bin_size) + 1) * bin_size - 1}"
+
+
 def compute_histogram(values: list[float], bin_size: int = 10) -> Dict[str, int]:
     """Genera un histograma agrupando valores en intervalos."""
     hist = {}
     for v in values:
         try:
-            bin_label = f"{int(v // bin_size) * bin_size}-{(int(v // bin_size) + 1) * bin_size - 1}"
+            bin_label = histogram_bin_label(v, bin_size)
             hist[bin_label] = hist.get(bin_label, 0) + 1
         except (ValueError, TypeError):
             pass
     return hist
 
 
+WORD_CLOUD_SIZE = 20
+
+# Número de respuestas recientes que devuelve cada motor por pregunta (text_input / number_input).
+# Todos los motores devuelven la misma forma: number_input con `options` vacío, el resumen
+# de `summarize_numeric` y las últimas RECENT_RESPONSES_LIMIT respuestas numéricas.
+RECENT_RESPONSES_LIMIT = 50
+
+
+def tokenize_text(text: str, stopwords: set[str] = None) -> list[str]:
+    """Extrae las palabras (3+ caracteres, sin stopwords) de un texto libre."""
+    stopwords = stopwords or get_stopwords()
+    return [word for word in re.findall(r"\b\w{3,}\b", text.lower()) if word not in stopwords]
+
+
 def compute_word_cloud(texts: list[str], stopwords: set[str] = None) -> list[dict]:
     """Genera una nube de palabras con las palabras más frecuentes."""
     word_freq = Counter()
-    stopwords = stopwords or {
-        'el', 'la', 'los', 'las', 'de', 'y', 'en', 'que', 'por', 'para', 'con',
-        'un', 'una', 'es', 'no', 'sí', 'al', 'lo', 'como', 'más', 'pero', 'sus'
-    }
     for text in texts:
-        words = re.findall(r"\b\w{3,}\b", text.lower())
-        for word in words:
-            if word not in stopwords:
-                word_freq[word] += 1
-    return [{"word": word, "count": count} for word, count in word_freq.most_common(20)]
+        word_freq.update(tokenize_text(text, stopwords))
+    return top_terms(word_freq)
 
 
-async def compute_survey_statistics(survey_id: str, filter_pairs: list[dict] = None) -> Dict[str, Any]:
-    if not ObjectId.is_valid(survey_id):
-        raise ValueError("ID de encuesta inválido")
+def top_terms(counts: Dict[str, int], k: int = WORD_CLOUD_SIZE) -> list[dict]:
+    """Las `k` palabras más frecuentes; los empates se ordenan alfabéticamente en todos los motores."""
+    top = heapq.nsmallest(k, counts.items(), key=lambda item: (-item[1], item[0]))
+    return [{"word": word, "count": count} for word, count in top]
 
-    surveys_collection = get_collection("surveys")
-    responses_collection = get_collection("survey_responses")
-
-    survey = await surveys_collection.find_one({"_id": ObjectId(survey_id)})
-    if not survey:
-        raise ValueError("Encuesta no encontrada")
 
-    # Construir query con múltiples filtros
+def build_stats_query(survey_id: str, filter_pairs: list[dict] = None) -> dict:
+    """Construye la query de respuestas a partir de los filtros de estadísticas."""
     query = {"survey_id": ObjectId(survey_id)}
     if filter_pairs:
         for filter_pair in filter_pairs:
@@ -66,11 +79,15 @@ async def compute_survey_statistics(survey_id: str, filter_pairs: list[dict] = N
                 query[f"answers.{qid}"] = value
             elif question_type == "checkbox_group":
                 query[f"answers.{qid}"] = {"$in": [value]}
+    return query
 
-    print("🟡 Query de filtro:", query)
-    responses = await responses_collection.find(query).to_list(1000)
 
+def compute_statistics_from_responses(survey: dict, responses: list[dict], histogram_bins: HistogramBins = None) -> Dict[str, Any]:
+    """Calcula las estadísticas en Python a partir de las respuestas ya cargadas."""
     stats = {}
+    scale_values = {}
+    numeric_values = {}
+    histogram_bins = histogram_bins if histogram_bins is not None else settings.STATS_HISTOGRAM_BINS
 
     for question in survey.get("questions", []):
         qid_str = str(question["_id"])
@@ -90,14 +107,17 @@ async def compute_survey_statistics(survey_id: str, filter_pairs: list[dict] = N
             q_stats = stats[qid]
             q_type = q_stats["type"]
 
-            if q_type in ["multiple_choice", "satisfaction_scale", "number_input"]:
+            if q_type in ["multiple_choice", "satisfaction_scale"]:
                 key = str(answer)
                 q_stats["options"][key] = q_stats["options"].get(key, 0) + 1
-                if q_type == "number_input":
-                    try:
-                        q_stats["responses"].append(float(answer))
-                    except:
-                        pass
+                if q_type == "satisfaction_scale":
+                    scale_values.setdefault(qid, []).append(answer)
+
+            elif q_type == "number_input":
+                try:
+                    numeric_values.setdefault(qid, []).append(float(answer))
+                except (ValueError, TypeError):
+                    pass
 
             elif q_type == "checkbox_group":
                 if isinstance(answer, list):
@@ -108,18 +128,93 @@ async def compute_survey_statistics(survey_id: str, filter_pairs: list[dict] = N
             elif q_type == "text_input":
                 q_stats["responses"].append(str(answer))
 
-    # Calcular métricas adicionales
+    # Calcular métricas adicionales (vectorizadas con NumPy)
     for qid, q in stats.items():
-        if q["type"] == "number_input" and q["responses"]:
-            try:
-                q["avg"] = round(mean(q["responses"]), 2)
-                q["median"] = round(median(q["responses"]), 2)
-                q["min"] = min(q["responses"])
-                q["max"] = max(q["responses"])
-                q["histogram"] = compute_histogram(q["responses"])
-            except:
-                pass
+        if q["type"] == "number_input" and numeric_values.get(qid):
+            q.update(summarize_numeric(numeric_values[qid], bins=histogram_bins))
+            q["responses"] = numeric_values[qid][-RECENT_RESPONSES_LIMIT:]
+        elif q["type"] == "satisfaction_scale" and scale_values.get(qid):
+            q.update(summarize_scale(scale_values[qid]))
         elif q["type"] == "text_input" and q["responses"]:
-            q["word_cloud"] = compute_word_cloud(q["responses"])
+            q["word_cloud"] = compute_word_cloud(q["responses"], get_stopwords(survey.get("language")))
+            q["responses"] = q["responses"][-RECENT_RESPONSES_LIMIT:]
+
+    return stats
+
+
+async def compute_survey_statistics(survey_id: str, filter_pairs: list[dict] = None, engine: str = None) -> Dict[str, Any]:
+    """
+    Calcula las estadísticas de una encuesta.
+
+    Sin filtros se leen las estadísticas materializadas. Con filtros se usa el
+    motor indicado en `engine` (por defecto `settings.STATS_ENGINE`):
+    "aggregation" (pipeline $facet en MongoDB), "python" (exacto en memoria,
+    hasta `STATS_EXACT_MAX_RESPONSES` respuestas) o "streaming" (memoria
+    constante, con cuantiles aproximados).
+
+    Los resultados se cachean (ver `app.services.stats_cache`) hasta que llega
+    una respuesta nueva o vence el TTL.
+    """
+    if not ObjectId.is_valid(survey_id):
+        raise ValueError("ID de encuesta inválido")
+
+    surveys_collection = get_collection("surveys")
+
+    survey = await surveys_collection.find_one({"_id": ObjectId(survey_id)})
+    if not survey:
+        raise ValueError("Encuesta no encontrada")
+
+    engine = engine or settings.STATS_ENGINE
+    stats_doc = None
+    if filter_pairs:
+        version = await get_response_watermark(survey["_id"])
+    else:
+        # Sin filtros la versión es la del documento materializado que se va a formatear:
+        # un envío ya insertado pero aún no sumado no cambia la clave
+        from app.services.survey_stats_store import ensure_materialized_stats, stats_version
+        stats_doc = await ensure_materialized_stats(survey_id)
+        version = stats_version(stats_doc)
+    cache_key = (survey_id, normalize_filters(filter_pairs), engine, str(survey.get("updated_at")), version)
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    stats = await _compute_statistics(survey, filter_pairs, engine, stats_doc)
+    stats_cache.set(cache_key, stats)
+    return stats
+
+
+async def get_response_watermark(survey_oid: ObjectId) -> str:
+    """Marca de agua de respuestas: el `_id` de la última respuesta de la encuesta."""
+    latest = await get_collection("survey_responses").find_one(
+        {"survey_id": survey_oid},
+        {"_id": 1},
+        sort=[("_id", -1)]
+    )
+    return str(latest["_id"]) if latest else ""
+
+
+async def _compute_statistics(survey: dict, filter_pairs: list[dict], engine: str, stats_doc: dict = None) -> Dict[str, Any]:
+    responses_collection = get_collection("survey_responses")
+
+    # Sin filtros se sirven las estadísticas materializadas (O(preguntas))
+    if not filter_pairs:
+        from app.services.survey_stats_store import get_materialized_statistics
+        return await get_materialized_statistics(survey, stats_doc)
+
+    # Construir query con múltiples filtros
+    query = build_stats_query(str(survey["_id"]), filter_pairs)
+
+    if engine == "aggregation":
+        from app.services.survey_stats_aggregation import compute_statistics_aggregated
+        return await compute_statistics_aggregated(survey, query)
+
+    # El modo exacto carga las respuestas en memoria; las encuestas grandes pasan a streaming
+    if engine == "python":
+        total = await responses_collection.count_documents(query)
+        if total <= settings.STATS_EXACT_MAX_RESPONSES:
+            responses = await responses_collection.find(query).to_list(None)
+            return await compute_pool.run(compute_statistics_from_responses, survey, responses)
 
-    return stats
\ No newline at end of file
+    from app.services.survey_stats_streaming import compute_statistics_streaming
+    return await compute_statistics_streaming(survey, query)
@@ -0,0 +1,294 @@
+"""
+Motor de estadísticas basado en pipelines `$facet` de MongoDB.
+
+Un primer `$facet` calcula en el servidor los conteos por opción (con `$unwind`
+para checkbox_group), el resumen de cada number_input (conteo, media,
+extremos y desviación), las palabras más frecuentes de cada text_input y una
+muestra de las últimas respuestas. Si hay preguntas numéricas con datos, un
+segundo `$facet` obtiene los percentiles (los valores en las posiciones
+necesarias, con `$sort`/`$skip`/`$limit`) y el histograma con `$bucket` sobre
+los límites de `histogram_edges`. Con las estrategias "fd" y "auto" el
+histograma necesita el rango intercuartílico y va en un tercer `$facet`.
+
+Ningún resultado crece con el número de respuestas ni de valores distintos,
+salvo los conteos por opción, que tienen tantas filas como opciones. El
+resultado tiene la misma forma que `compute_statistics_from_responses`, que es
+lo que consumen `/stats` y `render_pdf_report`.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.database import get_collection
+from app.services.compute_pool import compute_pool
+from app.services.numeric_stats import (
+    SUMMARY_PERCENTILES,
+    format_histogram,
+    histogram_edges,
+    interpolate,
+    numeric_summary,
+    percentile_positions,
+    summarize_scale_counts,
+)
+from app.services.stopwords import get_stopwords
+from app.services.survey_stats import RECENT_RESPONSES_LIMIT, WORD_CLOUD_SIZE, tokenize_text, top_terms
+
+# Mismas palabras que `tokenize_text` (\b\w{3,}\b): tramos de 3 o más letras, dígitos o "_"
+TOKEN_REGEX = r"[\p{L}\p{N}_]{3,}"
+# $toLower de MongoDB solo cambia letras ASCII: se traen más candidatos de los
+# necesarios y se terminan de normalizar en Python
+TERM_CANDIDATES = WORD_CLOUD_SIZE * 5
+# Estrategias de histograma que necesitan el rango intercuartílico
+IQR_STRATEGIES = ("fd", "auto")
+
+
+def _numeric_value(path: str) -> dict:
+    """Convierte la respuesta a double; los valores no numéricos quedan en null."""
+    return {"$convert": {"input": path, "to": "double", "onError": None, "onNull": None}}
+
+
+def _numeric_stages(field: str) -> list:
+    """Valores numéricos finitos de la pregunta, como `to_array` en el motor en Python."""
+    return [
+        {"$match": {field: {"$exists": True}}},
+        {"$project": {"_id": 0, "value": _numeric_value(f"${field}")}},
+        # Excluye null, NaN e infinitos
+        {"$match": {"value": {"$gt": float("-inf"), "$lt": float("inf")}}},
+    ]
+
+
+def _option_counts_facet(field: str, unwind: bool = False) -> list:
+    path = f"${field}"
+    if unwind:
+        # Solo las respuestas en forma de lista, igual que el motor en Python
+        stages = [
+            {"$match": {field: {"$type": "array"}}},
+            {"$unwind": {"path": path, "includeArrayIndex": "_position"}},
+        ]
+        first_seen = {"$min": {"doc": "$_id", "position": "$_position"}}
+    else:
+        stages = [{"$match": {field: {"$exists": True}}}]
+        first_seen = {"$min": "$_id"}
+    # Se agrupa por valor y tipo BSON para que 5 y 5.0 sigan siendo opciones distintas
+    stages += [
+        {"$group": {
+            "_id": {"value": path, "type": {"$type": path}},
+            "count": {"$sum": 1},
+            "first_seen": first_seen,
+        }},
+        {"$sort": {"first_seen": 1}},
+        {"$project": {"_id": 0, "value": "$_id.value", "count": 1}},
+    ]
+    return stages
+
+
+def _recent_facet(field: str, numeric: bool) -> list:
+    """Las últimas `RECENT_RESPONSES_LIMIT` respuestas de la pregunta."""
+    if numeric:
+        return [
+            {"$sort": {"_id": -1}},
+            *_numeric_stages(field),
+            {"$limit": RECENT_RESPONSES_LIMIT},
+        ]
+    return [
+        {"$match": {field: {"$exists": True}}},
+        {"$sort": {"_id": -1}},
+        {"$limit": RECENT_RESPONSES_LIMIT},
+        {"$project": {"_id": 0, "value": f"${field}"}},
+    ]
+
+
+def _terms_facet(field: str, stopwords: set) -> list:
+    """Los términos más frecuentes de un text_input, contados en el servidor."""
+    return [
+        {"$match": {field: {"$type": "string"}}},
+        {"$project": {"_id": 0, "term": {"$regexFindAll": {"input": {"$toLower": f"${field}"}, "regex": TOKEN_REGEX}}}},
+        {"$unwind": "$term"},
+        {"$group": {"_id": "$term.match", "count": {"$sum": 1}}},
+        {"$match": {"_id": {"$nin": sorted(stopwords)}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": TERM_CANDIDATES},
+    ]
+
+
+def build_facet_pipeline(survey: dict, query: dict) -> list:
+    """Construye el pipeline `$facet` con una rama por métrica y pregunta."""
+    facets = {}
+    stopwords = get_stopwords(survey.get("language"))
+    for question in survey.get("questions", []):
+        qid = str(question["_id"])
+        field = f"answers.{qid}"
+        q_type = question["type"]
+
+        if q_type in ["multiple_choice", "satisfaction_scale"]:
+            facets[f"{qid}_options"] = _option_counts_facet(field)
+        elif q_type == "number_input":
+            facets[f"{qid}_summary"] = _numeric_stages(field) + [
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "avg": {"$avg": "$value"},
+                    "min": {"$min": "$value"},
+                    "max": {"$max": "$value"},
+                    "std": {"$stdDevSamp": "$value"},
+                }},
+            ]
+            facets[f"{qid}_recent"] = _recent_facet(field, numeric=True)
+        elif q_type == "checkbox_group":
+            facets[f"{qid}_options"] = _option_counts_facet(field, unwind=True)
+        elif q_type == "text_input":
+            facets[f"{qid}_terms"] = _terms_facet(field, stopwords)
+            facets[f"{qid}_recent"] = _recent_facet(field, numeric=False)
+
+    return [{"$match": query}, {"$facet": facets}]
+
+
+def _bucket_stage(edges: np.ndarray) -> dict:
+    # El último intervalo de np.histogram incluye el máximo; $bucket excluye el límite superior
+    boundaries = [float(edge) for edge in edges[:-1]] + [float(np.nextafter(edges[-1], np.inf))]
+    return {"$bucket": {"groupBy": "$value", "boundaries": boundaries, "default": "fuera", "output": {"count": {"$sum": 1}}}}
+
+
+def build_percentiles_facets(field: str, count: int) -> Dict[str, list]:
+    """
+    Ramas que devuelven los dos valores alrededor de cada posición de percentil.
+    Las posiciones de la mitad superior se leen en orden descendente, así ningún
+    `$sort` + `$limit` retiene más de la mitad de los valores.
+    """
+    facets = {}
+    for lower, _ in set(percentile_positions(count).values()):
+        upper = min(lower + 1, count - 1)
+        if lower < count / 2:
+            order, skip = 1, lower
+        else:
+            order, skip = -1, count - 1 - upper
+        facets[f"at_{lower}"] = _numeric_stages(field) + [
+            {"$sort": {"value": order}},
+            {"$skip": skip},
+            {"$limit": upper - lower + 1},
+        ]
+    return facets
+
+
+def build_histogram_facet(field: str, edges: np.ndarray) -> list:
+    return _numeric_stages(field) + [_bucket_stage(edges)]
+
+
+def _summary_edges(summary: dict, percentiles: Optional[Dict[int, float]] = None) -> Tuple[np.ndarray, bool]:
+    iqr = percentiles[75] - percentiles[25] if percentiles else None
+    return histogram_edges(
+        summary["count"], summary["min"], summary["max"], settings.STATS_HISTOGRAM_BINS, iqr, summary.get("std")
+    )
+
+
+def _percentiles_from_rows(result: dict, prefix: str, summary: dict) -> Dict[int, float]:
+    percentiles = {}
+    for p, (lower, fraction) in percentile_positions(summary["count"]).items():
+        rows = sorted(row["value"] for row in result.get(f"{prefix}at_{lower}", []))
+        below = rows[0] if rows else summary["max"]
+        above = rows[1] if len(rows) > 1 else below
+        percentiles[p] = float(interpolate(below, above, fraction))
+    return percentiles
+
+
+def _histogram_from_rows(rows: List[dict], edges: np.ndarray, fixed_width: bool) -> Dict[str, int]:
+    index = {float(edge): i for i, edge in enumerate(edges[:-1])}
+    counts = [0] * (len(edges) - 1)
+    for row in rows:
+        if row["_id"] in index:
+            counts[index[row["_id"]]] = row["count"]
+    return format_histogram(edges, counts, fixed_width)
+
+
+async def _numeric_summaries(
+    responses_collection, survey: dict, query: dict, summaries: Dict[str, dict]
+) -> Dict[str, Dict[str, Any]]:
+    """Percentiles e histograma de las preguntas numéricas con datos (segundo y, si hace falta, tercer `$facet`)."""
+    iqr_needed = settings.STATS_HISTOGRAM_BINS in IQR_STRATEGIES
+    facets, edges = {}, {}
+    for qid, summary in summaries.items():
+        field = f"answers.{qid}"
+        for name, stages in build_percentiles_facets(field, summary["count"]).items():
+            facets[f"{qid}_{name}"] = stages
+        if not iqr_needed:
+            edges[qid] = _summary_edges(summary)
+            facets[f"{qid}_histogram"] = build_histogram_facet(field, edges[qid][0])
+    results = await responses_collection.aggregate([{"$match": query}, {"$facet": facets}], allowDiskUse=True).to_list(1)
+    result = results[0] if results else {}
+
+    percentiles = {qid: _percentiles_from_rows(result, f"{qid}_", summary) for qid, summary in summaries.items()}
+    if iqr_needed:
+        edges = {qid: _summary_edges(summary, percentiles[qid]) for qid, summary in summaries.items()}
+        facets = {f"{qid}_histogram": build_histogram_facet(f"answers.{qid}", edges[qid][0]) for qid in summaries}
+        results = await responses_collection.aggregate([{"$match": query}, {"$facet": facets}], allowDiskUse=True).to_list(1)
+        result = results[0] if results else {}
+
+    return {
+        qid: numeric_summary(
+            summary["count"], summary["avg"], summary.get("std"), summary["min"], summary["max"],
+            percentiles[qid], _histogram_from_rows(result.get(f"{qid}_histogram", []), *edges[qid])
+        )
+        for qid, summary in summaries.items()
+    }
+
+
+def _merge_terms(rows: List[dict], stopwords: set) -> List[dict]:
+    """Termina en Python la normalización de los términos (minúsculas no ASCII) y corta al top-k."""
+    counts = {}
+    for row in rows:
+        for term in tokenize_text(row["_id"], stopwords):
+            counts[term] = counts.get(term, 0) + row["count"]
+    return top_terms(counts)
+
+
+def format_facet_result(survey: dict, result: dict, numeric: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Convierte los documentos devueltos por los `$facet` al formato de estadísticas."""
+    stats = {}
+    numeric = numeric or {}
+    stopwords = get_stopwords(survey.get("language"))
+    for question in survey.get("questions", []):
+        qid = str(question["_id"])
+        q = {
+            "text": question["text"],
+            "type": question["type"],
+            "options": {},
+            "responses": []
+        }
+
+        for row in result.get(f"{qid}_options", []):
+            key = str(row.get("value"))
+            q["options"][key] = q["options"].get(key, 0) + row["count"]
+
+        recent = [row.get("value") for row in reversed(result.get(f"{qid}_recent", []))]
+        if q["type"] == "number_input" and qid in numeric:
+            q.update(numeric[qid])
+            q["responses"] = recent
+        elif q["type"] == "satisfaction_scale" and q["options"]:
+            q.update(summarize_scale_counts(q["options"]))
+        elif q["type"] == "text_input" and recent:
+            q["responses"] = [str(value) for value in recent]
+            word_cloud = _merge_terms(result.get(f"{qid}_terms", []), stopwords)
+            if word_cloud:
+                q["word_cloud"] = word_cloud
+
+        stats[qid] = q
+    return stats
+
+
+async def compute_statistics_aggregated(survey: dict, query: dict) -> Dict[str, Any]:
+    """Calcula las estadísticas de las respuestas que cumplen `query` con resultados acotados."""
+    if not survey.get("questions"):
+        return {}
+
+    responses_collection = get_collection("survey_responses")
+    pipeline = build_facet_pipeline(survey, query)
+    results = await responses_collection.aggregate(pipeline, allowDiskUse=True).to_list(1)
+    result = results[0] if results else {}
+
+    summaries = {}
+    for question in survey["questions"]:
+        qid = str(question["_id"])
+        rows = result.get(f"{qid}_summary") if question["type"] == "number_input" else None
+        if rows and rows[0]["count"]:
+            summaries[qid] = rows[0]
+    numeric = await _numeric_summaries(responses_collection, survey, query, summaries) if summaries else {}
+    return await compute_pool.run(format_facet_result, survey, result, numeric)
@@ -0,0 +1,390 @@
+"""
+Estadísticas materializadas por encuesta (colección `survey_stats`).
+
+Cada envío de respuestas actualiza de forma atómica un único documento por
+encuesta con `$inc`/`$min`/`$max`, de modo que las estadísticas sin filtros se
+sirven leyendo ese documento en vez de recorrer todas las respuestas. Las
+frecuencias de palabras de text_input viven en el índice de términos
+(`app.services.term_index`).
+
+Estructura del documento:
+
+    {
+        "_id": ObjectId(survey_id),
+        "response_count": int,
+        "questions": {
+            "<qid>": {
+                "options": {"<valor>": int},   # conteo por opción (no number_input)
+                "buckets": {"<valor>": int},   # number_input: conteo por `value_bucket`
+                "count": int, "sum": float,    # number_input
+                "sum_sq": float,               # number_input
+                "min": float, "max": float,    # number_input
+                "responses": [...]             # muestra de las últimas respuestas
+            }
+        },
+        "backfilled": bool,                   # True si lo escribió `rebuild_survey_stats`
+        "schema": int,                        # STATS_SCHEMA_VERSION de la reconstrucción
+        "watermark": ObjectId | None,         # última respuesta incluida en la reconstrucción
+        "rev": int,                           # se incrementa con cada escritura
+        "updated_at": datetime
+    }
+
+Los valores de number_input no se cuentan uno a uno sino por `value_bucket`,
+así el documento no crece con cada valor distinto (ver
+`app.services.numeric_stats` para la precisión del resumen).
+
+Un documento sin `backfilled` (creado por el primer envío tras el despliegue, o
+marcado tras un fallo al registrar un envío) o de otra versión de `schema` se
+reconstruye en la siguiente lectura. Los envíos ya incluidos en una
+reconstrucción (`_id` <= `watermark`) no vuelven a sumarse.
+"""
+import asyncio
+import math
+from typing import Dict, Any, List, Tuple
+from collections import Counter
+from datetime import datetime
+from urllib.parse import unquote
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from app.database import get_collection
+from app.config import settings
+from app.services.compute_pool import compute_pool
+from app.services.numeric_stats import summarize_numeric_buckets, summarize_scale_counts, value_bucket
+from app.services.stats_cache import stats_cache
+from app.services.survey_stats import RECENT_RESPONSES_LIMIT
+from app.services.term_index import get_terms_generation, get_top_terms, is_survey_indexed, record_batch_terms, reindex_survey_terms
+
+STATS_COLLECTION = "survey_stats"
+
+# Versión de la estructura del documento; los de otra versión se reconstruyen
+STATS_SCHEMA_VERSION = 2
+
+# Reintentos de una reconstrucción cuando llegan envíos mientras se recalcula
+REBUILD_MAX_ATTEMPTS = 10
+
+# Marcador para la clave vacía, que MongoDB no admite como nombre de campo
+_EMPTY_KEY = "%empty"
+
+
+def encode_key(key: str) -> str:
+    """Escapa una clave para usarla como nombre de campo en MongoDB."""
+    if key == "":
+        return _EMPTY_KEY
+    return key.replace("%", "%25").replace(".", "%2E").replace("$", "%24").replace("\x00", "%00")
+
+
+def decode_key(key: str) -> str:
+    """Operación inversa de `encode_key`."""
+    if key == _EMPTY_KEY:
+        return ""
+    return unquote(key)
+
+
+def _response_operations(questions: List[dict], answers: Dict[str, Any]) -> Tuple[Counter, dict, dict, dict]:
+    """
+    Traduce las respuestas de un envío a operaciones sobre el documento de estadísticas.
+    Devuelve (incrementos, mínimos, máximos, respuestas recientes) indexados por ruta.
+    """
+    incs, mins, maxs, pushes = Counter(), {}, {}, {}
+    for question in questions:
+        qid = str(question["_id"])
+        if qid not in answers:
+            continue
+        answer = answers[qid]
+        q_type = question["type"]
+        base = f"questions.{qid}"
+
+        if q_type in ["multiple_choice", "satisfaction_scale"]:
+            incs[f"{base}.options.{encode_key(str(answer))}"] += 1
+
+        elif q_type == "number_input":
+            try:
+                value = float(answer)
+            except (ValueError, TypeError):
+                continue
+            if not math.isfinite(value):
+                continue
+            incs[f"{base}.buckets.{encode_key(value_bucket(value))}"] += 1
+            incs[f"{base}.count"] += 1
+            incs[f"{base}.sum"] += value
+            incs[f"{base}.sum_sq"] += value * value
+            mins[f"{base}.min"] = value
+            maxs[f"{base}.max"] = value
+            pushes[f"{base}.responses"] = value
+
+        elif q_type == "checkbox_group":
+            if isinstance(answer, list):
+                for opt in answer:
+                    incs[f"{base}.options.{encode_key(str(opt))}"] += 1
+
+        elif q_type == "text_input":
+            pushes[f"{base}.responses"] = str(answer)
+
+    return incs, mins, maxs, pushes
+
+
+def build_stats_update(questions: List[dict], answers: Dict[str, Any]) -> dict:
+    """Construye el update atómico de MongoDB para registrar un envío."""
+    return build_batch_stats_update(questions, [answers])
+
+
+def build_batch_stats_update(questions: List[dict], answers_list: List[Dict[str, Any]]) -> dict:
+    """Construye un único update atómico que registra varios envíos a la vez."""
+    incs, mins, maxs, pushes = Counter(), {}, {}, {}
+    for answers in answers_list:
+        r_incs, r_mins, r_maxs, r_pushes = _response_operations(questions, answers)
+        incs.update(r_incs)
+        for path, value in r_mins.items():
+            mins[path] = min(mins.get(path, value), value)
+        for path, value in r_maxs.items():
+            maxs[path] = max(maxs.get(path, value), value)
+        for path, value in r_pushes.items():
+            pushes.setdefault(path, []).append(value)
+    incs["response_count"] += len(answers_list)
+    incs["rev"] += 1
+    update = {
+        "$inc": dict(incs),
+        "$set": {"updated_at": datetime.utcnow()},
+    }
+    if mins:
+        update["$min"] = mins
+    if maxs:
+        update["$max"] = maxs
+    if pushes:
+        update["$push"] = {
+            path: {"$each": values[-RECENT_RESPONSES_LIMIT:], "$slice": -RECENT_RESPONSES_LIMIT}
+            for path, values in pushes.items()
+        }
+    return update
+
+
+def _apply_in_memory(stats_doc: dict, questions: List[dict], answers: Dict[str, Any]):
+    """Aplica sobre un dict las mismas operaciones que `build_stats_update`."""
+    def locate(path: str):
+        parts = path.split(".")
+        node = stats_doc
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        return node, parts[-1]
+
+    incs, mins, maxs, pushes = _response_operations(questions, answers)
+    incs["response_count"] += 1
+    for path, amount in incs.items():
+        node, key = locate(path)
+        node[key] = node.get(key, 0) + amount
+    for path, value in mins.items():
+        node, key = locate(path)
+        node[key] = min(node.get(key, value), value)
+    for path, value in maxs.items():
+        node, key = locate(path)
+        node[key] = max(node.get(key, value), value)
+    for path, value in pushes.items():
+        node, key = locate(path)
+        recent = node.setdefault(key, [])
+        recent.append(value)
+        del recent[:-RECENT_RESPONSES_LIMIT]
+
+
+async def record_response_stats(survey: dict, answers: Dict[str, Any], response_id: Any):
+    """
+    Registra un envío en el documento materializado y en el índice de términos,
+    e invalida los resultados cacheados de la encuesta en este proceso.
+    """
+    await record_batch_stats(survey, [answers], [response_id])
+
+
+async def record_batch_stats(survey: dict, answers_list: List[Dict[str, Any]], response_ids: List[Any]):
+    """Igual que `record_response_stats`, pero para varios envíos con una sola escritura por colección."""
+    if not answers_list:
+        return
+    stats_collection = get_collection(STATS_COLLECTION)
+    update = build_batch_stats_update(survey.get("questions", []), answers_list)
+    first_id = min(ObjectId(str(response_id)) for response_id in response_ids)
+    try:
+        try:
+            # Si una reconstrucción ya incluyó estos envíos, el filtro no coincide y el upsert choca con el _id
+            await stats_collection.update_one(
+                {"_id": survey["_id"], "watermark": {"$not": {"$gte": first_id}}},
+                update,
+                upsert=True
+            )
+        except DuplicateKeyError:
+            if len(answers_list) > 1:
+                # La reconstrucción pudo incluir solo parte del lote
+                await mark_stats_drift(survey["_id"])
+            return
+        await record_batch_terms(survey, answers_list, response_ids)
+    except Exception:
+        await mark_stats_drift(survey["_id"])
+        raise
+    finally:
+        stats_cache.invalidate(str(survey["_id"]))
+
+
+async def mark_stats_drift(survey_oid: ObjectId):
+    """Marca el documento para que se reconstruya en la próxima lectura."""
+    try:
+        await get_collection(STATS_COLLECTION).update_one({"_id": survey_oid}, {"$set": {"backfilled": False}})
+        print(f"⚠️ Estadísticas de la encuesta {survey_oid} marcadas para reconstruir")
+    except Exception as e:
+        print(f"❌ No se pudo marcar la desviación de estadísticas de la encuesta {survey_oid}: {e}")
+
+
+async def rebuild_survey_stats(survey_id: str) -> dict:
+    """
+    Recalcula el documento materializado desde `survey_responses`.
+    Sirve para el backfill inicial y para corregir desviaciones.
+
+    Las respuestas se recorren por `_id` y la última incluida queda como
+    `watermark`. El reemplazo solo se aplica si `rev` no cambió desde la
+    lectura; si entró algún envío mientras tanto, se suman las respuestas
+    posteriores a la marca de agua y se vuelve a intentar.
+    """
+    surveys_collection = get_collection("surveys")
+    responses_collection = get_collection("survey_responses")
+    stats_collection = get_collection(STATS_COLLECTION)
+
+    survey = await surveys_collection.find_one({"_id": ObjectId(survey_id)})
+    if not survey:
+        raise ValueError("Encuesta no encontrada")
+
+    questions = survey.get("questions", [])
+    stats_doc = {"response_count": 0, "questions": {}}
+    watermark = None
+    for _ in range(REBUILD_MAX_ATTEMPTS):
+        current = await stats_collection.find_one({"_id": survey["_id"]}, {"rev": 1})
+        rev = current.get("rev") if current else None
+
+        query = {"survey_id": survey["_id"]}
+        if watermark is not None:
+            query["_id"] = {"$gt": watermark}
+        cursor = responses_collection.find(query, {"answers": 1}).sort("_id", 1).batch_size(1000)
+        async for response in cursor:
+            _apply_in_memory(stats_doc, questions, response.get("answers", {}))
+            watermark = response["_id"]
+
+        replacement = {
+            **stats_doc,
+            "backfilled": True,
+            "schema": STATS_SCHEMA_VERSION,
+            "watermark": watermark,
+            "rev": (rev or 0) + 1,
+            "updated_at": datetime.utcnow(),
+        }
+        try:
+            result = await stats_collection.replace_one({"_id": survey["_id"], "rev": rev}, replacement, upsert=True)
+        except DuplicateKeyError:
+            continue
+        if result.matched_count or result.upserted_id is not None:
+            stats_cache.invalidate(survey_id)
+            replacement["_id"] = survey["_id"]
+            return replacement
+
+    # Con envíos constantes se devuelve el cálculo sin guardarlo; se reintentará en la próxima lectura
+    print(f"⚠️ No se pudo guardar la reconstrucción de estadísticas de la encuesta {survey_id} por envíos concurrentes")
+    stats_doc.update({"_id": survey["_id"], "watermark": watermark, "updated_at": datetime.utcnow()})
+    return stats_doc
+
+
+async def rebuild_all_survey_stats() -> int:
+    """Recalcula las estadísticas materializadas de todas las encuestas."""
+    surveys_collection = get_collection("surveys")
+    rebuilt = 0
+    async for survey in surveys_collection.find({}, {"_id": 1}):
+        await rebuild_survey_stats(str(survey["_id"]))
+        rebuilt += 1
+    return rebuilt
+
+
+def format_materialized_stats(survey: dict, stats_doc: dict, word_clouds: Dict[str, list] = None) -> Dict[str, Any]:
+    """Convierte el documento materializado al formato de `compute_survey_statistics`."""
+    stats = {}
+    word_clouds = word_clouds or {}
+    stored_questions = stats_doc.get("questions", {})
+    for question in survey.get("questions", []):
+        qid = str(question["_id"])
+        stored = stored_questions.get(qid, {})
+        options = {decode_key(k): v for k, v in stored.get("options", {}).items()}
+        q = {
+            "text": question["text"],
+            "type": question["type"],
+            "options": options,
+            "responses": list(stored.get("responses", [])),
+        }
+
+        if q["type"] == "number_input":
+            if stored.get("count"):
+                buckets = {decode_key(k): v for k, v in stored.get("buckets", {}).items()}
+                q.update(summarize_numeric_buckets(
+                    buckets, stored["count"], stored["sum"], stored.get("sum_sq", 0.0),
+                    stored["min"], stored["max"], bins=settings.STATS_HISTOGRAM_BINS
+                ))
+        elif q["type"] == "satisfaction_scale" and options:
+            q.update(summarize_scale_counts(options))
+        elif q["type"] == "text_input" and word_clouds.get(qid):
+            q["word_cloud"] = word_clouds[qid]
+
+        stats[qid] = q
+    return stats
+
+
+# Reconstrucciones en curso en este proceso, para no repetirlas con lecturas simultáneas
+_pending_rebuilds: Dict[str, asyncio.Future] = {}
+
+
+def is_current(stats_doc: dict) -> bool:
+    """True si el documento salió de una reconstrucción con la estructura actual."""
+    return bool(stats_doc.get("backfilled")) and stats_doc.get("schema") == STATS_SCHEMA_VERSION
+
+
+async def _rebuild_materialized(survey_id: str, stats_doc: dict = None) -> dict:
+    if stats_doc is None or not is_current(stats_doc):
+        stats_doc = await rebuild_survey_stats(survey_id)
+        await reindex_survey_terms(survey_id)
+    elif not await is_survey_indexed(ObjectId(survey_id)):
+        await reindex_survey_terms(survey_id)
+    return stats_doc
+
+
+async def ensure_materialized_stats(survey_id: str) -> dict:
+    """
+    Devuelve el documento materializado. Si falta o no está completo, lo
+    reconstruye junto con el índice de términos; si solo falta el índice de
+    términos, lo reindexa.
+    """
+    stats_doc = await get_collection(STATS_COLLECTION).find_one({"_id": ObjectId(survey_id)})
+    if stats_doc is not None and is_current(stats_doc) and await is_survey_indexed(stats_doc["_id"]):
+        return stats_doc
+
+    pending = _pending_rebuilds.get(survey_id)
+    if pending is None:
+        pending = asyncio.ensure_future(_rebuild_materialized(survey_id, stats_doc))
+        _pending_rebuilds[survey_id] = pending
+        pending.add_done_callback(lambda _: _pending_rebuilds.pop(survey_id, None))
+    return await asyncio.shield(pending)
+
+
+def stats_version(stats_doc: dict) -> str:
+    """Versión de un documento materializado: cambia con cada envío registrado y con cada reconstrucción."""
+    return f"{stats_doc.get('rev')}:{stats_doc.get('response_count', 0)}"
+
+
+async def get_stats_version(survey_id: str) -> str:
+    """Versión de las estadísticas sin filtros de la encuesta (ver `stats_version`)."""
+    return stats_version(await ensure_materialized_stats(survey_id))
+
+
+async def get_materialized_statistics(survey: dict, stats_doc: dict = None) -> Dict[str, Any]:
+    """
+    Lee las estadísticas materializadas; si aún no existen o están incompletas, las reconstruye.
+    Con `stats_doc` se formatea ese documento sin volver a leerlo.
+    """
+    stats_doc = stats_doc or await ensure_materialized_stats(str(survey["_id"]))
+
+    word_clouds = {}
+    text_qids = [str(q["_id"]) for q in survey.get("questions", []) if q["type"] == "text_input"]
+    if text_qids:
+        generation = await get_terms_generation(survey["_id"])
+        for qid in text_qids:
+            word_clouds[qid] = await get_top_terms(survey["_id"], qid, generation=generation)
+    return await compute_pool.run(format_materialized_stats, survey, stats_doc, word_clouds)
@@ -0,0 +1,192 @@
+"""
+Motor de estadísticas en streaming con memoria constante.
+
+Recorre el cursor de respuestas por lotes sin cargarlas en memoria. Los conteos
+por opción son exactos. De number_input se mantienen exactos el conteo, la
+media, la desviación (Welford) y los extremos; los percentiles salen de un
+sketch KLL (ver `app.services.quantile_sketch` para la cota de error). El
+histograma usa intervalos de ancho fijo mientras no pasen de
+`STATS_HISTOGRAM_MAX_BINS`; si los pasan, o con otra estrategia de intervalos,
+los conteos se estiman con el sketch. Las frecuencias de palabras se cuentan
+con un `TopKCounter` de tamaño fijo (exactas mientras haya pocos términos
+distintos). De cada pregunta solo se conserva una muestra de las últimas
+respuestas.
+
+El trabajo de CPU no corre en el event loop: cada lote del cursor
+(`STATS_STREAM_BATCH_SIZE` respuestas) se suma a los acumuladores en el pool de
+cómputo mientras se lee el lote siguiente, y el resumen final también se
+calcula allí. Los acumuladores tienen tamaño acotado, así que ir y volver del
+pool cuesta lo mismo sin importar cuántas respuestas haya.
+"""
+import asyncio
+import math
+from typing import Dict, Any, Optional
+from collections import deque
+from app.config import settings
+from app.database import get_collection
+from app.services.compute_pool import compute_pool
+from app.services.numeric_stats import (
+    HISTOGRAM_BIN_SIZE,
+    SUMMARY_PERCENTILES,
+    format_histogram,
+    histogram_edges,
+    numeric_summary,
+    summarize_scale_counts,
+)
+from app.services.quantile_sketch import KLLSketch
+from app.services.stopwords import get_stopwords
+from app.services.survey_stats import RECENT_RESPONSES_LIMIT, tokenize_text, top_terms
+from app.services.top_k import TopKCounter
+
+
+def _new_accumulator(question: dict) -> dict:
+    acc = {
+        "options": {},
+        "recent": deque(maxlen=RECENT_RESPONSES_LIMIT),
+    }
+    if question["type"] == "number_input":
+        acc.update({
+            "sketch": KLLSketch(k=settings.STATS_SKETCH_K),
+            # Media y suma de cuadrados de las desviaciones (Welford)
+            "mean": 0.0,
+            "m2": 0.0,
+            # Conteos por intervalo de ancho fijo; None cuando pasan del máximo
+            "bins": {},
+        })
+    elif question["type"] == "text_input":
+        acc["terms"] = TopKCounter(settings.STATS_STREAM_TERMS)
+    return acc
+
+
+def _accumulate_number(acc: dict, answer: Any):
+    try:
+        value = float(answer)
+    except (ValueError, TypeError):
+        return
+    if not math.isfinite(value):
+        return
+    sketch = acc["sketch"]
+    sketch.update(value)
+    delta = value - acc["mean"]
+    acc["mean"] += delta / sketch.count
+    acc["m2"] += delta * (value - acc["mean"])
+    if acc["bins"] is not None:
+        index = math.floor(value / HISTOGRAM_BIN_SIZE)
+        acc["bins"][index] = acc["bins"].get(index, 0) + 1
+        if len(acc["bins"]) > settings.STATS_HISTOGRAM_MAX_BINS:
+            acc["bins"] = None
+    acc["recent"].append(value)
+
+
+def _accumulate(acc: dict, q_type: str, answer: Any, stopwords: set[str]):
+    if q_type in ["multiple_choice", "satisfaction_scale"]:
+        key = str(answer)
+        acc["options"][key] = acc["options"].get(key, 0) + 1
+
+    elif q_type == "number_input":
+        _accumulate_number(acc, answer)
+
+    elif q_type == "checkbox_group":
+        if isinstance(answer, list):
+            for opt in answer:
+                key = str(opt)
+                acc["options"][key] = acc["options"].get(key, 0) + 1
+
+    elif q_type == "text_input":
+        text = str(answer)
+        acc["terms"].update(tokenize_text(text, stopwords))
+        acc["recent"].append(text)
+
+
+def _sketch_histogram(sketch: KLLSketch, edges) -> list:
+    """Conteos aproximados por intervalo [límite_i, límite_i+1) a partir del rango del sketch."""
+    below = [sketch.rank(edge, inclusive=False) for edge in edges[:-1]] + [sketch.count]
+    return [upper - lower for lower, upper in zip(below, below[1:])]
+
+
+def _numeric_summary(acc: dict) -> Optional[Dict[str, Any]]:
+    sketch = acc["sketch"]
+    if not sketch.count:
+        return None
+    count = sketch.count
+    std = math.sqrt(acc["m2"] / (count - 1)) if count > 1 else 0.0
+    values = sketch.quantiles([p / 100 for p in SUMMARY_PERCENTILES])
+    percentiles = dict(zip(SUMMARY_PERCENTILES, values))
+    edges, fixed_width = histogram_edges(
+        count, sketch.min, sketch.max, settings.STATS_HISTOGRAM_BINS, percentiles[75] - percentiles[25], std
+    )
+    if fixed_width and acc["bins"] is not None:
+        first = int(edges[0] // HISTOGRAM_BIN_SIZE)
+        counts = [acc["bins"].get(first + i, 0) for i in range(len(edges) - 1)]
+    else:
+        counts = _sketch_histogram(sketch, edges)
+    return numeric_summary(
+        count, acc["mean"], std, sketch.min, sketch.max, percentiles, format_histogram(edges, counts, fixed_width)
+    )
+
+
+def _finalize(question: dict, acc: dict) -> Dict[str, Any]:
+    q = {
+        "text": question["text"],
+        "type": question["type"],
+        "options": acc["options"],
+        "responses": list(acc["recent"]),
+    }
+    if question["type"] == "number_input":
+        summary = _numeric_summary(acc)
+        if summary:
+            q.update(summary)
+            q["approximate"] = True
+    elif question["type"] == "satisfaction_scale" and acc["options"]:
+        q.update(summarize_scale_counts(acc["options"]))
+    elif question["type"] == "text_input" and acc["terms"].counts:
+        q["word_cloud"] = top_terms(acc["terms"].counts)
+    return q
+
+
+def _accumulate_batch(q_types: Dict[str, str], accumulators: dict, answers_batch: list, stopwords: set[str]) -> dict:
+    """Suma un lote de respuestas a los acumuladores (se ejecuta en el pool de cómputo)."""
+    for answers in answers_batch:
+        for raw_qid, answer in answers.items():
+            qid = str(raw_qid)
+            if qid in accumulators:
+                _accumulate(accumulators[qid], q_types[qid], answer, stopwords)
+    return accumulators
+
+
+def _finalize_all(questions: Dict[str, dict], accumulators: dict) -> Dict[str, Any]:
+    return {qid: _finalize(questions[qid], acc) for qid, acc in accumulators.items()}
+
+
+async def compute_statistics_streaming(survey: dict, query: dict, batch_size: int = None) -> Dict[str, Any]:
+    """Calcula las estadísticas de las respuestas que cumplen `query` en memoria constante."""
+    responses_collection = get_collection("survey_responses")
+    questions = {str(q["_id"]): q for q in survey.get("questions", [])}
+    q_types = {qid: q["type"] for qid, q in questions.items()}
+    accumulators = {qid: _new_accumulator(q) for qid, q in questions.items()}
+    stopwords = get_stopwords(survey.get("language"))
+    batch_size = batch_size or settings.STATS_STREAM_BATCH_SIZE
+
+    cursor = responses_collection.find(query, {"answers": 1}).batch_size(batch_size)
+    pending: Optional[asyncio.Future] = None
+    batch = []
+    try:
+        async for response in cursor:
+            batch.append(response.get("answers", {}))
+            if len(batch) < batch_size:
+                continue
+            # Un lote en el pool a la vez: se lee el siguiente mientras se procesa el anterior
+            if pending is not None:
+                accumulators = await pending
+            pending = asyncio.ensure_future(compute_pool.run(_accumulate_batch, q_types, accumulators, batch, stopwords))
+            batch = []
+        if pending is not None:
+            accumulators = await pending
+            pending = None
+        if batch:
+            accumulators = await compute_pool.run(_accumulate_batch, q_types, accumulators, batch, stopwords)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+    return await compute_pool.run(_finalize_all, questions, accumulators)
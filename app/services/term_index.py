@@ -0,0 +1,207 @@
+"""
+Índice invertido de términos para las preguntas text_input (colección `survey_terms`).
+
+Cada envío incrementa, con un único `bulk_write`, un documento por
+(encuesta, generación, pregunta, término). Gracias al índice
+`(survey_id, question_id, gen, count)` las nubes de palabras se leen en O(k)
+sin volver a tokenizar las respuestas.
+
+El estado de cada encuesta vive en `survey_terms_state`:
+
+    {
+        "_id": ObjectId(survey_id),
+        "gen": ObjectId,           # generación vigente de los documentos de términos
+        "rev": int,                # se incrementa con cada envío registrado
+        "watermark": ObjectId,     # última respuesta incluida en la reindexación
+        "indexed": bool            # True si la generación vigente salió de una reindexación
+    }
+
+Los envíos solo incrementan la generación vigente; las respuestas anteriores
+a la creación del índice se cargan con `reindex_survey_terms`. La
+reindexación escribe una generación nueva sin tocar la vigente y la activa
+solo si `rev` no cambió desde que empezó a leer; si llegó algún envío, suma a
+la generación nueva las respuestas posteriores a su marca de agua y vuelve a
+intentarlo. Los envíos ya incluidos en una reindexación (`_id` <= `watermark`)
+no vuelven a sumarse. Una encuesta sin `indexed` (nunca indexada, o de antes
+de las generaciones) se reindexa en la siguiente lectura de estadísticas (ver
+`app.services.survey_stats_store.ensure_materialized_stats`).
+"""
+from typing import Dict, Any, List
+from collections import Counter
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.database import get_collection
+from app.services.stopwords import get_stopwords
+from app.services.survey_stats import WORD_CLOUD_SIZE, tokenize_text
+
+TERMS_COLLECTION = "survey_terms"
+# Un documento por encuesta con su generación vigente (ver la cabecera del módulo)
+TERMS_STATE_COLLECTION = "survey_terms_state"
+
+# Reintentos de una reindexación cuando llegan envíos mientras se recalcula
+REINDEX_MAX_ATTEMPTS = 10
+
+
+def _count_terms(survey: dict, answers: Dict[str, Any]) -> Dict[str, Counter]:
+    """Frecuencia de términos por pregunta text_input de un envío."""
+    stopwords = get_stopwords(survey.get("language"))
+    terms = {}
+    for question in survey.get("questions", []):
+        qid = str(question["_id"])
+        if question["type"] == "text_input" and qid in answers:
+            counts = Counter(tokenize_text(str(answers[qid]), stopwords))
+            if counts:
+                terms[qid] = counts
+    return terms
+
+
+def _sum_terms(survey: dict, answers_list: List[Dict[str, Any]]) -> Dict[str, Counter]:
+    totals: Dict[str, Counter] = {}
+    for answers in answers_list:
+        for qid, counts in _count_terms(survey, answers).items():
+            totals.setdefault(qid, Counter()).update(counts)
+    return totals
+
+
+def _increment_operations(survey_id: ObjectId, generation: Any, totals: Dict[str, Counter]) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {"survey_id": survey_id, "question_id": qid, "gen": generation, "term": term},
+            {"$inc": {"count": count}},
+            upsert=True
+        )
+        for qid, counts in totals.items()
+        for term, count in counts.items()
+    ]
+
+
+async def record_response_terms(survey: dict, answers: Dict[str, Any], response_id: Any):
+    """Suma los términos de un envío al índice de la encuesta."""
+    await record_batch_terms(survey, [answers], [response_id])
+
+
+async def record_batch_terms(survey: dict, answers_list: List[Dict[str, Any]], response_ids: List[Any]):
+    """Suma los términos de varios envíos a la generación vigente con un único `bulk_write`."""
+    totals = _sum_terms(survey, answers_list)
+    if not totals:
+        return
+    state_collection = get_collection(TERMS_STATE_COLLECTION)
+    first_id = min(ObjectId(str(response_id)) for response_id in response_ids)
+    try:
+        # Incrementar `rev` antes de escribir hace fallar una reindexación que no haya visto estos envíos;
+        # si ya los incluyó, el filtro no coincide y el upsert choca con el _id
+        state = await state_collection.find_one_and_update(
+            {"_id": survey["_id"], "watermark": {"$not": {"$gte": first_id}}},
+            {"$inc": {"rev": 1}},
+            projection={"gen": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        if len(answers_list) > 1:
+            # La reindexación pudo incluir solo parte del lote
+            await state_collection.update_one({"_id": survey["_id"]}, {"$set": {"indexed": False}})
+        return
+    await get_collection(TERMS_COLLECTION).bulk_write(
+        _increment_operations(survey["_id"], state.get("gen"), totals), ordered=False
+    )
+
+
+async def get_terms_generation(survey_id: ObjectId) -> Any:
+    """Generación vigente del índice de la encuesta (None si nunca se reindexó)."""
+    state = await get_collection(TERMS_STATE_COLLECTION).find_one({"_id": survey_id}, {"gen": 1})
+    return state.get("gen") if state else None
+
+
+async def get_top_terms(survey_id: ObjectId, question_id: str, k: int = WORD_CLOUD_SIZE, generation: Any = None) -> List[dict]:
+    """Devuelve los k términos más frecuentes de una pregunta, en formato de nube de palabras."""
+    if generation is None:
+        generation = await get_terms_generation(survey_id)
+    cursor = get_collection(TERMS_COLLECTION).find(
+        {"survey_id": survey_id, "question_id": question_id, "gen": generation},
+        {"_id": 0, "term": 1, "count": 1}
+    ).sort([("count", -1), ("term", 1)]).limit(k)
+    return [{"word": doc["term"], "count": doc["count"]} async for doc in cursor]
+
+
+async def is_survey_indexed(survey_id: ObjectId) -> bool:
+    """True si la generación vigente del índice salió de una reindexación completa."""
+    state = await get_collection(TERMS_STATE_COLLECTION).find_one({"_id": survey_id}, {"indexed": 1, "gen": 1})
+    return bool(state and state.get("indexed") and state.get("gen") is not None)
+
+
+async def reindex_survey_terms(survey_id: str) -> int:
+    """
+    Reconstruye el índice de términos de una encuesta desde `survey_responses`
+    en una generación nueva y la activa (ver la cabecera del módulo).
+    Devuelve el número de términos indexados.
+    """
+    surveys_collection = get_collection("surveys")
+    responses_collection = get_collection("survey_responses")
+    terms_collection = get_collection(TERMS_COLLECTION)
+    state_collection = get_collection(TERMS_STATE_COLLECTION)
+
+    survey = await surveys_collection.find_one({"_id": ObjectId(survey_id)})
+    if not survey:
+        raise ValueError("Encuesta no encontrada")
+
+    generation = ObjectId()
+    watermark = None
+    try:
+        for _ in range(REINDEX_MAX_ATTEMPTS):
+            state = await state_collection.find_one({"_id": survey["_id"]}, {"rev": 1})
+            rev = state.get("rev") if state else None
+
+            query = {"survey_id": survey["_id"]}
+            if watermark is not None:
+                query["_id"] = {"$gt": watermark}
+            totals: Dict[str, Counter] = {}
+            cursor = responses_collection.find(query, {"answers": 1}).sort("_id", 1).batch_size(1000)
+            async for response in cursor:
+                for qid, counts in _count_terms(survey, response.get("answers", {})).items():
+                    totals.setdefault(qid, Counter()).update(counts)
+                watermark = response["_id"]
+            operations = _increment_operations(survey["_id"], generation, totals)
+            if operations:
+                await terms_collection.bulk_write(operations, ordered=False)
+
+            try:
+                result = await state_collection.update_one(
+                    {"_id": survey["_id"], "rev": rev},
+                    {"$set": {
+                        "gen": generation,
+                        "watermark": watermark,
+                        "indexed": True,
+                        "rev": (rev or 0) + 1,
+                        "updated_at": datetime.utcnow(),
+                    }},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                continue
+            if result.matched_count or result.upserted_id is not None:
+                break
+        else:
+            print(f"⚠️ No se pudo activar la reindexación de términos de la encuesta {survey_id} por envíos concurrentes")
+            await terms_collection.delete_many({"survey_id": survey["_id"], "gen": generation})
+            return 0
+    except BaseException:
+        # La generación vigente sigue sirviendo; se descarta la que quedó a medias
+        await terms_collection.delete_many({"survey_id": survey["_id"], "gen": generation})
+        raise
+
+    # Generaciones anteriores (y documentos sin generación de versiones previas)
+    await terms_collection.delete_many({"survey_id": survey["_id"], "gen": {"$ne": generation}})
+    return await terms_collection.count_documents({"survey_id": survey["_id"], "gen": generation})
+
+
+async def reindex_all_terms() -> int:
+    """Reconstruye el índice de términos de todas las encuestas."""
+    surveys_collection = get_collection("surveys")
+    reindexed = 0
+    async for survey in surveys_collection.find({}, {"_id": 1}):
+        await reindex_survey_terms(str(survey["_id"]))
+        reindexed += 1
+    return reindexed
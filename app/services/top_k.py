@@ -0,0 +1,49 @@
+"""
+Conteo aproximado de los elementos más frecuentes (Misra-Gries).
+
+`TopKCounter(capacity)` guarda a lo sumo `2 * capacity` contadores sin importar
+cuántos elementos distintos lleguen. Cuando se llena, resta a todos el conteo
+del `capacity`-ésimo más frecuente y descarta los que quedan en cero.
+
+Garantía: cada conteo es exacto o se queda corto en a lo sumo `error`
+(≤ `total / capacity`), y todo elemento con frecuencia mayor que esa cota sigue
+en el contador. Si hay `2 * capacity` elementos distintos o menos los
+conteos son exactos. Dos contadores se pueden combinar con `merge`.
+"""
+import heapq
+from typing import Dict, Iterable
+
+DEFAULT_CAPACITY = 1000
+
+
+class TopKCounter:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity debe ser al menos 1")
+        self.capacity = capacity
+        self.total = 0
+        self.error = 0
+        self.counts: Dict[str, int] = {}
+
+    def update(self, items: Iterable[str]):
+        """Cuenta una aparición de cada elemento."""
+        for item in items:
+            self.counts[item] = self.counts.get(item, 0) + 1
+            self.total += 1
+            if len(self.counts) > 2 * self.capacity:
+                self._shrink()
+
+    def merge(self, other: "TopKCounter"):
+        """Combina otro contador en este (el resultado resume ambos flujos)."""
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+        self.total += other.total
+        self.error += other.error
+        while len(self.counts) > 2 * self.capacity:
+            self._shrink()
+
+    def _shrink(self):
+        threshold = heapq.nlargest(self.capacity, self.counts.values())[-1]
+        self.error += threshold
+        self.counts = {item: count - threshold for item, count in self.counts.items() if count > threshold}
+
@@ -0,0 +1,96 @@
+"""
+Caché en proceso con expulsión LRU y caducidad por TTL.
+
+Base común de las cachés en memoria (estadísticas, definiciones de encuestas,
+claves de idempotencia). Guarda a lo sumo `max_entries` valores; al pasarse
+descarta el usado hace más tiempo, y cada valor caduca `ttl_seconds` después
+de guardarse. Con `max_entries <= 0` no guarda nada.
+
+Opcionalmente cada entrada lleva etiquetas (`tags(key, value)` devuelve las
+suyas, p. ej. el id de la encuesta) y `invalidate` descarta todas las entradas
+de una etiqueta sin recorrer la caché.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+TagsFunction = Callable[[Hashable, Any], Iterable[Hashable]]
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, tags: Optional[TagsFunction] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._tags = tags
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._keys_by_tag: Dict[Hashable, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def discard(self, key: Hashable):
+        """Descarta una entrada (sin contarla como invalidación)."""
+        item = self._entries.pop(key, None)
+        if item is None or self._tags is None:
+            return
+        for tag in self._tags(key, item[1]):
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Valor guardado, o None si no está o ya caducó."""
+        item = self._entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self.discard(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        self.discard(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        if self._tags is not None:
+            for tag in self._tags(key, value):
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self.discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tags: Hashable):
+        """Descarta todas las entradas de las etiquetas indicadas."""
+        for tag in tags:
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self.discard(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,90 @@
+"""
+Benchmark de la validación de respuestas por envío: antes solo se comprobaba la
+lógica condicional (`CompiledConditionalLogic.validate`); ahora
+`CompiledAnswerValidator.validate` además normaliza cada respuesta, rechaza
+preguntas y opciones desconocidas y comprueba las obligatorias.
+
+Uso:
+    python benchmarks/answer_validation.py                  # 20, 100 y 500 preguntas
+    python benchmarks/answer_validation.py --questions 50 --payloads 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from app.services.answer_validation import compile_answer_validator  # noqa: E402
+from app.services.conditional_logic import compile_conditional_logic  # noqa: E402
+
+QUESTION_TYPES = ["multiple_choice", "checkbox_group", "number_input", "text_input", "satisfaction_scale"]
+OPTIONS = ["a", "b", "c", "d"]
+
+
+def make_questions(count: int) -> list:
+    """Preguntas de todos los tipos; una de cada tres es obligatoria y una de cada cuatro condicional."""
+    questions = []
+    for i in range(count):
+        q_type = QUESTION_TYPES[i % len(QUESTION_TYPES)]
+        q = {"_id": ObjectId(), "type": q_type, "text": f"Pregunta {i}", "is_required": i % 3 == 0}
+        if q_type in ("multiple_choice", "checkbox_group"):
+            q["options"] = OPTIONS
+        if i % 4 == 3:
+            # Visible si la primera pregunta (multiple_choice) no es "d"
+            q["visible_if"] = {"question_id": str(questions[0]["_id"]), "operator": "not_equals", "value": "d"}
+        questions.append(q)
+    return questions
+
+
+def make_answers(rnd: random.Random, questions: list) -> dict:
+    """Respuestas válidas como llegan del cliente (números como texto, escalas como enteros)."""
+    answers = {}
+    for q in questions:
+        answers[str(q["_id"])] = {
+            "multiple_choice": lambda: rnd.choice("abc"),
+            "checkbox_group": lambda: rnd.sample(OPTIONS, 2),
+            "number_input": lambda: str(rnd.randint(0, 99)),
+            "text_input": lambda: "muy buen servicio",
+            "satisfaction_scale": lambda: rnd.randint(1, 5),
+        }[q["type"]]()
+    return answers
+
+
+def per_call(fn, payloads: list) -> float:
+    start = time.perf_counter()
+    for answers in payloads:
+        fn(answers)
+    return (time.perf_counter() - start) / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--payloads", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'preguntas':>10} {'compilar (ms)':>14} {'antes (µs)':>11} {'después (µs)':>13} {'extra (µs)':>11}")
+    for count in args.questions:
+        rnd = random.Random(args.seed)
+        questions = make_questions(count)
+        payloads = [make_answers(rnd, questions) for _ in range(max(1, args.payloads * 20 // count))]
+
+        start = time.perf_counter()
+        logic = compile_conditional_logic(questions)
+        validator = compile_answer_validator(questions, logic)
+        compile_time = time.perf_counter() - start
+
+        before = per_call(logic.validate, payloads)
+        after = per_call(validator.validate, payloads)
+        print(
+            f"{count:>10} {compile_time * 1000:>14.2f} {before * 1e6:>11.1f} "
+            f"{after * 1e6:>13.1f} {(after - before) * 1e6:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark de la lógica condicional (`visible_if`): la validación anterior, que
+recorría las preguntas del modelo `Survey` y convertía valores con str() en cada
+envío, frente a `compile_conditional_logic(...).validate`. Comprueba además que
+ambas aceptan y rechazan exactamente los mismos envíos.
+
+Uso:
+    python benchmarks/conditional_logic.py                     # 100, 500 y 1000 preguntas
+    python benchmarks/conditional_logic.py --questions 300 --repeat 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from app.models.survey import Survey  # noqa: E402
+from app.services.conditional_logic import compile_conditional_logic  # noqa: E402
+
+OPERATORS = ["equals", "not_equals", "in", "not_in"]
+ANSWER_VALUES = ["a", "b", "a,b", "", "1", 1, 2.0, None, ["a", "b"], ["a,b"], [1, "a"], "b,a", ",a", "x,a,y"]
+
+
+def legacy_validate(survey: Survey, answers: dict):
+    """Validación tal como se hacía antes de compilar las condiciones (sobre el modelo `Survey`)."""
+    for q in survey.questions:
+        if not q.visible_if:
+            continue
+
+        qid = str(q.id)
+        cond = q.visible_if
+        referenced_answer = answers.get(str(cond.question_id))
+
+        should_be_visible = False
+        if cond.operator == "equals":
+            should_be_visible = str(referenced_answer) == str(cond.value)
+        elif cond.operator == "not_equals":
+            should_be_visible = str(referenced_answer) != str(cond.value)
+        elif cond.operator == "in":
+            if isinstance(referenced_answer, list):
+                should_be_visible = any(str(item) == str(cond.value) for item in referenced_answer)
+            else:
+                should_be_visible = str(cond.value) in str(referenced_answer).split(",")
+        elif cond.operator == "not_in":
+            if isinstance(referenced_answer, list):
+                should_be_visible = all(str(item) != str(cond.value) for item in referenced_answer)
+            else:
+                should_be_visible = str(cond.value) not in str(referenced_answer).split(",")
+
+        if not should_be_visible and qid in answers:
+            question_text = q.text[:50] + "..." if len(q.text) > 50 else q.text
+            raise HTTPException(
+                status_code=400,
+                detail=f"La pregunta '{question_text}' no debería ser visible según las respuestas proporcionadas"
+            )
+
+
+def as_survey(questions: list) -> Survey:
+    return Survey(**{
+        "_id": str(ObjectId()), "title": "Benchmark", "questions": questions, "creator_id": str(ObjectId()),
+        "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00",
+    })
+
+
+def make_questions(rnd: random.Random, count: int, visible: bool) -> list:
+    """Preguntas encadenadas al azar; con `visible` todas las condiciones se cumplen con la respuesta "a"."""
+    ids = [str(ObjectId()) for _ in range(count)]
+    questions = [{"_id": ids[0], "type": "multiple_choice", "text": "Pregunta raíz", "options": ["a", "b"]}]
+    for i in range(1, count):
+        operator = rnd.choice(OPERATORS)
+        if visible:
+            value = "a" if operator in ("equals", "in") else "zz"
+        else:
+            value = rnd.choice(["a", "b", "a,b", "", "1"])
+        questions.append({
+            "_id": ids[i], "type": "text_input", "text": f"Pregunta condicional número {i}",
+            "visible_if": {"question_id": ids[rnd.randrange(i)], "operator": operator, "value": value},
+        })
+    return questions
+
+
+def outcome(validate, answers: dict):
+    try:
+        validate(answers)
+    except HTTPException as e:
+        return e.detail
+    return None
+
+
+def best_of(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'preguntas':>10} {'compilar (ms)':>14} {'anterior (µs)':>14} {'compilada (µs)':>15} {'mejora':>7}  iguales")
+    for count in args.questions:
+        rnd = random.Random(args.seed)
+
+        # Paridad con condiciones y respuestas al azar (envíos aceptados y rechazados)
+        questions = make_questions(rnd, count, visible=False)
+        survey = as_survey(questions)
+        logic = compile_conditional_logic(questions)
+        same = True
+        for _ in range(200):
+            answers = {q["_id"]: rnd.choice(ANSWER_VALUES) for q in questions if rnd.random() < 0.3}
+            same &= outcome(lambda a: legacy_validate(survey, a), answers) == outcome(logic.validate, answers)
+
+        # Tiempos con todas las preguntas visibles y respondidas (el peor caso: se evalúan todas)
+        questions = make_questions(rnd, count, visible=True)
+        survey = as_survey(questions)
+        answers = {q["_id"]: "a" for q in questions}
+        start = time.perf_counter()
+        logic = compile_conditional_logic(questions, strict=True)
+        compile_time = time.perf_counter() - start
+        assert outcome(logic.validate, answers) is None
+        legacy_time = best_of(lambda: legacy_validate(survey, answers), args.repeat)
+        compiled_time = best_of(lambda: logic.validate(answers), args.repeat)
+        print(
+            f"{count:>10} {compile_time * 1000:>14.2f} {legacy_time * 1e6:>14.1f} "
+            f"{compiled_time * 1e6:>15.1f} {legacy_time / compiled_time:>6.1f}x  {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
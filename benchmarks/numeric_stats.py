@@ -0,0 +1,96 @@
+"""
+Benchmark del resumen de number_input: implementación anterior en Python puro
+(statistics.mean/median + histograma valor a valor) frente a `summarize_numeric`
+(NumPy) y a `summarize_numeric_buckets` (conteos por `value_bucket` más los
+momentos exactos, como el motor materializado).
+
+Uso:
+    python benchmarks/numeric_stats.py                    # 10k, 100k y 1M respuestas
+    python benchmarks/numeric_stats.py --sizes 50000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from statistics import mean, median
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.numeric_stats import summarize_numeric, summarize_numeric_buckets, value_bucket  # noqa: E402
+
+
+def legacy_summary(values: list) -> dict:
+    """Resumen tal como se calculaba antes del motor NumPy."""
+    histogram = {}
+    for v in values:
+        label = f"{int(v // 10) * 10}-{(int(v // 10) + 1) * 10 - 1}"
+        histogram[label] = histogram.get(label, 0) + 1
+    return {
+        "avg": round(mean(values), 2),
+        "median": round(median(values), 2),
+        "min": min(values),
+        "max": max(values),
+        "histogram": histogram,
+    }
+
+
+def materialized_fields(values: list) -> tuple:
+    """Lo que guarda el documento materializado: conteos por bucket y momentos."""
+    buckets = {}
+    for v in values:
+        key = value_bucket(v)
+        buckets[key] = buckets.get(key, 0) + 1
+    return buckets, len(values), sum(values), sum(v * v for v in values), min(values), max(values)
+
+
+def close_enough(a: dict, b: dict) -> bool:
+    return a.keys() == b.keys() and all(
+        abs(a[key] - b[key]) <= 0.01 if isinstance(a[key], float) else a[key] == b[key] for key in a
+    )
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'respuestas':>11} {'python (ms)':>12} {'numpy (ms)':>11} {'buckets (ms)':>13} {'mejora':>7}  iguales")
+    for size in args.sizes:
+        rnd = random.Random(args.seed)
+        # Respuestas enteras en [0, 500): histograma de ancho fijo dentro del máximo de intervalos,
+        # y cada valor cabe en un bucket de 3 cifras (el resumen por buckets es exacto)
+        values = [rnd.randrange(0, 500) for _ in range(size)]
+
+        fields = materialized_fields(values)
+
+        legacy = legacy_summary(values)
+        summary = summarize_numeric(values)
+        same = (
+            all(legacy[key] == summary[key] for key in ("median", "min", "max", "histogram"))
+            and abs(legacy["avg"] - summary["avg"]) <= 0.01
+            and close_enough(summarize_numeric_buckets(*fields), summary)
+        )
+
+        legacy_time = best_of(lambda: legacy_summary(values), args.repeat)
+        numpy_time = best_of(lambda: summarize_numeric(values), args.repeat)
+        counts_time = best_of(lambda: summarize_numeric_buckets(*fields), args.repeat)
+        print(
+            f"{size:>11,} {legacy_time * 1000:>12.1f} {numpy_time * 1000:>11.1f} "
+            f"{counts_time * 1000:>13.1f} {legacy_time / numpy_time:>6.1f}x  {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
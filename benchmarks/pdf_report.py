@@ -0,0 +1,92 @@
+"""
+Benchmark de `render_pdf_report`: tiempo y memoria máxima (tracemalloc) del
+informe de una encuesta de 200 preguntas con 50k respuestas, con las categorías
+y los histogramas recortados (`PDF_MAX_CATEGORIES`) y sin recortar.
+
+`rl_config.shapeChecking` es global al proceso, así que para medir su efecto se
+ejecuta el script dos veces:
+
+    python benchmarks/pdf_report.py
+    PDF_SHAPE_CHECKING=1 python benchmarks/pdf_report.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.services.numeric_stats import summarize_numeric  # noqa: E402
+from app.services.pdf_report import render_pdf_report  # noqa: E402
+from app.services.survey_report import format_report_stats  # noqa: E402
+
+QUESTION_TYPES = ["multiple_choice", "checkbox_group", "number_input", "text_input", "satisfaction_scale"]
+
+
+def split_counts(rnd: random.Random, total: int, parts: int) -> list:
+    cuts = sorted(rnd.randint(0, total) for _ in range(parts - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+
+def make_stats(questions: int, responses: int, seed: int) -> dict:
+    """Estadísticas con la forma de `compute_survey_statistics`."""
+    rnd = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    stats = {}
+    for i in range(questions):
+        q_type = QUESTION_TYPES[i % len(QUESTION_TYPES)]
+        q = {"text": f"Pregunta {i + 1}: ¿qué opinas del servicio?", "type": q_type, "options": {}, "responses": []}
+        if q_type == "multiple_choice":
+            q["options"] = {f"Opción {j}": n for j, n in enumerate(split_counts(rnd, responses, 6))}
+        elif q_type == "checkbox_group":
+            # Alta cardinalidad: opciones abiertas o etiquetas libres
+            q["options"] = {f"Etiqueta libre número {j}": n for j, n in enumerate(split_counts(rnd, responses * 2, 120))}
+        elif q_type == "satisfaction_scale":
+            q["options"] = {str(j): n for j, n in enumerate(split_counts(rnd, responses, 5), start=1)}
+        elif q_type == "number_input":
+            # Rango amplio: 50 intervalos de histograma
+            q.update(summarize_numeric(np_rng.lognormal(5, 1.2, responses)))
+        else:
+            q["word_cloud"] = [{"word": f"palabra{j}", "count": rnd.randint(1, responses // 10)} for j in range(20)]
+        stats[str(i)] = q
+    return stats
+
+
+def measure(fn) -> tuple:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--responses", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    survey = {"title": "Benchmark", "description": f"{args.questions} preguntas, {args.responses:,} respuestas"}
+    formatted = format_report_stats(make_stats(args.questions, args.responses, args.seed))
+
+    # Calentamiento: carga de fuentes y cachés de reportlab
+    render_pdf_report(survey, formatted[:10])
+
+    print(f"shapeChecking={int(settings.PDF_SHAPE_CHECKING)}")
+    print(f"{'categorías':>11} {'tiempo (s)':>11} {'memoria máx. (MB)':>18} {'PDF (KB)':>9}")
+    for max_categories in (0, settings.PDF_MAX_CATEGORIES):
+        elapsed, peak, size = measure(lambda: render_pdf_report(survey, formatted, max_categories=max_categories))
+        label = "sin límite" if max_categories <= 1 else str(max_categories)
+        print(f"{label:>11} {elapsed:>11.2f} {peak / 1e6:>18.1f} {size / 1e3:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
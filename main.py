@@ -2,7 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.database import connect_to_mongo, close_mongo_connection
-from app.routes import survey_files_routes, survey_routes, auth_routes, survey_response_routes, survey_invitations_routes, survey_exports_routes, survey_templates
+from app.services.compute_pool import compute_pool
+from app.services.report_jobs import report_jobs
+from app.services.response_ingest import response_ingest
+from app.services.status_scheduler import status_scheduler
+from app.services.survey_heads import backfill_survey_heads
+from app.routes import survey_files_routes, survey_routes, auth_routes, survey_response_routes, survey_invitations_routes, survey_exports_routes, survey_templates, metrics_routes, survey_reports_routes
 
 app = FastAPI(
     title="API de Encuestas Inteligentes",
@@ -34,9 +39,21 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 @app.on_event("startup")
 async def startup_event():
     await connect_to_mongo()
+    try:
+        await backfill_survey_heads()
+    except Exception as e:
+        # Sin la marca, los listados omiten las encuestas antiguas; se reintenta en el próximo arranque
+        print(f"❌ No se pudo calcular la marca is_latest: {e}. Ejecuta `python -m app.cli rebuild-survey-heads`")
+    await report_jobs.start()
+    await response_ingest.start()
+    await status_scheduler.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await status_scheduler.stop()
+    await response_ingest.stop()
+    await report_jobs.stop()
+    compute_pool.shutdown()
     await close_mongo_connection()
 
 # Rutas con prefijos corregidos
@@ -45,8 +62,10 @@ app.include_router(auth_routes.router, tags=["Auth"], prefix="/api/survey_api/au
 app.include_router(survey_response_routes.router, tags=["Survey Responses"], prefix="/api/survey_api")
 app.include_router(survey_invitations_routes.router, tags=["Survey Invitations"], prefix="/api/survey_api/invitations")
 app.include_router(survey_exports_routes.router, tags=["Survey Exports"], prefix="/api/survey_api/surveys")
+app.include_router(survey_reports_routes.router, tags=["Survey Reports"], prefix="/api/survey_api/surveys")
 app.include_router(survey_files_routes.router, tags=["Survey Files"], prefix="/api/survey_api/surveys")
 app.include_router(survey_templates.router, tags=["Survey Templates"])
+app.include_router(metrics_routes.router, tags=["Metrics"], prefix="/api/survey_api/metrics")
 
 @app.get("/", tags=["Root"])
 async def read_root():
@@ -0,0 +1,104 @@
+"""
+Fixtures comunes de las pruebas.
+
+Por defecto la base de datos es `mongomock_motor` (en memoria). Las pruebas que
+necesitan operadores que mongomock no implementa (`$convert`, `$stdDevSamp`,
+`$regexFindAll`...) llevan la marca `requires_mongo` y solo se ejecutan contra
+un MongoDB real indicado en `TEST_MONGO_DETAILS`, p. ej.:
+
+    TEST_MONGO_DETAILS=mongodb://localhost:27017 pytest
+"""
+import os
+import random
+from datetime import datetime
+
+# Los cálculos se ejecutan en el mismo proceso de las pruebas
+os.environ.setdefault("COMPUTE_POOL_WORKERS", "0")
+
+import pytest  # noqa: E402
+from bson import ObjectId  # noqa: E402
+import app.database as database  # noqa: E402
+
+TEST_MONGO_DETAILS = os.getenv("TEST_MONGO_DETAILS")
+TEST_DATABASE = "surveys_db_test"
+
+requires_mongo = pytest.mark.skipif(
+    not TEST_MONGO_DETAILS, reason="Necesita un MongoDB real (TEST_MONGO_DETAILS)"
+)
+
+TEXTS = [
+    "El servicio fue excelente y muy rápido",
+    "Servicio lento, la atención regular",
+    "Excelente atención; volveré pronto",
+    "ÉXITO total del equipo de atención",
+    "Nada que agregar",
+    "el servicio_cliente respondió en 24 horas",
+]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """Base de datos vacía para cada prueba (MongoDB real o mongomock_motor)."""
+    if TEST_MONGO_DETAILS:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(TEST_MONGO_DETAILS)
+    else:
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        client = mongomock_motor.AsyncMongoMockClient()
+    previous = database.client, database.db
+    database.client, database.db = client, client[TEST_DATABASE]
+    try:
+        yield database.db
+    finally:
+        if TEST_MONGO_DETAILS:
+            await client.drop_database(TEST_DATABASE)
+        database.client, database.db = previous
+
+
+def make_survey() -> dict:
+    questions = [
+        {"_id": ObjectId(), "type": "multiple_choice", "text": "Canal", "options": ["web", "app", "tienda"]},
+        {"_id": ObjectId(), "type": "checkbox_group", "text": "Intereses", "options": ["precio", "calidad", "envío"]},
+        {"_id": ObjectId(), "type": "number_input", "text": "Edad"},
+        {"_id": ObjectId(), "type": "text_input", "text": "Comentarios"},
+        {"_id": ObjectId(), "type": "satisfaction_scale", "text": "Satisfacción"},
+    ]
+    now = datetime.utcnow()
+    return {
+        "_id": ObjectId(), "title": "Encuesta de prueba", "creator_id": "tester", "questions": questions,
+        "language": "es", "created_at": now, "updated_at": now, "version": 1,
+    }
+
+
+def make_answers(survey: dict, rnd: random.Random) -> dict:
+    """Respuestas variadas: números como int, float o texto, listas vacías y preguntas sin responder."""
+    mc, cb, num, text, scale = (str(q["_id"]) for q in survey["questions"])
+    answers = {
+        mc: rnd.choice(["web", "app", "tienda"]),
+        cb: rnd.sample(["precio", "calidad", "envío"], rnd.randint(0, 3)),
+        scale: rnd.randint(1, 5),
+    }
+    if rnd.random() < 0.9:
+        answers[num] = rnd.choice([rnd.randint(0, 120), str(rnd.randint(18, 65)), round(rnd.gauss(40, 15), 3)])
+    if rnd.random() < 0.8:
+        answers[text] = rnd.choice(TEXTS)
+    return answers
+
+
+@pytest.fixture
+def survey() -> dict:
+    return make_survey()
+
+
+@pytest.fixture
+def responses(survey) -> list:
+    rnd = random.Random(7)
+    return [
+        {"_id": ObjectId(), "survey_id": survey["_id"], "answers": make_answers(survey, rnd)}
+        for _ in range(400)
+    ]
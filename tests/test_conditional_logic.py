@@ -0,0 +1,69 @@
+import pytest
+from fastapi import HTTPException
+
+from app.routes.survey_routes import check_conditional_logic
+from app.services.conditional_logic import ConditionalLogicError, compile_conditional_logic
+
+
+def question(qid: str, depends_on: str = None, operator: str = "equals", value="sí") -> dict:
+    q = {"_id": qid, "type": "text_input", "text": f"Pregunta {qid}"}
+    if depends_on is not None:
+        q["visible_if"] = {"question_id": depends_on, "operator": operator, "value": value}
+    return q
+
+
+def rejected(logic, answers: dict) -> bool:
+    try:
+        logic.validate(answers)
+    except HTTPException as e:
+        assert e.status_code == 400
+        return True
+    return False
+
+
+@pytest.mark.parametrize("operator, answer, visible", [
+    ("equals", "sí", True),
+    ("equals", "no", False),
+    ("not_equals", "no", True),
+    ("in", ["no", "sí"], True),
+    ("in", "no,sí", True),
+    ("in", "no,sím", False),
+    ("not_in", ["sí"], False),
+    ("not_in", "otro", True),
+    ("equals", None, False),
+])
+def test_validate_rejects_answers_to_hidden_questions(operator, answer, visible):
+    logic = compile_conditional_logic([question("a"), question("b", "a", operator)], strict=True)
+    assert rejected(logic, {"a": answer, "b": "respuesta"}) is not visible
+    # Sin respuesta a la pregunta condicional nunca se rechaza
+    assert not rejected(logic, {"a": answer})
+
+
+def test_numbers_compare_as_text():
+    logic = compile_conditional_logic([question("a"), question("b", "a", value=3)])
+    assert not rejected(logic, {"a": 3, "b": "x"})
+    assert rejected(logic, {"a": 3.0, "b": "x"})
+
+
+@pytest.mark.parametrize("questions", [
+    [question("a"), question("b", "zzz")],
+    [question("a"), question("b", "")],
+    [question("a", "c"), question("b", "a"), question("c", "b")],
+])
+def test_strict_compile_rejects_broken_logic(questions):
+    with pytest.raises(ConditionalLogicError):
+        compile_conditional_logic(questions, strict=True)
+    assert compile_conditional_logic(questions).errors
+
+
+def test_update_keeps_problems_of_stored_survey():
+    stored = [question("a"), question("b", "")]
+    # La condición vacía ya estaba guardada: editar otra cosa sigue permitido
+    check_conditional_logic([question("a"), question("b", ""), question("c", "a")], stored)
+
+    with pytest.raises(HTTPException) as e:
+        check_conditional_logic([question("a"), question("b", ""), question("c", "zzz")], stored)
+    assert "Pregunta c" in e.value.detail and "Pregunta b" not in e.value.detail
+
+    with pytest.raises(HTTPException):
+        check_conditional_logic([question("a"), question("b", "")])
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.services.numeric_stats import summarize_numeric
+from app.services.pdf_report import rebin_histogram, render_pdf_report
+
+
+def test_rebin_histogram_caps_bars_and_keeps_totals():
+    histogram = summarize_numeric(np.random.default_rng(0).normal(0, 300, 1000))["histogram"]
+    assert len(histogram) > 15
+
+    rebinned = rebin_histogram(histogram, 15)
+
+    assert len(rebinned) <= 15
+    assert sum(rebinned.values()) == sum(histogram.values())
+    first_label, last_label = list(histogram)[0], list(histogram)[-1]
+    assert list(rebinned)[0].startswith(first_label.split("--")[0])
+    assert list(rebinned)[-1].endswith(last_label.rsplit("-", 1)[1])
+
+
+def test_rebin_histogram_merges_fixed_width_labels():
+    histogram = {f"{i * 10}-{i * 10 + 9}": 1 for i in range(-2, 4)}
+    assert rebin_histogram(histogram, 3) == {"-20--1": 2, "0-19": 2, "20-39": 2}
+    assert rebin_histogram(histogram, 10) == histogram
+
+
+def test_render_pdf_report_with_wide_histogram():
+    item = {"question": "Edad", "type": "number_input", "data": {}, "total": 1000}
+    item.update(summarize_numeric(np.random.default_rng(1).lognormal(5, 1.2, 1000)))
+    content = render_pdf_report({"title": "Prueba"}, [item], max_categories=15)
+    assert content.startswith(b"%PDF-")
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.services.quantile_sketch import KLLSketch
+
+K = 200
+# Cota de error de rango normalizado del sketch (≈ 1.7 / k), con margen
+RANK_ERROR = 2.5 / K
+
+
+def max_rank_error(sketch: KLLSketch, values: np.ndarray) -> float:
+    values = np.sort(values)
+    probes = np.quantile(values, np.linspace(0, 1, 101))
+    exact = np.searchsorted(values, probes, side="right")
+    return max(abs(sketch.rank(p) - e) for p, e in zip(probes, exact)) / values.size
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rank_error_after_update(seed):
+    values = np.random.default_rng(seed).lognormal(3, 1, 50_000)
+    sketch = KLLSketch(k=K, seed=seed)
+    for value in values:
+        sketch.update(float(value))
+
+    assert sketch.count == values.size
+    assert sketch.min == values.min() and sketch.max == values.max()
+    assert sketch.retained < 3 * K
+    assert max_rank_error(sketch, values) <= RANK_ERROR
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rank_error_after_merge(seed):
+    rng = np.random.default_rng(seed)
+    # Lotes de tamaños y distribuciones distintas, como varios cursores en paralelo
+    batches = [rng.normal(50, 10, 20_000), rng.uniform(0, 200, 5_000), rng.exponential(30, 25_000)]
+    merged = KLLSketch(k=K, seed=seed)
+    for i, batch in enumerate(batches):
+        sketch = KLLSketch(k=K, seed=seed * 10 + i)
+        for value in batch:
+            sketch.update(float(value))
+        merged.merge(sketch)
+
+    values = np.concatenate(batches)
+    assert merged.count == values.size
+    assert merged.rank(values.max()) == values.size
+    assert merged.retained < 3 * K
+    assert max_rank_error(merged, values) <= RANK_ERROR
+
+
+def test_exclusive_rank():
+    sketch = KLLSketch(k=K, seed=0)
+    for value in [1, 2, 2, 3]:
+        sketch.update(value)
+    assert sketch.rank(2) == 3
+    assert sketch.rank(2, inclusive=False) == 1
@@ -0,0 +1,43 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.services.rate_limit import MemoryRateLimitBackend, RateLimiter, SQLiteRateLimitBackend
+
+
+def make_request(ip: str) -> Request:
+    return Request({"type": "http", "headers": [], "client": (ip, 1234)})
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteRateLimitBackend(str(tmp_path / "rate_limits.db"))
+    return MemoryRateLimitBackend(max_buckets=100)
+
+
+@pytest.mark.anyio
+async def test_rejected_requests_do_not_consume_other_buckets(backend):
+    limiter = RateLimiter(backend, {"submit": {"survey": "2/3600", "ip": "3/3600"}})
+    request = make_request("10.0.0.1")
+
+    await limiter.check("submit", request, "s1")
+    await limiter.check("submit", request, "s1")
+    # La encuesta s1 está agotada: el rechazo no gasta el token que le queda a la IP
+    for _ in range(3):
+        with pytest.raises(HTTPException) as error:
+            await limiter.check("submit", request, "s1")
+        assert error.value.status_code == 429
+    await limiter.check("submit", request, "s2")
+
+    with pytest.raises(HTTPException):
+        await limiter.check("submit", request, "s3")
+    assert limiter.allowed["submit"] == 3
+    assert limiter.rejected["submit"] == {"survey": 3, "ip": 1}
+
+
+@pytest.mark.anyio
+async def test_disabled_limiter_admits_everything(backend):
+    limiter = RateLimiter(backend, {"submit": {"ip": "1/3600"}}, enabled=False)
+    for _ in range(5):
+        await limiter.check("submit", make_request("10.0.0.1"))
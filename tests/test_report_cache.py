@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.services import report_cache as report_cache_module
+from app.services.report_cache import ReportCache
+from app.services.survey_stats_store import get_stats_version, record_batch_stats
+
+
+@pytest.mark.anyio
+async def test_version_changes_only_when_responses_are_recorded(db, survey, responses):
+    await db["surveys"].insert_one(survey)
+    await db["survey_responses"].insert_many([dict(r) for r in responses[:10]])
+    survey_id = str(survey["_id"])
+    before = await get_stats_version(survey_id)
+
+    # Respuesta insertada pero aún no sumada a las estadísticas: el informe no cambiaría
+    pending = responses[10]
+    await db["survey_responses"].insert_one(dict(pending))
+    assert await get_stats_version(survey_id) == before
+
+    await record_batch_stats(survey, [pending["answers"]], [pending["_id"]])
+    assert await get_stats_version(survey_id) != before
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_build_once_and_release_lock(tmp_path, monkeypatch, survey):
+    builds = []
+
+    async def fake_build(survey, output_path):
+        builds.append(output_path)
+        await asyncio.sleep(0.01)
+        with open(output_path, "wb") as f:
+            f.write(b"%PDF-")
+        return output_path
+
+    monkeypatch.setattr(report_cache_module, "build_survey_report", fake_build)
+    cache = ReportCache(directory=str(tmp_path), max_bytes=1024)
+
+    paths = await asyncio.gather(*(cache.get_or_build(survey, "1:10") for _ in range(5)))
+
+    assert len(builds) == 1
+    assert len(set(paths)) == 1
+    assert cache._locks == {}
+    assert (cache.hits, cache.misses) == (4, 1)
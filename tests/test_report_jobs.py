@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.config import settings
+from app.services import report_jobs as report_jobs_module
+from app.services.report_cache import get_data_version
+from app.services.report_jobs import ReportJobLimitExceeded, ReportJobManager
+from tests.conftest import make_survey
+
+
+@pytest.fixture
+async def jobs_db(db, monkeypatch):
+    # Los mismos índices únicos que crea connect_to_mongo
+    await db["report_jobs"].create_index(
+        [("survey_id", 1), ("data_version", 1)], unique=True, partialFilterExpression={"active": True}
+    )
+    await db["report_jobs"].create_index(
+        [("user_id", 1), ("slot", 1)], unique=True,
+        partialFilterExpression={"active": True, "slot": {"$exists": True}}
+    )
+
+    async def fake_stats_version(survey_id):
+        return "1:10"
+
+    monkeypatch.setattr(report_jobs_module, "get_stats_version", fake_stats_version)
+    return db
+
+
+async def _manager(limit: int = 3) -> ReportJobManager:
+    manager = ReportJobManager(workers=0, per_user_limit=limit)
+    await manager.start()
+    return manager
+
+
+@pytest.mark.anyio
+async def test_concurrent_submissions_respect_user_limit(jobs_db):
+    manager = await _manager(limit=3)
+    results = await asyncio.gather(
+        *(manager.submit(make_survey(), "u1") for _ in range(6)), return_exceptions=True
+    )
+    accepted = [r for r in results if isinstance(r, dict)]
+    assert len(accepted) == 3
+    assert sorted(job["slot"] for job in accepted) == [0, 1, 2]
+    assert sum(isinstance(r, ReportJobLimitExceeded) for r in results) == 3
+    # Otro usuario tiene sus propios huecos
+    assert (await manager.submit(make_survey(), "u2"))["slot"] == 0
+
+
+@pytest.mark.anyio
+async def test_only_abandoned_jobs_expire(jobs_db):
+    old = datetime.utcnow() - timedelta(seconds=settings.REPORT_JOB_STALE_SECONDS + 60)
+    base = {"survey_id": ObjectId(), "user_id": "u1", "active": True, "created_at": old}
+    await jobs_db["report_jobs"].insert_many([
+        {**base, "_id": "queued", "status": "queued", "data_version": "a", "slot": 0},
+        {**base, "_id": "long", "status": "running", "data_version": "b", "slot": 1,
+         "started_at": old, "heartbeat_at": datetime.utcnow()},
+        {**base, "_id": "dead", "status": "running", "data_version": "c", "slot": 2,
+         "started_at": old, "heartbeat_at": old},
+    ])
+    manager = await _manager()
+    await manager._expire_stale_jobs()
+
+    statuses = {job["_id"]: job["status"] async for job in jobs_db["report_jobs"].find()}
+    assert statuses == {"queued": "failed", "long": "running", "dead": "failed"}
+
+
+@pytest.mark.anyio
+async def test_job_records_the_rendered_version(jobs_db, monkeypatch):
+    survey = make_survey()
+    await jobs_db["surveys"].insert_one(survey)
+    manager = await _manager()
+    job = await manager.submit(survey, "u1")
+
+    # Llegan respuestas entre la petición y la ejecución
+    async def newer_stats_version(survey_id):
+        return "2:11"
+
+    built = []
+
+    async def fake_get_or_build(survey, stats_version=None):
+        built.append(stats_version)
+        return "/tmp/informe.pdf"
+
+    monkeypatch.setattr(report_jobs_module, "get_stats_version", newer_stats_version)
+    monkeypatch.setattr(report_jobs_module.report_cache, "get_or_build", fake_get_or_build)
+    await manager._run_job(job["_id"])
+
+    done = await manager.get_job(job["_id"])
+    assert done["status"] == "done"
+    assert built == ["2:11"]
+    stored = await jobs_db["surveys"].find_one({"_id": survey["_id"]})
+    assert done["data_version"] == get_data_version(stored, "2:11")
+    assert "active" not in done
+
+
+@pytest.mark.anyio
+async def test_expired_job_keeps_failed_status(jobs_db, monkeypatch):
+    survey = make_survey()
+    await jobs_db["surveys"].insert_one(survey)
+    manager = await _manager()
+    job = await manager.submit(survey, "u1")
+
+    async def slow_build(survey, stats_version=None):
+        # Mientras tanto el trabajo caduca (p. ej. otro proceso lo dio por abandonado)
+        await jobs_db["report_jobs"].update_one(
+            {"_id": job["_id"]}, {"$set": {"status": "failed"}, "$unset": {"active": ""}}
+        )
+        return "/tmp/informe.pdf"
+
+    monkeypatch.setattr(report_jobs_module.report_cache, "get_or_build", slow_build)
+    await manager._run_job(job["_id"])
+    assert (await manager.get_job(job["_id"]))["status"] == "failed"
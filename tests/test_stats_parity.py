@@ -0,0 +1,236 @@
+"""
+Paridad entre motores de estadísticas: con las mismas respuestas, el motor en
+Python, el materializado y el de agregación devuelven el mismo resultado. El de
+streaming coincide salvo en los percentiles, que salen del sketch KLL, y el
+materializado coincide exactamente si los valores numéricos tienen a lo sumo
+`BUCKET_DIGITS` cifras significativas.
+"""
+import re
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from app.config import settings
+from app.services import survey_stats_aggregation as aggregation
+from app.services.numeric_stats import BUCKET_DIGITS, PERCENTILES
+from app.services.numeric_stats import histogram_edges, summarize_numeric, value_bucket
+from app.services.stopwords import get_stopwords
+from app.services.survey_stats import (
+    compute_statistics_from_responses,
+    compute_survey_statistics,
+    compute_word_cloud,
+)
+from app.services.survey_stats import RECENT_RESPONSES_LIMIT
+from app.services.survey_stats_store import STATS_COLLECTION, get_materialized_statistics, record_batch_stats
+from app.services.survey_stats_streaming import compute_statistics_streaming
+from tests.conftest import TEXTS, requires_mongo
+
+EXACT_FIELDS = ("count", "avg", "min", "max", "std")
+PERCENTILE_FIELDS = ("median",) + tuple(f"p{p}" for p in PERCENTILES)
+
+
+def assert_same_stats(expected: dict, actual: dict, exact_percentiles: bool = True):
+    assert expected.keys() == actual.keys()
+    for qid, q in expected.items():
+        other = actual[qid]
+        assert other["options"] == q["options"], q["text"]
+        assert other["responses"] == q["responses"], q["text"]
+        numeric_fields = EXACT_FIELDS + PERCENTILE_FIELDS if exact_percentiles else EXACT_FIELDS
+        for field in numeric_fields:
+            assert other.get(field) == pytest.approx(q.get(field)), (q["text"], field)
+        for field in ("histogram", "distribution", "word_cloud"):
+            assert other.get(field) == q.get(field), (q["text"], field)
+
+
+async def _insert(db, survey, responses):
+    await db["surveys"].insert_one(survey)
+    await db["survey_responses"].insert_many([dict(r) for r in responses])
+
+
+def number_qid(survey: dict) -> str:
+    return next(str(q["_id"]) for q in survey["questions"] if q["type"] == "number_input")
+
+
+@pytest.fixture
+def bucketed_responses(survey, responses) -> list:
+    """Las respuestas del fixture con los decimales redondeados a `BUCKET_DIGITS` cifras significativas."""
+    qid = number_qid(survey)
+    rounded = []
+    for r in responses:
+        answers = dict(r["answers"])
+        if isinstance(answers.get(qid), float):
+            answers[qid] = float(value_bucket(answers[qid]))
+        rounded.append({**r, "answers": answers})
+    return rounded
+
+
+@pytest.mark.anyio
+async def test_materialized_matches_python_after_rebuild(db, survey, bucketed_responses):
+    await _insert(db, survey, bucketed_responses)
+    expected = compute_statistics_from_responses(survey, bucketed_responses)
+    assert_same_stats(expected, await get_materialized_statistics(survey))
+
+
+@pytest.mark.anyio
+async def test_materialized_matches_python_with_live_updates(db, survey, bucketed_responses):
+    responses = bucketed_responses
+    head, tail = responses[:100], responses[100:]
+    await _insert(db, survey, head)
+    await get_materialized_statistics(survey)
+
+    await db["survey_responses"].insert_many([dict(r) for r in tail])
+    await record_batch_stats(survey, [r["answers"] for r in tail], [r["_id"] for r in tail])
+
+    expected = compute_statistics_from_responses(survey, responses)
+    assert_same_stats(expected, await get_materialized_statistics(survey))
+
+
+@pytest.mark.anyio
+async def test_materialized_bounds_arbitrary_values(db, survey):
+    # Valores con muchas cifras y de magnitudes muy distintas: el documento no crece con cada uno
+    rng = np.random.default_rng(11)
+    values = np.concatenate([rng.uniform(0, 100, 5000), -rng.lognormal(1, 2, 300), rng.normal(0, 1e-3, 50)])
+    qid = number_qid(survey)
+    responses = [{"_id": ObjectId(), "survey_id": survey["_id"], "answers": {qid: float(v)}} for v in values]
+    await _insert(db, survey, responses)
+
+    actual = (await get_materialized_statistics(survey))[qid]
+    stats_doc = await db[STATS_COLLECTION].find_one({"_id": survey["_id"]})
+    assert len(stats_doc["questions"][qid]["buckets"]) < values.size / 2
+
+    expected = summarize_numeric(values)
+    for field in ("count", "avg", "min", "max", "std"):
+        assert actual[field] == pytest.approx(expected[field], rel=1e-9), field
+    # Cada percentil queda a menos de medio paso de redondeo del valor exacto
+    for field in PERCENTILE_FIELDS:
+        tolerance = 0.5 * 10 ** (1 - BUCKET_DIGITS) * abs(expected[field]) + 0.01
+        assert actual[field] == pytest.approx(expected[field], abs=tolerance), field
+    assert sum(actual["histogram"].values()) == values.size
+
+
+@pytest.mark.anyio
+async def test_result_shape_is_the_same_in_every_engine(db, survey, bucketed_responses):
+    """
+    number_input no devuelve conteos por valor (`options` vacío; la distribución
+    es `histogram`) y `responses` de number_input y text_input es una muestra de
+    las últimas `RECENT_RESPONSES_LIMIT` respuestas, en todos los motores.
+    """
+    await _insert(db, survey, bucketed_responses)
+    query = {"survey_id": survey["_id"]}
+    results = {
+        "python": compute_statistics_from_responses(survey, bucketed_responses),
+        "materialized": await get_materialized_statistics(survey),
+        "streaming": await compute_statistics_streaming(survey, query),
+    }
+    numeric = [r["answers"][number_qid(survey)] for r in bucketed_responses if number_qid(survey) in r["answers"]]
+    for engine, stats in results.items():
+        for q in stats.values():
+            assert len(q["responses"]) <= RECENT_RESPONSES_LIMIT, engine
+            if q["type"] == "number_input":
+                assert q["options"] == {}, engine
+                assert q["responses"] == [float(v) for v in numeric[-RECENT_RESPONSES_LIMIT:]], engine
+                assert sum(q["histogram"].values()) == q["count"] == len(numeric), engine
+
+
+@pytest.mark.anyio
+async def test_streaming_matches_python(db, survey, responses, monkeypatch):
+    monkeypatch.setattr(settings, "STATS_SKETCH_K", 32)
+    await _insert(db, survey, responses)
+    expected = compute_statistics_from_responses(survey, responses)
+    actual = await compute_statistics_streaming(survey, {"survey_id": survey["_id"]}, batch_size=50)
+    assert_same_stats(expected, actual, exact_percentiles=False)
+
+    # Los percentiles aproximados quedan dentro de la cota de rango del sketch
+    qid = next(str(q["_id"]) for q in survey["questions"] if q["type"] == "number_input")
+    values = np.sort([float(r["answers"][qid]) for r in responses if qid in r["answers"]])
+    for field, p in zip(PERCENTILE_FIELDS, (50,) + PERCENTILES):
+        rank = np.searchsorted(values, actual[qid][field], side="right") / values.size
+        assert abs(rank - p / 100) <= 2.5 / 32, field
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("exact_max", [10_000, 10])
+async def test_default_engine_with_filters(db, survey, responses, monkeypatch, exact_max):
+    # Con pocas respuestas el motor predeterminado es exacto; con muchas pasa a streaming
+    monkeypatch.setattr(settings, "STATS_EXACT_MAX_RESPONSES", exact_max)
+    await _insert(db, survey, responses)
+    qid = next(str(q["_id"]) for q in survey["questions"] if q["type"] == "number_input")
+    filters = [{"qid": qid, "value": 40.0, "operator": "greater_than", "type": "number_input"}]
+
+    matching = [
+        r for r in responses
+        if isinstance(r["answers"].get(qid), (int, float)) and r["answers"][qid] > 40
+    ]
+    expected = compute_statistics_from_responses(survey, matching)
+    actual = await compute_survey_statistics(str(survey["_id"]), filters)
+    assert_same_stats(expected, actual, exact_percentiles=exact_max > len(matching))
+
+
+@requires_mongo
+@pytest.mark.anyio
+@pytest.mark.parametrize("bins", [None, 7, "sturges", "auto"])
+async def test_aggregation_matches_python(db, survey, responses, monkeypatch, bins):
+    monkeypatch.setattr(settings, "STATS_HISTOGRAM_BINS", bins)
+    await _insert(db, survey, responses)
+    expected = compute_statistics_from_responses(survey, responses)
+    actual = await aggregation.compute_statistics_aggregated(survey, {"survey_id": survey["_id"]})
+    assert_same_stats(expected, actual)
+
+
+def _run_order_stages(values: list, stages: list) -> list:
+    """Ejecuta en Python las etapas `$sort`/`$skip`/`$limit` de una rama de percentiles."""
+    rows = sorted(values, reverse=stages[0]["$sort"]["value"] < 0)
+    rows = rows[stages[1]["$skip"]:]
+    return [{"value": v} for v in rows[:stages[2]["$limit"]]]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 10, 101, 1000])
+def test_percentile_branches_match_numpy(count):
+    rng = np.random.default_rng(count)
+    values = list(rng.normal(50, 20, count))
+    summary = {"count": count, "min": min(values), "max": max(values)}
+
+    result = {}
+    for name, stages in aggregation.build_percentiles_facets("answers.q", count).items():
+        order_stages = stages[len(aggregation._numeric_stages("answers.q")):]
+        # Ninguna rama retiene más de la mitad de los valores (más los dos que devuelve)
+        assert order_stages[1]["$skip"] <= count / 2
+        result[f"q_{name}"] = _run_order_stages(values, order_stages)
+
+    percentiles = aggregation._percentiles_from_rows(result, "q_", summary)
+    expected = np.percentile(values, list(percentiles))
+    assert list(percentiles.values()) == pytest.approx(list(expected))
+
+
+@pytest.mark.parametrize("bins", [None, 7, "sqrt", "scott", "fd", "auto"])
+def test_bucket_histogram_matches_python(bins):
+    rng = np.random.default_rng(3)
+    values = np.round(rng.gamma(2.0, 30.0, 2000), 1)
+    expected = summarize_numeric(values, bins=bins)
+
+    p75, p25 = np.percentile(values, [75, 25])
+    edges, fixed_width = histogram_edges(values.size, values.min(), values.max(), bins, p75 - p25, values.std(ddof=1))
+    boundaries = aggregation._bucket_stage(edges)["$bucket"]["boundaries"]
+    # $bucket: cada valor cae en el intervalo [límite_i, límite_i+1)
+    index = np.searchsorted(boundaries, values, side="right") - 1
+    rows = [{"_id": boundaries[i], "count": int(n)} for i, n in zip(*np.unique(index, return_counts=True))]
+
+    assert aggregation._histogram_from_rows(rows, edges, fixed_width) == expected["histogram"]
+
+
+def test_merged_terms_match_word_cloud():
+    stopwords = get_stopwords("es")
+    texts = TEXTS * 3 + ["Atención ATENCIÓN atención"]
+    expected = compute_word_cloud(texts, stopwords)
+
+    # Filas como las devuelve la rama de términos: $toLower solo cambia letras ASCII
+    counts = {}
+    for text in texts:
+        for token in re.findall(r"\w{3,}", text):
+            token = "".join(c.lower() if c.isascii() else c for c in token)
+            counts[token] = counts.get(token, 0) + 1
+    rows = [{"_id": term, "count": count} for term, count in counts.items()]
+
+    assert aggregation._merge_terms(rows, stopwords) == expected
+
@@ -0,0 +1,35 @@
+import pytest
+from bson import ObjectId
+
+from app.services import survey_heads
+from app.services.survey_heads import backfill_survey_heads
+from tests.conftest import requires_mongo
+
+
+# latest_versions_pipeline usa $type como expresión, que mongomock no implementa
+@requires_mongo
+@pytest.mark.anyio
+async def test_backfill_marks_latest_version_in_batches(db, monkeypatch):
+    monkeypatch.setattr(survey_heads, "HEADS_BATCH_SIZE", 2)
+    surveys = db["surveys"]
+    expected_heads = set()
+    for family in range(5):
+        root = ObjectId()
+        versions = [{"_id": root, "version": 1}]
+        for version in range(2, family + 2):
+            # parent_id guardado como texto o como ObjectId
+            parent = str(root) if version % 2 else root
+            versions.append({"_id": ObjectId(), "version": version, "parent_id": parent})
+        # Encuestas antiguas sin la marca y una marcada por error
+        versions[0]["is_latest"] = True
+        await surveys.insert_many(versions)
+        expected_heads.add(versions[-1]["_id"])
+
+    assert await backfill_survey_heads() == 5
+
+    latest = {doc["_id"] async for doc in surveys.find({"is_latest": True})}
+    assert latest == expected_heads
+    assert await surveys.count_documents({"is_latest": {"$exists": False}}) == 0
+    assert await surveys.count_documents({"heads_run": {"$exists": True}}) == 0
+    # Sin documentos pendientes no vuelve a recorrer la colección
+    assert await backfill_survey_heads() == 0
@@ -0,0 +1,114 @@
+import pytest
+
+from app.services.stopwords import get_stopwords
+from app.services.survey_stats import compute_word_cloud
+from app.services.survey_stats_store import get_materialized_statistics, rebuild_survey_stats, record_batch_stats
+from app.services.term_index import TERMS_COLLECTION, get_terms_generation, is_survey_indexed, reindex_survey_terms
+
+
+def text_qid(survey: dict) -> str:
+    return next(str(q["_id"]) for q in survey["questions"] if q["type"] == "text_input")
+
+
+def expected_word_cloud(survey: dict, responses: list) -> list:
+    qid = text_qid(survey)
+    texts = [r["answers"][qid] for r in responses if qid in r["answers"]]
+    return compute_word_cloud(texts, get_stopwords(survey.get("language")))
+
+
+@pytest.mark.anyio
+async def test_survey_without_term_backfill_is_reindexed(db, survey, responses):
+    head, tail = responses[:300], responses[300:]
+    await db["surveys"].insert_one(survey)
+    await db["survey_responses"].insert_many([dict(r) for r in head])
+    # Estadísticas ya reconstruidas, pero el índice de términos solo tiene los envíos en vivo
+    await rebuild_survey_stats(str(survey["_id"]))
+    await db["survey_responses"].insert_many([dict(r) for r in tail])
+    await record_batch_stats(survey, [r["answers"] for r in tail], [r["_id"] for r in tail])
+    assert not await is_survey_indexed(survey["_id"])
+
+    stats = await get_materialized_statistics(survey)
+
+    assert await is_survey_indexed(survey["_id"])
+    assert stats[text_qid(survey)]["word_cloud"] == expected_word_cloud(survey, responses)
+
+
+@pytest.mark.anyio
+async def test_interrupted_reindex_keeps_current_generation(db, survey, responses, monkeypatch):
+    await db["surveys"].insert_one(survey)
+    await db["survey_responses"].insert_many([dict(r) for r in responses])
+    await get_materialized_statistics(survey)
+    assert await is_survey_indexed(survey["_id"])
+    generation = await get_terms_generation(survey["_id"])
+
+    terms_collection = db[TERMS_COLLECTION]
+
+    async def failing_bulk_write(*args, **kwargs):
+        raise RuntimeError("fallo simulado")
+
+    monkeypatch.setattr(type(terms_collection), "bulk_write", failing_bulk_write)
+    with pytest.raises(RuntimeError):
+        await reindex_survey_terms(str(survey["_id"]))
+    monkeypatch.undo()
+
+    # La generación vigente sigue sirviendo y no quedan restos de la interrumpida
+    assert await is_survey_indexed(survey["_id"])
+    assert await get_terms_generation(survey["_id"]) == generation
+    assert await terms_collection.count_documents({"gen": {"$ne": generation}}) == 0
+    stats = await get_materialized_statistics(survey)
+    assert stats[text_qid(survey)]["word_cloud"] == expected_word_cloud(survey, responses)
+
+
+@pytest.mark.anyio
+async def test_interrupted_first_index_is_repeated(db, survey, responses, monkeypatch):
+    await db["surveys"].insert_one(survey)
+    await db["survey_responses"].insert_many([dict(r) for r in responses])
+    terms_collection = db[TERMS_COLLECTION]
+
+    async def failing_bulk_write(*args, **kwargs):
+        raise RuntimeError("fallo simulado")
+
+    monkeypatch.setattr(type(terms_collection), "bulk_write", failing_bulk_write)
+    with pytest.raises(RuntimeError):
+        await get_materialized_statistics(survey)
+    monkeypatch.undo()
+    assert not await is_survey_indexed(survey["_id"])
+
+    stats = await get_materialized_statistics(survey)
+    assert await is_survey_indexed(survey["_id"])
+    assert stats[text_qid(survey)]["word_cloud"] == expected_word_cloud(survey, responses)
+
+
+@pytest.mark.anyio
+async def test_submissions_during_reindex_are_counted_once(db, survey, responses, monkeypatch):
+    head, during, after = responses[:300], responses[300:350], responses[350:]
+    await db["surveys"].insert_one(survey)
+    await db["survey_responses"].insert_many([dict(r) for r in head])
+    await get_materialized_statistics(survey)
+
+    terms_collection = db[TERMS_COLLECTION]
+    bulk_write = type(terms_collection).bulk_write
+    current = await get_terms_generation(survey["_id"])
+    pending = [during]
+
+    async def bulk_write_with_submission(self, operations, **kwargs):
+        result = await bulk_write(self, operations, **kwargs)
+        if pending and operations[0]._filter["gen"] != current:
+            # Mientras se escribe la generación nueva llegan envíos a la vigente
+            batch = pending.pop()
+            await db["survey_responses"].insert_many([dict(r) for r in batch])
+            await record_batch_stats(survey, [r["answers"] for r in batch], [r["_id"] for r in batch])
+        return result
+
+    monkeypatch.setattr(type(terms_collection), "bulk_write", bulk_write_with_submission)
+    await reindex_survey_terms(str(survey["_id"]))
+    monkeypatch.undo()
+    assert not pending
+
+    # Envíos posteriores a la reindexación (ya incluidos o no) se suman una sola vez
+    await db["survey_responses"].insert_many([dict(r) for r in after])
+    await record_batch_stats(survey, [r["answers"] for r in after], [r["_id"] for r in after])
+    await record_batch_stats(survey, [r["answers"] for r in during[:1]], [r["_id"] for r in during[:1]])
+
+    stats = await get_materialized_statistics(survey)
+    assert stats[text_qid(survey)]["word_cloud"] == expected_word_cloud(survey, responses)
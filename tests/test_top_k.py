@@ -0,0 +1,50 @@
+from collections import Counter
+
+import numpy as np
+
+from app.services.top_k import TopKCounter
+
+
+def zipf_stream(seed: int, size: int) -> list:
+    return [f"t{n}" for n in np.random.default_rng(seed).zipf(1.3, size)]
+
+
+def test_exact_while_few_distinct_items():
+    counter = TopKCounter(capacity=5)
+    items = list("abcabcaabdeeffgh")
+    counter.update(items)
+    assert len(counter.counts) <= 10
+    assert counter.counts == Counter(items)
+    assert counter.error == 0
+
+
+def test_bounded_size_and_error():
+    items = zipf_stream(0, 100_000)
+    counter = TopKCounter(capacity=100)
+    counter.update(items)
+
+    exact = Counter(items)
+    assert len(counter.counts) <= 200
+    assert counter.error <= counter.total / counter.capacity
+    for item, count in exact.items():
+        estimate = counter.counts.get(item, 0)
+        assert count - counter.error <= estimate <= count
+    # Todo término más frecuente que la cota de error sigue en el contador
+    for item, count in exact.items():
+        if count > counter.error:
+            assert item in counter.counts
+
+
+def test_merge_keeps_error_bound():
+    first, second = zipf_stream(1, 40_000), zipf_stream(2, 60_000)
+    merged = TopKCounter(capacity=100)
+    merged.update(first)
+    other = TopKCounter(capacity=100)
+    other.update(second)
+    merged.merge(other)
+
+    exact = Counter(first + second)
+    assert merged.total == len(first) + len(second)
+    assert len(merged.counts) <= 200
+    for item, count in exact.items():
+        assert count - merged.error <= merged.counts.get(item, 0) <= count
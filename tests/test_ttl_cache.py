@@ -0,0 +1,45 @@
+from app.services import ttl_cache as ttl_cache_module
+from app.services.ttl_cache import TTLCache
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ttl_cache_module.time, "monotonic", lambda: now[0])
+    cache = TTLCache(max_entries=10, ttl_seconds=5)
+    cache.set("a", 1)
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidate_by_tag():
+    cache = TTLCache(max_entries=10, ttl_seconds=60, tags=lambda key, _value: (key[0],))
+    cache.set(("s1", "x"), 1)
+    cache.set(("s1", "y"), 2)
+    cache.set(("s2", "x"), 3)
+    cache.invalidate("s1")
+    assert cache.get(("s1", "x")) is None
+    assert cache.get(("s2", "x")) == 3
+    assert cache.invalidations == 2
+    assert cache._keys_by_tag == {"s2": {("s2", "x")}}
+
+
+def test_disabled_with_zero_entries():
+    cache = TTLCache(max_entries=0, ttl_seconds=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None